@@ -0,0 +1,126 @@
+"""
+Buffered user activity tracking
+Requests add active seconds and logins to an in-process buffer keyed by (user, date);
+the buffer is written out periodically with one set-based UPDATE per key, so page
+views do not each cost a database write and concurrent workers never lose increments.
+A timer thread flushes FLUSH_INTERVAL after the first buffered event, so an idle worker
+does not sit on activity until its next request; exit flushes whatever is left.
+"""
+from django.db import connections, transaction, DatabaseError, IntegrityError
+from django.db.models import F
+from django.utils import timezone
+import atexit
+import os
+import threading
+import time
+
+from .models import CustomUser, UserActivity
+
+# Write the buffer out at most this often, or sooner once it holds this many keys
+FLUSH_INTERVAL = 60  # seconds
+MAX_PENDING = 500
+
+_pending = {}
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+_timer = None
+
+
+def record(user_id, day, seconds=0, logins=0):
+    """Add activity for (user, day) to the buffer, flushing it when due"""
+    global _last_flush, _timer
+    with _lock:
+        totals = _pending.setdefault((user_id, day), [0, 0])
+        totals[0] += seconds
+        totals[1] += logins
+        due = len(_pending) >= MAX_PENDING or time.monotonic() - _last_flush >= FLUSH_INTERVAL
+        if due:
+            _last_flush = time.monotonic()
+        elif _timer is None:
+            _timer = threading.Timer(FLUSH_INTERVAL, _flush_on_timer)
+            _timer.daemon = True
+            _timer.start()
+    if due:
+        try:
+            flush()
+        except DatabaseError:
+            # A busy database must not fail the page view; the rows stay buffered
+            pass
+
+
+def _flush_on_timer():
+    """Timer thread: write the buffer out even if no request comes to do it"""
+    global _last_flush, _timer
+    with _lock:
+        _timer = None
+        _last_flush = time.monotonic()
+    try:
+        flush()
+    except DatabaseError:
+        # flush() kept the unwritten rows; the next timer or request retries them
+        pass
+    finally:
+        # The timer thread's own connections; request threads manage theirs
+        connections.close_all()
+
+
+def _apply(user_id, day, seconds, logins, now):
+    def increment():
+        return UserActivity.objects.filter(user_id=user_id, date=day).update(
+            total_active_seconds=F('total_active_seconds') + seconds,
+            login_count=F('login_count') + logins,
+            last_activity=now,
+            updated_at=now,
+        )
+
+    if increment():
+        return
+    # The user may have been deleted since the activity was buffered
+    if not CustomUser.objects.filter(pk=user_id).exists():
+        return
+    try:
+        with transaction.atomic():
+            UserActivity.objects.create(user_id=user_id, date=day, total_active_seconds=seconds, login_count=logins)
+    except IntegrityError:
+        # Another worker created the row first
+        increment()
+
+
+def flush():
+    """Write buffered activity to UserActivity; returns the number of rows touched"""
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+
+    now = timezone.now()
+    items = list(pending.items())
+    for index, ((user_id, day), (seconds, logins)) in enumerate(items):
+        try:
+            _apply(user_id, day, seconds, logins, now)
+        except DatabaseError:
+            # Put back what was not written, so a later flush can retry it
+            with _lock:
+                for key, (seconds, logins) in items[index:]:
+                    totals = _pending.setdefault(key, [0, 0])
+                    totals[0] += seconds
+                    totals[1] += logins
+            raise
+    return len(pending)
+
+
+def _flush_at_exit():
+    try:
+        flush()
+    except DatabaseError:
+        # Database already closed (e.g. test database torn down); nothing left to do
+        pass
+
+
+def _forget_timer():
+    # Threads do not survive fork; a child process starts its own timer
+    global _timer
+    _timer = None
+
+
+atexit.register(_flush_at_exit)
+os.register_at_fork(after_in_child=_forget_timer)
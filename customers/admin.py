@@ -1,11 +1,14 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import Group
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
 from .models import (
     CustomUser, OTPVerification, EmailLog,
     UserProfile, Customer, Product, Sale, SaleItem,
     ShopPhoto, SaleOffer, UserActivity
 )
+from . import caching
 
 # Unregister Group (from Authentication and Authorization)
 try:
@@ -145,3 +148,17 @@ class UserActivityAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         """Only superusers can delete activity records"""
         return request.user.is_superuser
+
+
+def cache_stats_view(request):
+    """Read-side cache hit/miss counters (see customers.caching)"""
+    if request.method == 'POST' and request.user.is_superuser:
+        caching.reset_stats()
+        return redirect('cache-stats')
+    
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Cache statistics',
+        'stats': caching.stats(),
+    }
+    return TemplateResponse(request, 'admin/cache_stats.html', context)
@@ -3,12 +3,15 @@ Business logic views for Subhlabh application
 Dashboard, Customer, Product, Sales, Reports
 """
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
+from django.template.loader import render_to_string
 from django.views import View
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
-from django.db.models import Sum, Count, Q, F, DecimalField, Max
+from django.http import JsonResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+from django.db.models import Sum, Count, Q, F, DecimalField, Max, Exists, OuterRef
 from django.utils import timezone
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib.auth import update_session_auth_hash, logout
@@ -16,173 +19,61 @@ from datetime import datetime, time, timedelta
 from decimal import Decimal
 import json
 import logging
-from django.core.cache import cache
 
 # Configure logger for this module
 logger = logging.getLogger(__name__)
 
 from .models import (
-    UserProfile, Customer, Product, Sale, SaleItem, CustomUser, Offer, SaleOffer, ShopPhoto
+    UserProfile, Customer, Product, Sale, SaleItem, CustomUser, Offer, SaleOffer, ShopPhoto, ImportJob
 )
 from .forms import OfferForm
+from .checkout import create_sale, preview_offers, void_sales, void_day, day_sales, CheckoutError
+from .ledger import record_payment, PaymentError
+from . import caching, catalog, reports, images, dashboard, offers, imports
+from .search import search_products, search_customers
+from .exports import stream_csv, iterate_sales, CHUNK_SIZE
+from .pagination import paginate_sales, paginate_timeline
 
 
 @method_decorator(login_required, name='dispatch')
 class DashboardView(View):
-    """Dashboard showing key metrics and recent transactions"""
+    """Dashboard shell; metric cards, chart and alerts load from DashboardWidgetView"""
     
     def get(self, request):
-        """Render dashboard with caching for improved performance"""
-        user = request.user
-        today = timezone.now().date()
-        month_start = today.replace(day=1)
-        
         try:
-            profile = user.profile
+            profile = request.user.profile
         except UserProfile.DoesNotExist:
-            profile = UserProfile.objects.create(user=user)
-        
-        # Prepare today's range (start of day to end of day)
-        today_start = timezone.make_aware(datetime.combine(today, time.min))
-        today_end = timezone.make_aware(datetime.combine(today, time.max))
-        
-        # Prepare month start datetime
-        month_start_dt = timezone.make_aware(datetime.combine(month_start, time.min))
-        
-        # Cache key for dashboard metrics
-        cache_key = f'dashboard_metrics_{user.id}_{today}'
-        # cached_metrics = cache.get(cache_key)
-        cached_metrics = None # DEBUG: Force fresh data
-        
-        if cached_metrics:
-            # Use cached metrics
-            today_sales = cached_metrics['today_sales']
-            month_sales = cached_metrics['month_sales']
-            total_customers = cached_metrics['total_customers']
-            total_products = cached_metrics['total_products']
-            total_credit = cached_metrics['total_credit']
-            today_credit = cached_metrics['today_credit']
-        else:
-            # Calculate metrics (expensive queries)
-            today_sales = Sale.objects.filter(
-                user=user,
-                sale_date__range=(today_start, today_end)
-            ).aggregate(total=Sum('total_amount'))['total'] or Decimal('0')
-            
-            month_sales = Sale.objects.filter(
-                user=user,
-                sale_date__gte=month_start_dt,
-                sale_date__lte=today_end
-            ).aggregate(total=Sum('total_amount'))['total'] or Decimal('0')
-            
-            total_customers = Customer.objects.filter(user=user).count()
-            total_products = Product.objects.filter(user=user).count()
-            
-            # Calculate pending credit from unpaid sales (using remaining amounts)
-            all_unpaid_sales = Sale.objects.filter(user=user, is_paid=False)
-            total_credit = sum(sale.remaining_amount for sale in all_unpaid_sales) or Decimal('0')
-            
-            # Calculate today's unpaid sales
-            today_unpaid_sales = Sale.objects.filter(
-                user=user, 
-                sale_date__range=(today_start, today_end),
-                is_paid=False
-            )
-            today_credit = sum(sale.remaining_amount for sale in today_unpaid_sales) or Decimal('0')
-            
-            # Cache for 5 minutes (300 seconds)
-            cache.set(cache_key, {
-                'today_sales': today_sales,
-                'month_sales': month_sales,
-                'total_customers': total_customers,
-                'total_products': total_products,
-                'total_credit': total_credit,
-                'today_credit': today_credit,
-            }, 300)
-        
-        # Get recent sales with proper timezone handling and optimized queries
-        recent_sales = Sale.objects.filter(
-            user=user,
-            sale_date__lte=today_end
-        ).select_related('customer').prefetch_related('items__product')[:5]
-        
-        low_stock_products = Product.objects.filter(
-            user=user,
-            stock_quantity__lt=10,
-            is_active=True
-        ).order_by('stock_quantity')[:5]
-        
-        # Calculate top products with proper aggregation
-        top_products = SaleItem.objects.filter(
-            sale__user=user,
-            sale__sale_date__lte=today_end
-        ).values('product__name').annotate(
-            total_quantity=Sum('quantity'),
-            total_revenue=Sum(F('quantity') * F('price_at_sale'), output_field=DecimalField())
-        ).order_by('-total_revenue')[:5]
-        
-        # Prepare top products chart data
-        product_labels = [p['product__name'] for p in top_products]
-        product_data = [float(p['total_revenue']) for p in top_products]
-        
-        # Prepare monthly sales data for the last 6 months
-        import calendar
-        
-        monthly_labels = []
-        monthly_data = []
-        
-        # Get data for the last 6 months
-        for i in range(5, -1, -1):
-            # Calculate the month
-            month = today.month - i
-            year = today.year
-            if month <= 0:
-                month += 12
-                year -= 1
-            
-            # Get first and last day of the month
-            first_day = datetime(year, month, 1).date()
-            # For the current month, use today as the end date instead of the last day of the month
-            if month == today.month and year == today.year:
-                last_day = today
-            else:
-                last_day = datetime(year, month, calendar.monthrange(year, month)[1]).date()
-            
-            # Prepare day range for accuracy
-            first_day_dt = timezone.make_aware(datetime.combine(first_day, time.min))
-            last_day_dt = timezone.make_aware(datetime.combine(last_day, time.max))
-
-            # Get sales for this month with proper timezone handling
-            monthly_sales = Sale.objects.filter(
-                user=user,
-                sale_date__range=(first_day_dt, last_day_dt)
-            ).aggregate(total=Sum('total_amount'))['total'] or Decimal('0')
-            
-            # Add to lists
-            monthly_labels.append(first_day.strftime('%b %Y'))
-            monthly_data.append(float(monthly_sales))
+            profile = UserProfile.objects.create(user=request.user)
         
         context = {
             'profile': profile,
-            'today': today,
-            'today_sales': today_sales,
-            'monthly_sales': month_sales,
-            'total_customers': total_customers,
-            'total_products': total_products,
-            'total_credit': total_credit,
-            'today_credit': today_credit,
-            'recent_sales': recent_sales,
-            'top_products': top_products,
-            'low_stock_products': low_stock_products,
-            'monthly_labels': monthly_labels,
-            'monthly_data': monthly_data,
-            'product_labels': product_labels,
-            'product_data': product_data,
+            'widgets': list(dashboard.WIDGETS),
         }
-        
         return render(request, 'customers/dashboard.html', context)
 
 
+@method_decorator(login_required, name='dispatch')
+class DashboardWidgetView(View):
+    """One dashboard widget as JSON, cached per widget and revalidated with its ETag"""
+    
+    def get(self, request, name):
+        if name not in dashboard.WIDGETS:
+            return JsonResponse({'error': 'Unknown widget'}, status=404)
+        
+        today = timezone.localdate()
+        key = dashboard.widget_key(name, request.user, today)
+        etag = quote_etag(dashboard.etag(key))
+        client_etags = [tag.removeprefix('W/') for tag in parse_etags(request.headers.get('If-None-Match', ''))]
+        
+        if etag in client_etags:
+            response = HttpResponseNotModified()
+        else:
+            response = JsonResponse(dashboard.widget_data(name, request.user, today, key))
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
 @method_decorator(login_required, name='dispatch')
 class ProfileView(View):
     """User profile management"""
@@ -470,9 +361,10 @@ class CustomerListView(View):
     """List all customers with search, filter, and pagination"""
     
     def get(self, request):
-        # Get all customers with last purchase date
+        # Get all customers with last purchase date; pending credit comes from the ledger column
         customers = Customer.objects.filter(user=request.user).annotate(
-            last_purchase_date=Max('sales__sale_date')
+            last_purchase_date=Max('sales__sale_date'),
+            pending_credit=F('credit_amount'),
         )
         
         # Search by name or phone
@@ -482,31 +374,22 @@ class CustomerListView(View):
                 Q(name__icontains=search) | Q(phone__icontains=search)
             )
         
-        # Order by latest activity
-        customers = customers.order_by('-last_purchase_date', '-created_at')
-        
-        # Convert to list and calculate pending credit for each customer
-        customers_list = []
-        for customer in customers:
-            # Calculate pending credit from unpaid sales
-            unpaid_sales = customer.sales.filter(is_paid=False)
-            pending_credit = sum(sale.remaining_amount for sale in unpaid_sales) or Decimal('0')
-            customer.pending_credit = pending_credit
-            customers_list.append(customer)
-        
-        # Filter by credit status in Python
+        # Filter by credit status
         credit_filter = request.GET.get('credit_filter', 'all')
         if credit_filter == 'remaining':
-            customers_list = [c for c in customers_list if c.pending_credit > 0]
+            customers = customers.filter(credit_amount__gt=0)
         elif credit_filter == 'cleared':
-            customers_list = [c for c in customers_list if c.pending_credit <= 0]
+            customers = customers.filter(credit_amount__lte=0)
+        
+        # Order by latest activity
+        customers = customers.order_by('-last_purchase_date', '-created_at')
         
         # Pagination (10 per page)
         page = int(request.GET.get('page', 1))
         per_page = 10
-        total = len(customers_list)
+        total = customers.count()
         start = (page - 1) * per_page
-        customers_page = customers_list[start:start + per_page]
+        customers_page = customers[start:start + per_page]
         
         context = {
             'customers': customers_page,
@@ -556,32 +439,12 @@ class CustomerCreateView(View):
         )
         
         if is_ajax:
-            # Invalidate dashboard cache
-            try:
-                from django.utils import timezone
-                from django.core.cache import cache
-                today = timezone.now().date()
-                cache_key = f'dashboard_metrics_{request.user.id}_{today}'
-                cache.delete(cache_key)
-            except Exception:
-                pass
-
             return JsonResponse({
                 'success': True, 
                 'message': 'Customer added successfully!',
                 'customer_id': customer.id
             })
         
-        # Invalidate dashboard cache
-        try:
-            from django.utils import timezone
-            from django.core.cache import cache
-            today = timezone.now().date()
-            cache_key = f'dashboard_metrics_{request.user.id}_{today}'
-            cache.delete(cache_key)
-        except Exception:
-            pass
-        
         messages.success(request, 'Customer added successfully!')
         return redirect('customers:customer-list')
 
@@ -592,47 +455,42 @@ class CustomerDetailView(View):
     
     def get(self, request, pk):
         customer = get_object_or_404(Customer, pk=pk, user=request.user)
+        purchases = Sale.objects.filter(customer=customer, user=request.user)
         
-        # Get all purchases with items
-        purchases = Sale.objects.filter(
-            customer=customer
-        ).prefetch_related('items__product').order_by('-sale_date')
-        
-        # Build credit transaction history
-        credit_transactions = []
-        
-        # Add credit transactions (unpaid sales)
-        for sale in Sale.objects.filter(customer=customer, added_to_credit=True).order_by('sale_date'):
-            credit_transactions.append({
-                'date': sale.sale_date,
-                'type': 'credit',
-                'amount': sale.total_amount,
-                'description': f'Sale #{sale.id}'
+        # Both histories are paged by cursor; customer_detail.js fetches later pages on scroll
+        partial = request.GET.get('partial')
+        if partial == 'purchases':
+            page, next_cursor, _ = paginate_sales(purchases.prefetch_related('items__product'), request.GET.get('cursor'))
+            return JsonResponse({
+                'rows': render_to_string('customers/customer_purchase_rows.html', {'purchases': page}, request),
+                'next_cursor': next_cursor,
+            })
+        if partial == 'credit':
+            page, next_cursor = paginate_timeline(customer, request.GET.get('cursor'))
+            return JsonResponse({
+                'rows': render_to_string('customers/customer_credit_rows.html', {'credit_transactions': page}, request),
+                'next_cursor': next_cursor,
             })
         
-        # Sort by date (newest first)
-        credit_transactions.sort(key=lambda x: x['date'], reverse=True)
-        
-        # Self-heal stats: Recalculate totals from actual sales to ensure accuracy
-        real_visits = purchases.count()
-        real_purchased = purchases.aggregate(total=Sum('total_amount'))['total'] or Decimal('0')
-        
-        if customer.total_visits != real_visits or abs(customer.total_purchased - real_purchased) > Decimal('0.01'):
-            customer.total_visits = real_visits
-            customer.total_purchased = real_purchased
-            customer.save()
+        purchase_page, purchases_cursor, _ = paginate_sales(purchases.prefetch_related('items__product'))
+        credit_page, credit_cursor = paginate_timeline(customer)
         
-        # Calculate pending credit from unpaid sales (remaining amounts)
-        unpaid_sales = purchases.filter(is_paid=False)
-        pending_credit = sum(sale.remaining_amount for sale in unpaid_sales) or Decimal('0')
+        # Header stats straight from the sales in one query; drifted counters on the
+        # customer row are repaired by the reconcile_customer_stats worker, not here
+        stats = purchases.aggregate(
+            visits=Count('id'),
+            purchased=Sum('total_amount', default=Decimal('0')),
+            paid=Sum('total_amount', filter=Q(is_paid=True), default=Decimal('0')),
+        )
         
-        # Calculate total paid amount from purchases
-        total_paid = purchases.filter(is_paid=True).aggregate(total=Sum('total_amount'))['total'] or Decimal('0')
+        # Pending credit is maintained on the customer row by the ledger
+        pending_credit = customer.credit_amount
+        total_paid = stats['paid']
         
         # Determine payment status based on actual unpaid sales
         if pending_credit == 0:
             payment_status = 'Paid'
-        elif pending_credit < customer.total_purchased:
+        elif pending_credit < stats['purchased']:
             payment_status = 'Partially Paid'
         else:
             payment_status = 'Due'
@@ -650,8 +508,11 @@ class CustomerDetailView(View):
         
         context = {
             'customer': customer,
-            'purchases': purchases,
-            'credit_transactions': credit_transactions,
+            'stats': stats,
+            'purchases': purchase_page,
+            'purchases_cursor': purchases_cursor,
+            'credit_transactions': credit_page,
+            'credit_cursor': credit_cursor,
             'pending_credit': pending_credit,
             'total_paid': total_paid,
             'payment_status': payment_status,
@@ -689,18 +550,9 @@ class CustomerDeleteView(View):
     
     def post(self, request, pk):
         customer = get_object_or_404(Customer, pk=pk, user=request.user)
+        customer_id = customer.pk
         customer.delete()
-        
-        # Invalidate dashboard cache
-        try:
-            from django.utils import timezone
-            from django.core.cache import cache
-            today = timezone.now().date()
-            cache_key = f'dashboard_metrics_{request.user.id}_{today}'
-            cache.delete(cache_key)
-        except Exception:
-            pass
-            
+        catalog.record_deletion(request.user, 'customer', customer_id)
         messages.success(request, 'Customer deleted successfully!')
         return redirect('customers:customer-list')
 
@@ -715,47 +567,12 @@ class CreditPaymentView(View):
         try:
             amount = Decimal(request.POST.get('amount', 0))
             
-            if amount <= 0:
-                messages.error(request, 'Invalid payment amount!')
-                return redirect('customers:customer-detail', pk=pk)
-            
-            # Calculate total pending credit from unpaid sales (remaining amounts)
-            unpaid_sales = customer.sales.filter(is_paid=False).order_by('sale_date')
-            pending_credit = sum(sale.remaining_amount for sale in unpaid_sales) or Decimal('0')
-            
-            if amount > pending_credit:
-                messages.error(request, 'Payment amount exceeds outstanding credit!')
+            try:
+                record_payment(request.user, customer.pk, amount)
+            except PaymentError as e:
+                messages.error(request, str(e))
                 return redirect('customers:customer-detail', pk=pk)
             
-            # Apply payment to unpaid sales (FIFO - oldest first)
-            remaining_payment = amount
-            
-            for sale in unpaid_sales:
-                if remaining_payment <= 0:
-                    break
-                
-                sale_remaining = sale.remaining_amount
-                
-                if remaining_payment >= sale_remaining:
-                    # Pay off this entire sale
-                    sale.amount_paid = sale.total_amount
-                    sale.is_paid = True
-                    remaining_payment -= sale_remaining
-                else:
-                    # Partial payment to this sale
-                    sale.amount_paid += remaining_payment
-                    remaining_payment = 0
-                
-                sale.save()
-            
-            # Invalidate dashboard cache
-            try:
-                today = timezone.now().date()
-                cache_key = f'dashboard_metrics_{request.user.id}_{today}'
-                cache.delete(cache_key)
-            except Exception as e:
-                pass
-                
             messages.success(request, f'✅ Payment of ₹{amount:.2f} recorded successfully!')
         except Exception as e:
             logger.error(f"Error recording payment for customer {pk}: {str(e)}", exc_info=True)
@@ -927,7 +744,7 @@ class ProductDataView(View):
             'unit': product.unit,
             'stock_quantity': str(product.stock_quantity),
             'description': product.description,
-            'image': product.image.url if product.image else None,
+            'image': images.variant_url(product.image, 'card') or None,
             'is_active': product.is_active,
         }
         return JsonResponse(data)
@@ -965,12 +782,43 @@ class ProductDetailView(View):
 
 @method_decorator(login_required, name='dispatch')
 class ProductImportView(View):
-    """Import products from CSV/Excel (placeholder)"""
+    """Queue a CSV/XLSX product import; the page follows it through ImportStatusView"""
+    
+    kind = 'products'
     
     def post(self, request):
-        # Placeholder for import functionality
-        messages.info(request, 'Import functionality coming soon!')
-        return redirect('customers:product-list')
+        upload = request.FILES.get('file')
+        if upload is None or not imports.supported(upload.name, self.kind):
+            extensions = ' or '.join(imports.IMPORTERS[self.kind].extensions)
+            return JsonResponse({'success': False, 'message': f'Upload a {extensions} file'}, status=400)
+        
+        job = ImportJob.objects.create(
+            user=request.user,
+            kind=self.kind,
+            file=upload,
+            dry_run=request.POST.get('dry_run') in ('1', 'on', 'true'),
+        )
+        return JsonResponse({
+            'success': True,
+            'job_id': job.pk,
+            'status_url': reverse('customers:import-status', args=[job.pk]),
+        })
+
+
+@method_decorator(login_required, name='dispatch')
+class CustomerImportView(ProductImportView):
+    """Queue a CSV/XLSX customer import or a phone contact export (.vcf)"""
+    
+    kind = 'customers'
+
+
+@method_decorator(login_required, name='dispatch')
+class ImportStatusView(View):
+    """Progress and row errors of an import job"""
+    
+    def get(self, request, pk):
+        job = get_object_or_404(ImportJob, pk=pk, user=request.user)
+        return JsonResponse(imports.progress(job))
 
 
 @method_decorator(login_required, name='dispatch')
@@ -978,26 +826,20 @@ class ProductExportView(View):
     """Export products to CSV"""
     
     def get(self, request):
-        import csv
-        from django.http import HttpResponse
-        
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="products.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow(['Name', 'Category', 'Price', 'Unit', 'Stock Quantity'])
-        
         products = Product.objects.filter(user=request.user, is_active=True)
-        for product in products:
-            writer.writerow([
-                product.name,
-                product.get_category_display(),
-                product.price,
-                product.get_unit_display(),
-                product.stock_quantity,
-            ])
         
-        return response
+        def rows():
+            yield ['Name', 'Category', 'Price', 'Unit', 'Stock Quantity']
+            for product in products.iterator(chunk_size=CHUNK_SIZE):
+                yield [
+                    product.name,
+                    product.get_category_display(),
+                    product.price,
+                    product.get_unit_display(),
+                    product.stock_quantity,
+                ]
+        
+        return stream_csv(rows(), 'products.csv')
 
 
 @method_decorator(login_required, name='dispatch')
@@ -1030,61 +872,17 @@ class BillingView(View):
         except UserProfile.DoesNotExist:
             profile = UserProfile.objects.create(user=request.user)
             
-        customers = Customer.objects.filter(user=request.user)
-        products = Product.objects.filter(user=request.user, is_active=True)
-        
-        # Prepare JSON data for JavaScript
-        products_data = [{
-            'id': p.id,
-            'name': p.name,
-            'price': str(p.price),
-            'unit': p.unit,
-            'stock_quantity': str(p.stock_quantity),
-            'is_active': p.is_active,
-            'product_type': p.product_type,  # Add product type
-        } for p in products]
-        
-        customers_data = [{
-            'id': c.id,
-            'name': c.name,
-            'phone': c.phone,
-            'credit_amount': str(c.credit_amount),
-        } for c in customers]
+        user = request.user
         
-        # Cache active offers for 10 minutes (rarely change during user session)
-        cache_key = f'active_offers_{request.user.id}'
-        offers_data = cache.get(cache_key)
-        
-        if not offers_data:
-            # Fetch and serialize offers (expensive query)
-            active_offers = Offer.objects.filter(
-                user=request.user, 
-                is_active=True,
-                start_date__lte=timezone.now(),
-                end_date__gte=timezone.now()
-            )
-            offers_data = [{
-                'id': o.id,
-                'name': o.name,
-                'type': o.offer_type,
-                'discount_value': str(o.discount_value),
-                'min_purchase_amount': str(o.min_purchase_amount),
-                'buy_quantity': o.buy_quantity,
-                'get_quantity': o.get_quantity,
-                'applicable_products': list(o.applicable_products.values_list('id', flat=True))
-            } for o in active_offers]
-            
-            # Cache for 10 minutes
-            cache.set(cache_key, offers_data, 600)
+        # Products and customers are synced by the page from BillingCatalogAPI; the offer
+        # engine is cached per offers version and also expires after 10 minutes because
+        # offers start and end on their own schedule
+        offers_json = offers.as_json(offers.engine_for(user))
         
         context = {
             'profile': profile,
             'shop_name': profile.shop_name or "SubhLabh",
-            'customers': customers,
-            'products': products,
-            'products_json': json.dumps(products_data),
-            'customers_json': json.dumps(customers_data),
-            'offers_json': json.dumps(offers_data),
+            'offers_json': offers_json,
             'payment_methods': Sale.PAYMENT_CHOICES,
             'current_time': timezone.now(),
         }
@@ -1099,135 +897,33 @@ class BillingView(View):
             is_paid = data.get('is_paid', True)
             notes = data.get('notes', '')
             applied_offer_id = data.get('offer_id')
-            discount_amount = Decimal(str(data.get('discount_amount', 0)))
             
             if not items:
                 return JsonResponse({'success': False, 'message': 'No items in bill'})
             
-            total_amount = Decimal('0')
-            sale_items = []
-            
-            # ... item processing ...
-            items_total = Decimal('0')
-            
-            for item in items:
-                # Handle custom items
-                if 'custom_name' in item:
-                    # Create a temporary product for this custom item
-                    product = Product.objects.create(
-                        user=request.user,
-                        name=item['custom_name'],
-                        description=item.get('custom_description', ''),
-                        price=Decimal(str(item['custom_price'])),
-                        product_type='service',  # Treat custom items as services
-                        unit='',  # No unit for services
-                        stock_quantity=Decimal('0'),  # No stock for services
-                        is_active=False  # Mark as inactive since it's a one-time item
-                    )
-                    product_id = product.id
-                    quantity = Decimal(str(item.get('quantity', 1)))
-                    price = Decimal(str(item['custom_price']))
-                else:
-                    # Handle regular products/services
-                    product_id = item.get('product_id')
-                    quantity = Decimal(str(item.get('quantity', 0)))
-                    price = Decimal(item.get('price', 0))
-                
-                if quantity <= 0:
-                    continue
-                
-                product = get_object_or_404(Product, pk=product_id, user=request.user)
-                
-                # Only check stock for actual products, not services
-                if product.product_type == 'product' and product.stock_quantity < quantity:
-                    return JsonResponse({
-                        'success': False,
-                        'message': f'Insufficient stock for {product.name}'
-                    })
-                
-                item_total = quantity * price
-                items_total += item_total
-                sale_items.append({
-                    'product': product,
-                    'quantity': quantity,
-                    'price': price,
-                })
-            
-            # Calculate final total after discount
-            # Verify discount on server side for security (optional but recommended)
-            # For now, trusting frontend sent discount or recalculating basic ones
-            
-            final_total_amount = items_total - discount_amount
-            if final_total_amount < 0:
-                final_total_amount = Decimal('0')
-
-            customer = None
-            if customer_id:
-                customer = get_object_or_404(Customer, pk=customer_id, user=request.user)
-            
-            sale = Sale.objects.create(
-                user=request.user,
-                customer=customer,
-                total_amount=final_total_amount,
-                discount_amount=discount_amount,
+            # Any discount sent by the page is ignored; checkout evaluates the chosen offer
+            sale = create_sale(
+                request.user,
+                items,
+                customer_id=customer_id,
                 payment_method=payment_method,
                 is_paid=is_paid,
-                added_to_credit=not is_paid,
-                notes=notes
+                notes=notes,
+                offer_id=applied_offer_id,
             )
             
-            if applied_offer_id:
-                try:
-                    offer = Offer.objects.get(pk=applied_offer_id, user=request.user)
-                    SaleOffer.objects.create(
-                        sale=sale,
-                        offer=offer,
-                        discount_amount=discount_amount
-                    )
-                except Offer.DoesNotExist:
-                    pass
-            
-            for item_data in sale_items:
-                product = item_data['product']
-                quantity = item_data['quantity']
-                price = item_data['price']
-                
-                SaleItem.objects.create(
-                    sale=sale,
-                    product=product,
-                    quantity=quantity,
-                    price_at_sale=price
-                )
-                
-                # Only reduce stock for actual products, not services
-                if product.product_type == 'product':
-                    product.stock_quantity -= quantity
-                    product.save()
-            
-            if customer:
-                customer.total_purchased += total_amount
-                customer.total_visits += 1
-                
-                if not is_paid:
-                    customer.credit_amount += total_amount
-                
-                customer.save()
-            
-            # Invalidate dashboard cache
-            try:
-                today = timezone.now().date()
-                cache_key = f'dashboard_metrics_{request.user.id}_{today}'
-                cache.delete(cache_key)
-            except Exception as e:
-                logger.error(f"Error invalidating cache: {e}")
-
             return JsonResponse({
                 'success': True,
                 'message': 'Sale recorded successfully!',
                 'sale_id': sale.id,
-                'total_amount': str(total_amount)
+                'total_amount': str(sale.total_amount),
+                # May differ from the page's preview when the chosen offer stopped applying
+                'offer_id': sale.applied_offer_id,
+                'discount_amount': str(sale.discount_amount),
             })
         
+        except CheckoutError as e:
+            return JsonResponse({'success': False, 'message': str(e)})
         except Exception as e:
             logger.error(f"Error creating sale for user {request.user.id}: {str(e)}", exc_info=True)
             return JsonResponse({'success': False, 'message': str(e)})
@@ -1237,47 +933,39 @@ class BillingView(View):
 class SalesHistoryView(View):
     """View sales history with search and filters"""
     
-    def get(self, request):
-        from django.utils import timezone
-        from datetime import datetime, timedelta
-        
-        # Check if this is a download request
-        download_format = request.GET.get('format')
-        if download_format:
-            return self.download_sales_data(request, download_format)
-        
-        # Base queryset
-        sales = Sale.objects.filter(user=request.user).select_related('customer').prefetch_related('items__product')
-        
-        # Get filter parameters
+    FILTERS = ('search', 'date_from', 'date_to', 'payment_method', 'customer_id')
+    
+    def filter_sales(self, request, sales):
+        """Apply the search and filter parameters shared by the list, count and download"""
         search_query = request.GET.get('search', '').strip()
         date_from = request.GET.get('date_from')
         date_to = request.GET.get('date_to')
         payment_method = request.GET.get('payment_method')
         customer_id = request.GET.get('customer_id')
-        page = int(request.GET.get('page', 1))
         
-        # Search by customer name, product name, or bill number
+        # Search by customer name, product name, or bill number; products are matched
+        # with EXISTS so a sale with several matching items is not joined into duplicates
         if search_query:
+            item_matches = SaleItem.objects.filter(sale=OuterRef('pk'), product__name__icontains=search_query)
             sales = sales.filter(
                 Q(id__icontains=search_query) |
                 Q(customer__name__icontains=search_query) |
                 Q(customer__phone__icontains=search_query) |
-                Q(items__product__name__icontains=search_query)
-            ).distinct()
+                Exists(item_matches)
+            )
         
-        # Date range filter
+        # Date range filter on local calendar days, as a plain range on sale_date
         if date_from:
             try:
-                from_date = datetime.strptime(date_from, '%Y-%m-%d')
-                sales = sales.filter(sale_date__date__gte=from_date)
+                from_date = datetime.strptime(date_from, '%Y-%m-%d').date()
+                sales = sales.filter(sale_date__gte=timezone.make_aware(datetime.combine(from_date, time.min)))
             except ValueError:
                 pass
         
         if date_to:
             try:
-                to_date = datetime.strptime(date_to, '%Y-%m-%d')
-                sales = sales.filter(sale_date__date__lte=to_date)
+                to_date = datetime.strptime(date_to, '%Y-%m-%d').date()
+                sales = sales.filter(sale_date__lte=timezone.make_aware(datetime.combine(to_date, time.max)))
             except ValueError:
                 pass
         
@@ -1292,133 +980,87 @@ class SalesHistoryView(View):
         if customer_id:
             sales = sales.filter(customer_id=customer_id)
         
-        # Order by most recent first
-        sales = sales.order_by('-sale_date')
+        return sales
+    
+    def get(self, request):
+        # Check if this is a download request
+        download_format = request.GET.get('format')
+        if download_format:
+            return self.download_sales_data(request, download_format)
+        
+        sales = self.filter_sales(request, Sale.objects.filter(user=request.user))
         
-        # Pagination
-        per_page = 20
-        total_count = sales.count()
-        total_pages = (total_count + per_page - 1) // per_page
-        start = (page - 1) * per_page
-        sales_page = sales[start:start + per_page]
+        # The total is only counted when the page asks for it, and cached until the next sale
+        if request.GET.get('count'):
+            filters = [request.GET.get(name, '') for name in self.FILTERS]
+            total_count = caching.get_or_set('sales_history', request.user, ('sales',), sales.count, 300, *filters)
+            return JsonResponse({'count': total_count})
         
-        # Generate page range
-        page_range = []
-        if total_pages <= 7:
-            page_range = list(range(1, total_pages + 1))
-        else:
-            if page <= 4:
-                page_range = list(range(1, 6)) + ['...', total_pages]
-            elif page >= total_pages - 3:
-                page_range = [1, '...'] + list(range(total_pages - 4, total_pages + 1))
-            else:
-                page_range = [1, '...'] + list(range(page - 1, page + 2)) + ['...', total_pages]
+        sales_page, next_cursor, prev_cursor = paginate_sales(
+            sales.select_related('customer').prefetch_related('items__product'),
+            request.GET.get('cursor'),
+        )
+        
+        # Infinite scroll fetches the next page as rendered rows
+        if request.GET.get('partial'):
+            return JsonResponse({
+                'rows': render_to_string('customers/sales_history_rows.html', {'sales': sales_page}, request),
+                'cards': render_to_string('customers/sales_history_cards.html', {'sales': sales_page}, request),
+                'next_cursor': next_cursor,
+            })
         
         context = {
             'sales': sales_page,
-            'total_count': total_count,
-            'customers': Customer.objects.filter(user=request.user),
-            'search_query': search_query,
-            'date_from': date_from,
-            'date_to': date_to,
-            'payment_method': payment_method,
-            'customer_id': customer_id,
-            'page': page,
-            'total_pages': total_pages,
-            'page_range': page_range,
+            'search_query': request.GET.get('search', '').strip(),
+            'date_from': request.GET.get('date_from'),
+            'date_to': request.GET.get('date_to'),
+            'payment_method': request.GET.get('payment_method'),
+            'customer_id': request.GET.get('customer_id'),
+            'next_cursor': next_cursor,
+            'prev_cursor': prev_cursor,
         }
         return render(request, 'customers/sales_history.html', context)
     
     def download_sales_data(self, request, format_type):
         """Download sales data in specified format"""
-        import csv
-        from django.http import HttpResponse
-        from datetime import datetime
-        
-        # Base queryset
-        sales = Sale.objects.filter(user=request.user).select_related('customer').prefetch_related('items__product')
-        
-        # Get filter parameters
-        search_query = request.GET.get('search', '').strip()
-        date_from = request.GET.get('date_from')
-        date_to = request.GET.get('date_to')
-        payment_method = request.GET.get('payment_method')
-        customer_id = request.GET.get('customer_id')
-        
-        # Apply filters
-        if search_query:
-            sales = sales.filter(
-                Q(id__icontains=search_query) |
-                Q(customer__name__icontains=search_query) |
-                Q(customer__phone__icontains=search_query) |
-                Q(items__product__name__icontains=search_query)
-            ).distinct()
-        
-        if date_from:
-            try:
-                from_date = datetime.strptime(date_from, '%Y-%m-%d')
-                sales = sales.filter(sale_date__date__gte=from_date)
-            except ValueError:
-                pass
-        
-        if date_to:
-            try:
-                to_date = datetime.strptime(date_to, '%Y-%m-%d')
-                sales = sales.filter(sale_date__date__lte=to_date)
-            except ValueError:
-                pass
-        
-        if payment_method:
-            if payment_method == 'credit':
-                sales = sales.filter(is_paid=False)
-            else:
-                sales = sales.filter(payment_method=payment_method, is_paid=True)
-        
-        if customer_id:
-            sales = sales.filter(customer_id=customer_id)
-        
-        # Order by most recent first
-        sales = sales.order_by('-sale_date')
+        # Items are prefetched per chunk while streaming
+        sales = self.filter_sales(request, Sale.objects.filter(user=request.user).select_related('customer'))
         
         if format_type == 'csv':
-            # Create CSV response
-            response = HttpResponse(content_type='text/csv')
-            response['Content-Disposition'] = 'attachment; filename="sales_data_detailed.csv"'
-            
-            writer = csv.writer(response)
-            # Write header with detailed columns
-            writer.writerow([
-                'Date', 'Time', 'Customer Name', 'Customer Phone',
-                'Payment Method', 'Payment Status', 'Total Amount', 
-                'Product Name', 'Quantity', 'Unit', 'Price Per Unit', 'Item Total',
-                'Notes'
-            ])
-            
-            # Write data - one row per sale item
-            for sale in sales:
-                # Write a row for each item in the sale
-                for item in sale.items.all():
+            def rows():
+                # Header with detailed columns
+                yield [
+                    'Date', 'Time', 'Customer Name', 'Customer Phone',
+                    'Payment Method', 'Payment Status', 'Total Amount', 
+                    'Product Name', 'Quantity', 'Unit', 'Price Per Unit', 'Item Total',
+                    'Notes'
+                ]
+                
+                # One row per sale item, most recent sales first
+                for sale in iterate_sales(sales, prefetch=['items__product']):
                     # Format date properly to avoid # characters
-                    sale_date_str = sale.sale_date.strftime('%Y-%m-%d')
-                    sale_time_str = sale.sale_date.strftime('%H:%M:%S')
+                    local_sale_date = timezone.localtime(sale.sale_date)
+                    sale_date_str = local_sale_date.strftime('%Y-%m-%d')
+                    sale_time_str = local_sale_date.strftime('%H:%M:%S')
                     
-                    writer.writerow([
-                        sale_date_str,  # Properly formatted date string
-                        sale_time_str,  # Properly formatted time string
-                        sale.customer.name if sale.customer else 'Walk-in Customer',
-                        sale.customer.phone if sale.customer else '',
-                        sale.get_payment_method_display(),
-                        'Paid' if sale.is_paid else 'Udhar',
-                        sale.total_amount,
-                        item.product.name,
-                        item.quantity,
-                        item.product.unit,
-                        item.price_at_sale,
-                        item.total_amount,
-                        sale.notes or ''
-                    ])
-            
-            return response
+                    for item in sale.items.all():
+                        yield [
+                            sale_date_str,  # Properly formatted date string
+                            sale_time_str,  # Properly formatted time string
+                            sale.customer.name if sale.customer else 'Walk-in Customer',
+                            sale.customer.phone if sale.customer else '',
+                            sale.get_payment_method_display(),
+                            'Paid' if sale.is_paid else 'Udhar',
+                            sale.total_amount,
+                            item.product.name,
+                            item.quantity,
+                            item.product.unit,
+                            item.price_at_sale,
+                            item.total_amount,
+                            sale.notes or ''
+                        ]
+            
+            return stream_csv(rows(), 'sales_data_detailed.csv')
         else:
             # Default to CSV if format not recognized
             return HttpResponse("Unsupported format", status=400)
@@ -1573,48 +1215,9 @@ class SaleDeleteView(View):
     
     def post(self, request, pk):
         try:
-            sale = get_object_or_404(Sale, pk=pk, user=request.user)
-            
-            # Restore product stock
-            for item in sale.items.all():
-                product = item.product
-                # Only restore stock for physical products
-                if product.product_type == 'product':
-                    product.stock_quantity += item.quantity
-                    product.save()
-            
-            # Update customer records if applicable
-            if sale.customer:
-                customer = sale.customer
-                customer.total_purchased -= sale.total_amount
-                # Ensure total purchased doesn't go below zero
-                if customer.total_purchased < 0:
-                    customer.total_purchased = 0
-                customer.total_visits -= 1
-                # Ensure total visits doesn't go below zero
-                if customer.total_visits < 0:
-                    customer.total_visits = 0
-                
-                if not sale.is_paid:
-                    customer.credit_amount -= sale.total_amount
-                    # Ensure credit amount doesn't go below zero
-                    if customer.credit_amount < 0:
-                        customer.credit_amount = 0
-                
-                customer.save()
-            
-            # Delete the sale (this will cascade delete sale items)
-            sale_id = sale.id
-            sale.delete()
-            
-            # Invalidate dashboard cache
-            try:
-                from django.utils import timezone
-                today = timezone.now().date()
-                cache_key = f'dashboard_metrics_{request.user.id}_{today}'
-                cache.delete(cache_key)
-            except Exception as e:
-                pass
+            # Stock, customer counters, credit and rollups are reversed in one transaction
+            if not void_sales(request.user, Sale.objects.filter(pk=pk)):
+                return JsonResponse({'success': False, 'message': 'Sale not found'}, status=404)
             
             return JsonResponse({
                 'success': True,
@@ -1628,6 +1231,46 @@ class SaleDeleteView(View):
             })
 
 
+@method_decorator(login_required, name='dispatch')
+class SaleVoidDayView(View):
+    """
+    Void every sale of one day (e.g. a day billed in training or twice by mistake).
+    The POST must confirm how many sales it expects to void (expected_count, as the page
+    showed them); a GET returns that count for the page to show.
+    """
+    
+    def parse_day(self, params):
+        try:
+            return datetime.strptime(params.get('date', ''), '%Y-%m-%d').date()
+        except ValueError:
+            return None
+    
+    def get(self, request):
+        day = self.parse_day(request.GET)
+        if day is None:
+            return JsonResponse({'success': False, 'message': 'Invalid date'}, status=400)
+        return JsonResponse({'success': True, 'count': day_sales(day).filter(user=request.user).count()})
+    
+    def post(self, request):
+        day = self.parse_day(request.POST)
+        if day is None:
+            return JsonResponse({'success': False, 'message': 'Invalid date'}, status=400)
+        try:
+            expected = int(request.POST['expected_count'])
+        except (KeyError, ValueError):
+            return JsonResponse({'success': False, 'message': 'Confirm how many sales to void'}, status=400)
+        
+        try:
+            voided = void_day(request.user, day, expected=expected)
+        except CheckoutError as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=409)
+        return JsonResponse({
+            'success': True,
+            'voided': voided,
+            'message': f'{voided} sale(s) voided for {day:%d %b %Y}'
+        })
+
+
 @method_decorator(login_required, name='dispatch')
 class SalePrintView(View):
     """Generate printable bill/receipt"""
@@ -1656,368 +1299,31 @@ class ReportsView(View):
             return self.download_report_data(request, download_format)
         
         user = request.user
+        filters = reports.ReportFilters.from_query(request.GET)
         
-        date_from = request.GET.get('date_from')
-        date_to = request.GET.get('date_to')
-        selected_year = request.GET.get('year')
-        
-        # Base sales queryset
-        sales = Sale.objects.filter(user=user)
-        sale_items = SaleItem.objects.filter(sale__user=user)
-        
-        # Apply date filters
-        if date_from:
-            try:
-                from_date_obj = datetime.strptime(date_from, '%Y-%m-%d').date()
-                from_date_dt = timezone.make_aware(datetime.combine(from_date_obj, time.min))
-                sales = sales.filter(sale_date__gte=from_date_dt)
-                sale_items = sale_items.filter(sale__sale_date__gte=from_date_dt)
-            except ValueError:
-                pass
-        
-        if date_to:
-            try:
-                to_date_obj = datetime.strptime(date_to, '%Y-%m-%d').date()
-                to_date_dt = timezone.make_aware(datetime.combine(to_date_obj, time.max))
-                sales = sales.filter(sale_date__lte=to_date_dt)
-                sale_items = sale_items.filter(sale__sale_date__lte=to_date_dt)
-            except ValueError:
-                pass
-        
-        # Apply year filter
-        if selected_year:
-            try:
-                year_int = int(selected_year)
-                sales = sales.filter(sale_date__year=year_int)
-                sale_items = sale_items.filter(sale__sale_date__year=year_int)
-            except ValueError:
-                pass
-        
-        # Get available years for dropdown
-        years_data = Sale.objects.filter(user=user).extra(
-            select={'year': "strftime('%%Y', sale_date)"}
-        ).values('year').distinct().order_by('-year')
-        
-        years = [item['year'] for item in years_data if item['year']]
-        
-        # 1. Monthly Sales Report
-        monthly_sales_data = sales.extra(
-            select={'month': "strftime('%%Y-%%m', sale_date)"}
-        ).values('month').annotate(
-            total_revenue=Sum('total_amount')
-        ).order_by('month')
-        
-        # Format monthly sales for display
-        monthly_sales = []
-        for item in monthly_sales_data:
-            month_str = item['month']
-            # Convert YYYY-MM to Month Year format
-            try:
-                month_date = datetime.strptime(month_str, '%Y-%m')
-                month_display = month_date.strftime('%B %Y')
-            except:
-                month_display = month_str
-            
-            monthly_sales.append({
-                'month': month_str,
-                'month_display': month_display,
-                'total_revenue': item['total_revenue'] or Decimal('0')
-            })
-        
-        # 2. Yearly Sales Report
-        yearly_sales_data = sales.extra(
-            select={'year': "strftime('%%Y', sale_date)"}
-        ).values('year').annotate(
-            total_revenue=Sum('total_amount')
-        ).order_by('year')
-        
-        yearly_sales = []
-        for item in yearly_sales_data:
-            yearly_sales.append({
-                'year': item['year'],
-                'total_revenue': item['total_revenue'] or Decimal('0')
-            })
-        
-        # 3. Product Sales Report
-        product_sales = sale_items.values('product__name').annotate(
-            total_quantity=Sum('quantity'),
-            total_revenue=Sum(F('quantity') * F('price_at_sale'), output_field=DecimalField())
-        ).order_by('-total_revenue')[:10]
-        
-        # 4. Category-wise Sales Report
-        category_sales = sale_items.values('product__category').annotate(
-            total_revenue=Sum(F('quantity') * F('price_at_sale'), output_field=DecimalField())
-        ).order_by('-total_revenue')
-        
-        # 5. Customer-wise Purchase Report
-        customer_purchases = sales.values('customer__name').annotate(
-            purchase_count=Count('id'),
-            total_amount=Sum('total_amount')
-        ).filter(customer__name__isnull=False).order_by('-total_amount')[:10]
-        
-        # 6. Daily/Weekly Comparison
-        today = timezone.now().date()
-        yesterday = today - timedelta(days=1)
-        last_7_days = today - timedelta(days=7)
-        
-        # Prepare ranges for accuracy
-        today_start = timezone.make_aware(datetime.combine(today, time.min))
-        today_end = timezone.make_aware(datetime.combine(today, time.max))
-        yesterday_start = timezone.make_aware(datetime.combine(yesterday, time.min))
-        yesterday_end = timezone.make_aware(datetime.combine(yesterday, time.max))
-        last_7_days_dt = timezone.make_aware(datetime.combine(last_7_days, time.min))
-
-        # Today's sales
-        today_sales = sales.filter(sale_date__range=(today_start, today_end)).aggregate(
-            total=Sum('total_amount')
-        )['total'] or Decimal('0')
-        
-        # Yesterday's sales
-        yesterday_sales = sales.filter(sale_date__range=(yesterday_start, yesterday_end)).aggregate(
-            total=Sum('total_amount')
-        )['total'] or Decimal('0')
-        
-        # Last 7 days sales
-        last_7_days_sales = sales.filter(sale_date__gte=last_7_days_dt).aggregate(
-            total=Sum('total_amount')
-        )['total'] or Decimal('0')
-        
-        # Calculate changes
-        if yesterday_sales > 0:
-            today_change = ((today_sales - yesterday_sales) / yesterday_sales) * 100
-            today_change_class = 'positive' if today_change >= 0 else 'negative'
-            today_change = f"{today_change:+.1f}%"
-        else:
-            today_change = "-"
-            today_change_class = ""
-        
-        if last_7_days_sales > 0:
-            # For simplicity, comparing to previous 7 days
-            last_7_days_change = 0
-            last_7_days_change_class = ''
-            last_7_days_change = f"{last_7_days_change:+.1f}%"
-        else:
-            last_7_days_change = "-"
-            last_7_days_change_class = ""
-        
-        context = {
-            'monthly_sales': monthly_sales,
-            'yearly_sales': yearly_sales,
-            'product_sales': list(product_sales),
-            'category_sales': list(category_sales),
-            'customer_purchases': list(customer_purchases),
-            'today_sales': today_sales,
-            'yesterday_sales': yesterday_sales,
-            'last_7_days_sales': last_7_days_sales,
-            'today_change': today_change,
-            'today_change_class': today_change_class,
-            'last_7_days_change': last_7_days_change,
-            'last_7_days_change_class': last_7_days_change_class,
-            'date_from': date_from,
-            'date_to': date_to,
-            'years': years,
-            'selected_year': selected_year,
-        }
+        # Report tables are cached until the shop's sales, products or customers change
+        report = caching.get_or_set(
+            'reports', user, ('sales', 'products', 'customers'),
+            lambda: reports.build_report(user, filters, sections=('periods', 'products', 'categories', 'customers'), limit=10),
+            600, timezone.localdate(), *filters.cache_parts(),
+        )
         
+        context = report.template_context()
+        context.update({
+            'date_from': request.GET.get('date_from'),
+            'date_to': request.GET.get('date_to'),
+            'selected_year': request.GET.get('year'),
+        })
         return render(request, 'customers/reports.html', context)
     
     def download_report_data(self, request, format_type):
         """Download report data in specified format"""
-        import csv
-        from django.http import HttpResponse
-        
-        user = request.user
-        
-        date_from = request.GET.get('date_from')
-        date_to = request.GET.get('date_to')
-        selected_year = request.GET.get('year')
         report_type = request.GET.get('report', 'monthly')
-        
-        # Base sales queryset
-        sales = Sale.objects.filter(user=user)
-        sale_items = SaleItem.objects.filter(sale__user=user)
-        
-        # Apply date filters
-        if date_from:
-            try:
-                from_date_obj = datetime.strptime(date_from, '%Y-%m-%d').date()
-                from_date_dt = timezone.make_aware(datetime.combine(from_date_obj, time.min))
-                sales = sales.filter(sale_date__gte=from_date_dt)
-                sale_items = sale_items.filter(sale__sale_date__gte=from_date_dt)
-            except ValueError:
-                pass
-        
-        if date_to:
-            try:
-                to_date_obj = datetime.strptime(date_to, '%Y-%m-%d').date()
-                to_date_dt = timezone.make_aware(datetime.combine(to_date_obj, time.max))
-                sales = sales.filter(sale_date__lte=to_date_dt)
-                sale_items = sale_items.filter(sale__sale_date__lte=to_date_dt)
-            except ValueError:
-                pass
-        
-        # Apply year filter
-        if selected_year:
-            try:
-                year_int = int(selected_year)
-                sales = sales.filter(sale_date__year=year_int)
-                sale_items = sale_items.filter(sale__sale_date__year=year_int)
-            except ValueError:
-                pass
-        
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="report_{report_type}.csv"'
-        
-        writer = csv.writer(response)
-        
-        # Generate report based on type
-        if report_type in ['monthly-sales', 'monthly']:
-            # Monthly Sales Report
-            monthly_sales_data = sales.extra(
-                select={'month': "strftime('%%Y-%%m', sale_date)"}
-            ).values('month').annotate(
-                total_revenue=Sum('total_amount')
-            ).order_by('month')
-            
-            writer.writerow(['Month', 'Sales (₹)'])
-            for item in monthly_sales_data:
-                month_str = item['month']
-                try:
-                    month_date = datetime.strptime(month_str, '%Y-%m')
-                    month_display = month_date.strftime('%B %Y')
-                except:
-                    month_display = month_str
-                writer.writerow([month_display, item['total_revenue']])
-                
-        elif report_type in ['yearly-sales', 'yearly']:
-            # Yearly Sales Report
-            yearly_sales_data = sales.extra(
-                select={'year': "strftime('%%Y', sale_date)"}
-            ).values('year').annotate(
-                total_revenue=Sum('total_amount')
-            ).order_by('year')
-            
-            writer.writerow(['Year', 'Sales (₹)'])
-            for item in yearly_sales_data:
-                writer.writerow([item['year'], item['total_revenue']])
-                
-        elif report_type in ['product-sales', 'product']:
-            # Product Sales Report
-            product_sales = sale_items.values('product__name').annotate(
-                total_quantity=Sum('quantity'),
-                total_revenue=Sum(F('quantity') * F('price_at_sale'), output_field=DecimalField())
-            ).order_by('-total_revenue')
-            
-            writer.writerow(['Product', 'Quantity Sold', 'Revenue (₹)'])
-            for item in product_sales:
-                writer.writerow([
-                    item['product__name'], 
-                    item['total_quantity'], 
-                    item['total_revenue']
-                ])
-                
-        elif report_type in ['category-sales', 'category']:
-            # Category Sales Report
-            category_sales = sale_items.values('product__category').annotate(
-                total_revenue=Sum(F('quantity') * F('price_at_sale'), output_field=DecimalField())
-            ).order_by('-total_revenue')
-            
-            writer.writerow(['Category', 'Sales (₹)'])
-            for item in category_sales:
-                writer.writerow([item['product__category'], item['total_revenue']])
-                
-        elif report_type in ['customer-purchases', 'customer']:
-            # Customer Purchases Report
-            customer_purchases = sales.values('customer__name').annotate(
-                purchase_count=Count('id'),
-                total_amount=Sum('total_amount')
-            ).filter(customer__name__isnull=False).order_by('-total_amount')
-            
-            writer.writerow(['Customer', 'Total Purchases', 'Amount Spent (₹)'])
-            for item in customer_purchases:
-                writer.writerow([
-                    item['customer__name'] or "Walking Customer", 
-                    item['purchase_count'], 
-                    item['total_amount']
-                ])
-                
-        elif report_type == 'offers':
-            # Offers Report
-            from .models import SaleOffer
-            sale_offers = SaleOffer.objects.filter(sale__user=user)
-            
-            if date_from:
-                try:
-                    from_date_obj = datetime.strptime(date_from, '%Y-%m-%d').date()
-                    from_date_dt = timezone.make_aware(datetime.combine(from_date_obj, time.min))
-                    sale_offers = sale_offers.filter(sale__sale_date__gte=from_date_dt)
-                except ValueError:
-                    pass
-            
-            if date_to:
-                try:
-                    to_date_obj = datetime.strptime(date_to, '%Y-%m-%d').date()
-                    to_date_dt = timezone.make_aware(datetime.combine(to_date_obj, time.max))
-                    sale_offers = sale_offers.filter(sale__sale_date__lte=to_date_dt)
-                except ValueError:
-                    pass
-            
-            if selected_year:
-                try:
-                    year_int = int(selected_year)
-                    sale_offers = sale_offers.filter(sale__sale_date__year=year_int)
-                except ValueError:
-                    pass
-            
-            offer_report = sale_offers.values('offer__title').annotate(
-                usage_count=Count('id'),
-                total_discount=Sum('discount_amount')
-            ).order_by('-usage_count')
-            
-            writer.writerow(['Offer', 'Times Used', 'Total Discount (₹)'])
-            for item in offer_report:
-                writer.writerow([
-                    item['offer__title'], 
-                    item['usage_count'], 
-                    item['total_discount']
-                ])
-                
-        elif report_type in ['daily', 'daily-comparison']:
-            # Daily Comparison Report
-            today = timezone.now().date()
-            yesterday = today - timedelta(days=1)
-            last_7_days = today - timedelta(days=7)
-            
-            # Prepare ranges for accuracy
-            today_start = timezone.make_aware(datetime.combine(today, time.min))
-            today_end = timezone.make_aware(datetime.combine(today, time.max))
-            yesterday_start = timezone.make_aware(datetime.combine(yesterday, time.min))
-            yesterday_end = timezone.make_aware(datetime.combine(yesterday, time.max))
-            last_7_days_dt = timezone.make_aware(datetime.combine(last_7_days, time.min))
-
-            today_sales = sales.filter(sale_date__range=(today_start, today_end)).aggregate(
-                total=Sum('total_amount')
-            )['total'] or Decimal('0')
-            
-            yesterday_sales = sales.filter(sale_date__range=(yesterday_start, yesterday_end)).aggregate(
-                total=Sum('total_amount')
-            )['total'] or Decimal('0')
-            
-            last_7_days_sales = sales.filter(sale_date__gte=last_7_days_dt).aggregate(
-                total=Sum('total_amount')
-            )['total'] or Decimal('0')
-            
-            writer.writerow(['Period', 'Sales (₹)'])
-            writer.writerow(['Today', today_sales])
-            writer.writerow(['Yesterday', yesterday_sales])
-            writer.writerow(['Last 7 Days', last_7_days_sales])
-            
-        else:
-            # Default report
-            writer.writerow(['Report Type', 'Value'])
-            writer.writerow(['No data available for this report type', ''])
-        
-        return response
+        section = reports.DOWNLOADS.get(report_type)
+        report = reports.build_report(
+            request.user, reports.ReportFilters.from_query(request.GET), sections=(section,) if section else ()
+        )
+        return stream_csv(reports.csv_rows(report, report_type), f'report_{report_type}.csv')
 
 
 class ProductSearchAPI(View):
@@ -2027,13 +1333,7 @@ class ProductSearchAPI(View):
         if not request.user.is_authenticated:
             return JsonResponse({'products': []})
         
-        search = request.GET.get('q', '').strip()
-        products = Product.objects.filter(
-            user=request.user,
-            is_active=True
-        ).filter(
-            Q(name__icontains=search) | Q(category__icontains=search)
-        )[:20]
+        products = search_products(request.user, request.GET.get('q', '').strip())
         
         data = [{
             'id': p.id,
@@ -2047,6 +1347,51 @@ class ProductSearchAPI(View):
         return JsonResponse({'products': data})
 
 
+@method_decorator(login_required, name='dispatch')
+class BillingCatalogAPI(View):
+    """Billing catalog (products and customers) with ETag and ?since=<version> delta sync"""
+    
+    def get(self, request):
+        since = request.GET.get('since')
+        if since:
+            delta = catalog.catalog_delta(request.user, since)
+            if delta is not None:
+                return JsonResponse(delta)
+        
+        # Unknown or expired version: send the full catalog, unless the client already has it
+        version, payload = catalog.full_catalog(request.user)
+        etag = quote_etag(str(version))
+        client_etags = [tag.removeprefix('W/') for tag in parse_etags(request.headers.get('If-None-Match', ''))]
+        
+        if etag in client_etags:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(payload, content_type='application/json')
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
+@method_decorator(login_required, name='dispatch')
+class BillingOfferPreviewAPI(View):
+    """Discount of every live offer on the bill being built, worked out by the checkout engine"""
+    
+    def post(self, request):
+        try:
+            items = json.loads(request.body).get('items', [])
+            evaluation = preview_offers(request.user, items)
+        except (ValueError, AttributeError, CheckoutError):
+            return JsonResponse({'success': False, 'message': 'Invalid bill'}, status=400)
+        
+        best_id, best_discount = evaluation.best
+        return JsonResponse({
+            'success': True,
+            'subtotal': str(evaluation.subtotal),
+            'discounts': {str(pk): str(discount) for pk, discount in evaluation.discounts.items()},
+            'best': {'offer_id': best_id, 'discount': str(best_discount)},
+        })
+
+
 class CustomerSearchAPI(View):
     """API endpoint for customer search"""
     
@@ -2054,12 +1399,7 @@ class CustomerSearchAPI(View):
         if not request.user.is_authenticated:
             return JsonResponse({'customers': []})
         
-        search = request.GET.get('q', '').strip()
-        customers = Customer.objects.filter(
-            user=request.user
-        ).filter(
-            Q(name__icontains=search) | Q(phone__icontains=search)
-        )[:20]
+        customers = search_customers(request.user, request.GET.get('q', '').strip())
         
         data = [{
             'id': c.id,
@@ -0,0 +1,213 @@
+"""
+View benchmarks
+Runs the hot pages and APIs against seeded shops of several sizes and records, per view
+and size, the number of SQL queries (on every database alias), the median wall time and
+the peak Python memory of a cold request (caches cleared). Each view declares a query
+budget that must hold at every size, which is what catches N+1 loops; times and memory
+are compared with a stored baseline.
+"""
+from django.core.cache import cache
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, asdict
+from datetime import date
+import json
+import statistics
+import time
+import tracemalloc
+
+from .models import Customer
+from . import seeding
+
+# Shop sizes passed to seeding.seed_shop
+SIZES = {
+    'small': dict(products=50, customers=50, sales=500, offers=4, days=90),
+    'medium': dict(products=1000, customers=2000, sales=20000, offers=10, days=365),
+    'large': dict(products=5000, customers=20000, sales=200000, offers=20, days=730),
+}
+
+# Fixed end date so every run benchmarks the same data
+END_DATE = date(2025, 12, 31)
+
+# A run regresses when it is this much slower or larger than the baseline; time changes
+# under MIN_SLOWDOWN_MS are ignored as noise
+TOLERANCE = 1.5
+MIN_SLOWDOWN_MS = 5
+
+
+@dataclass(frozen=True)
+class Benchmark:
+    name: str
+    url_name: str
+    max_queries: int
+    query: str = ''
+    detail: bool = False  # URL takes the busiest customer's pk
+    args: tuple = ()
+
+    def url(self, shop):
+        args = [shop.customer_id] if self.detail else list(self.args)
+        return reverse(self.url_name, args=args) + (f'?{self.query}' if self.query else '')
+
+
+BENCHMARKS = (
+    Benchmark('dashboard', 'customers:dashboard', 3),
+    Benchmark('dashboard metrics', 'customers:dashboard-widget', 6, args=('metrics',)),
+    Benchmark('dashboard chart', 'customers:dashboard-widget', 3, args=('monthly',)),
+    Benchmark('dashboard low stock', 'customers:dashboard-widget', 3, args=('low-stock',)),
+    Benchmark('billing', 'customers:billing', 5),
+    Benchmark('billing catalog', 'customers:api-billing-catalog', 5),
+    Benchmark('sales history', 'customers:sales-history', 7),
+    Benchmark('sales history count', 'customers:sales-history', 4, query='count=1'),
+    Benchmark('reports', 'customers:reports', 9),
+    Benchmark('customer list', 'customers:customer-list', 6),
+    Benchmark('customer detail', 'customers:customer-detail', 9, detail=True),
+    Benchmark('customer purchases page', 'customers:customer-detail', 6, query='partial=purchases', detail=True),
+    Benchmark('customer credit page', 'customers:customer-detail', 4, query='partial=credit', detail=True),
+    Benchmark('product list', 'customers:product-list', 6),
+    Benchmark('product search', 'customers:api-product-search', 5, query='q=tea'),
+    Benchmark('customer search', 'customers:api-customer-search', 5, query='q=sharma'),
+)
+
+
+@dataclass
+class Shop:
+    size: str
+    user: object
+    customer_id: int
+
+
+@dataclass
+class Result:
+    benchmark: str
+    size: str
+    queries: int
+    ms: float
+    peak_kb: int
+
+    @property
+    def key(self):
+        return f'{self.benchmark} [{self.size}]'
+
+
+def seed(size, index, options=None):
+    """Seed one shop of the given size (deterministic) and return it; options override SIZES[size]"""
+    user = seeding.shop_user(index, f'bench-{size}@example.com')
+    seeding.seed_shop(user, seed=index, end_date=END_DATE, **(options or SIZES[size]))
+    busiest = Customer.objects.filter(user=user).order_by('-total_visits', 'pk').values_list('pk', flat=True).first()
+    return Shop(size, user, busiest)
+
+
+@contextmanager
+def count_queries():
+    """Count SQL statements sent on any database alias (works with DEBUG off)"""
+    counter = {'queries': 0}
+
+    def wrapper(execute, sql, params, many, context):
+        counter['queries'] += 1
+        return execute(sql, params, many, context)
+
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(wrapper))
+        yield counter
+
+
+def _get(client, url):
+    cache.clear()
+    response = client.get(url)
+    if response.status_code != 200:
+        raise AssertionError(f'{url} returned {response.status_code}')
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response
+
+
+def measure(benchmark, shop, client, repeat=5):
+    """Result of one benchmark on one shop; the first request warms the code paths"""
+    url = benchmark.url(shop)
+    _get(client, url)
+
+    with count_queries() as counter:
+        _get(client, url)
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        _get(client, url)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    tracemalloc.start()
+    try:
+        _get(client, url)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return Result(benchmark.name, shop.size, counter['queries'], round(statistics.median(timings), 1), peak // 1024)
+
+
+def run(shops, benchmarks=BENCHMARKS, repeat=5):
+    results = []
+    for shop in shops:
+        client = Client()
+        client.force_login(shop.user)
+        for benchmark in benchmarks:
+            results.append(measure(benchmark, shop, client, repeat))
+    return results
+
+
+def check(results, baseline=None, benchmarks=BENCHMARKS, tolerance=TOLERANCE):
+    """Messages for every budget or baseline regression; empty when all is well"""
+    budgets = {benchmark.name: benchmark.max_queries for benchmark in benchmarks}
+    failures = []
+    for result in results:
+        if result.queries > budgets[result.benchmark]:
+            failures.append(f'{result.key}: {result.queries} queries, budget is {budgets[result.benchmark]}')
+        previous = (baseline or {}).get(result.key)
+        if not previous:
+            continue
+        if result.queries > previous['queries']:
+            failures.append(f"{result.key}: {result.queries} queries, baseline {previous['queries']}")
+        if result.ms > previous['ms'] * tolerance and result.ms - previous['ms'] > MIN_SLOWDOWN_MS:
+            failures.append(f"{result.key}: {result.ms} ms, baseline {previous['ms']} ms")
+        if result.peak_kb > previous['peak_kb'] * tolerance:
+            failures.append(f"{result.key}: {result.peak_kb} KB peak, baseline {previous['peak_kb']} KB")
+    return failures
+
+
+def load_baseline(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(path, results):
+    with open(path, 'w') as f:
+        json.dump({result.key: asdict(result) for result in results}, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def table(results, baseline=None):
+    """Markdown comparison table of results against the baseline"""
+    def change(now, before):
+        if not before:
+            return ''
+        return f' ({(now - before) / before * 100:+.0f}%)'
+
+    lines = [
+        '| View | Shop | Queries | Median ms | Peak KB |',
+        '|------|------|--------:|----------:|--------:|',
+    ]
+    for result in results:
+        previous = (baseline or {}).get(result.key, {})
+        lines.append(
+            f'| {result.benchmark} | {result.size} '
+            f'| {result.queries}{change(result.queries, previous.get("queries"))} '
+            f'| {result.ms}{change(result.ms, previous.get("ms"))} '
+            f'| {result.peak_kb}{change(result.peak_kb, previous.get("peak_kb"))} |'
+        )
+    return '\n'.join(lines)
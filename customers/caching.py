@@ -0,0 +1,113 @@
+"""
+Per-shop versioned caching
+Every shop has a version per data domain (sales, customers, products, offers). Model
+signals bump the version when rows change, and read-side caches include the versions
+of the domains they depend on in their key, so stale entries are simply never read again.
+Bumps inside a transaction wait for its commit: a reader that saw the new version while
+still reading the old snapshot would otherwise cache stale data under it.
+"""
+from django.core.cache import cache
+from django.db import transaction
+import hashlib
+import re
+import time
+
+from . import instrumentation
+
+DOMAINS = ('sales', 'customers', 'products', 'offers')
+
+# Read-side caches whose hit/miss counters are shown in the admin
+CACHE_NAMES = ('dashboard', 'offers', 'catalog', 'reports', 'sales_history')
+
+
+def _user_id(user):
+    return getattr(user, 'pk', user)
+
+
+def _version_key(user_id, domain):
+    return f'cache_version_{user_id}_{domain}'
+
+
+def bump(user, domain):
+    """Invalidate every cache of this shop that depends on domain, once the current transaction commits"""
+    key = _version_key(_user_id(user), domain)
+    # Nanosecond timestamps are unique per bump and increase over time, so concurrent
+    # bumps from different workers never collapse into the same version
+    transaction.on_commit(lambda: cache.set(key, time.time_ns(), None))
+
+
+def get_versions(user, domains):
+    """Current version of each domain for this shop"""
+    user_id = _user_id(user)
+    keys = {domain: _version_key(user_id, domain) for domain in domains}
+    found = cache.get_many(list(keys.values()))
+
+    versions = {}
+    for domain, key in keys.items():
+        version = found.get(key)
+        if version is None:
+            cache.add(key, time.time_ns(), None)
+            version = cache.get(key)
+        versions[domain] = version
+    return versions
+
+
+def versioned_key(name, user, domains, *parts):
+    """Cache key for name that changes whenever one of domains is bumped"""
+    versions = get_versions(user, domains)
+    version_part = '_'.join(f'{domain}{versions[domain]}' for domain in domains)
+    extra = '_'.join(str(part) for part in parts)
+    if len(extra) > 100 or not re.fullmatch(r'[\w.-]*', extra, re.ASCII):
+        # Parts may come from query strings; keep keys safe for every cache backend
+        extra = hashlib.md5(extra.encode()).hexdigest()
+    return f'{name}_{_user_id(user)}_{version_part}' + (f'_{extra}' if extra else '')
+
+
+def _count(name, kind):
+    key = f'cache_stats_{name}_{kind}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def get_or_set(name, user, domains, compute, timeout, *parts):
+    """Return the cached value for name, computing and storing it on a miss"""
+    return fetch(name, versioned_key(name, user, domains, *parts), compute, timeout)
+
+
+def fetch(name, key, compute, timeout):
+    """get_or_set for a key the caller built with versioned_key (e.g. to also use it as an ETag)"""
+    value = cache.get(key)
+    if value is None:
+        _count(name, 'misses')
+        instrumentation.count_cache(hit=False)
+        value = compute()
+        cache.set(key, value, timeout)
+    else:
+        _count(name, 'hits')
+        instrumentation.count_cache(hit=True)
+    return value
+
+
+def stats():
+    """Hit/miss counters per cache name since the cache was last cleared"""
+    keys = [f'cache_stats_{name}_{kind}' for name in CACHE_NAMES for kind in ('hits', 'misses')]
+    found = cache.get_many(keys)
+    rows = []
+    for name in CACHE_NAMES:
+        hits = found.get(f'cache_stats_{name}_hits', 0)
+        misses = found.get(f'cache_stats_{name}_misses', 0)
+        total = hits + misses
+        rows.append({
+            'name': name,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits * 100 / total, 1) if total else None,
+        })
+    return rows
+
+
+def reset_stats():
+    cache.delete_many([f'cache_stats_{name}_{kind}' for name in CACHE_NAMES for kind in ('hits', 'misses')])
@@ -0,0 +1,118 @@
+"""
+Billing catalog sync
+The billing screen keeps a local copy of the shop's products and customers. The full
+catalog is served as one cached JSON blob per catalog version; clients that already
+hold a version ask for ?since=<version> and get only the rows changed or deleted since.
+"""
+from django.utils import timezone
+from datetime import datetime, timedelta, timezone as dt_timezone
+import json
+
+from .models import Customer, Product, CatalogTombstone
+from . import caching
+
+CATALOG_DOMAINS = ('products', 'customers')
+
+# Deltas older than this fall back to a full catalog (tombstones are pruned after it)
+RETENTION = timedelta(days=30)
+
+# Rows are written a moment before their transaction commits; re-send recent changes
+# so a commit that lands after a client's sync is never missed
+OVERLAP = timedelta(minutes=1)
+
+
+def current_version(user):
+    """Catalog version: the latest product or customer version of this shop"""
+    return max(caching.get_versions(user, CATALOG_DOMAINS).values())
+
+
+def serialize_product(p):
+    return {
+        'id': p.id,
+        'name': p.name,
+        'price': str(p.price),
+        'unit': p.unit,
+        'stock_quantity': str(p.stock_quantity),
+        'is_active': p.is_active,
+        'product_type': p.product_type,
+    }
+
+
+def serialize_customer(c):
+    return {
+        'id': c.id,
+        'name': c.name,
+        'phone': c.phone,
+        'credit_amount': str(c.credit_amount),
+    }
+
+
+def full_catalog(user):
+    """(version, JSON string) for the whole catalog, cached until the catalog changes"""
+    version = current_version(user)
+
+    def build():
+        return json.dumps({
+            'version': version,
+            'full': True,
+            'products': [serialize_product(p) for p in Product.objects.filter(user=user, is_active=True)],
+            'customers': [serialize_customer(c) for c in Customer.objects.filter(user=user)],
+        })
+
+    return version, caching.get_or_set('catalog', user, CATALOG_DOMAINS, build, 3600, 'full')
+
+
+def catalog_delta(user, since):
+    """
+    Changes since a version previously returned to the client, or None when the
+    version is too old (or unparseable) and the client should reload the full catalog.
+    """
+    try:
+        since = int(since)
+        changed_after = datetime.fromtimestamp(since / 1e9, tz=dt_timezone.utc) - OVERLAP
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+    if changed_after < timezone.now() - RETENTION:
+        return None
+
+    version = current_version(user)
+    if since >= version:
+        return {'version': version, 'full': False, 'products': [], 'customers': [],
+                'deleted_products': [], 'deleted_customers': []}
+
+    products = Product.objects.filter(user=user, updated_at__gt=changed_after)
+    tombstones = CatalogTombstone.objects.filter(user=user, deleted_at__gt=changed_after)
+
+    changed_products = []
+    deleted_products = []
+    for p in products:
+        if p.is_active:
+            changed_products.append(serialize_product(p))
+        else:
+            # Soft-deleted products (and one-time custom items) leave the billing catalog
+            deleted_products.append(p.id)
+
+    deleted_customers = []
+    for kind, object_id in tombstones.values_list('kind', 'object_id'):
+        if kind == 'product':
+            deleted_products.append(object_id)
+        else:
+            deleted_customers.append(object_id)
+
+    return {
+        'version': version,
+        'full': False,
+        'products': changed_products,
+        'customers': [
+            serialize_customer(c)
+            for c in Customer.objects.filter(user=user, updated_at__gt=changed_after)
+        ],
+        'deleted_products': deleted_products,
+        'deleted_customers': deleted_customers,
+    }
+
+
+def record_deletion(user, kind, object_id):
+    """Remember a hard delete for delta sync and prune tombstones past retention"""
+    CatalogTombstone.objects.create(user=user, kind=kind, object_id=object_id)
+    CatalogTombstone.objects.filter(user=user, deleted_at__lt=timezone.now() - RETENTION).delete()
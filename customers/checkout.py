@@ -0,0 +1,317 @@
+"""
+Checkout engine for the billing screen
+Validates a bill and writes the sale, its items and the stock changes in one transaction;
+void_sales reverses any number of recorded sales the same way.
+"""
+from django.db import transaction
+from django.db.models import Case, When, F, Sum, Value, IntegerField, DecimalField
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, time
+from decimal import Decimal, InvalidOperation
+
+from .models import Customer, Product, Sale, SaleItem, SaleOffer, CreditPayment, CreditPaymentAllocation
+from . import rollups, caching, offers
+
+_voiding = ContextVar('voiding_sales', default=False)
+
+QUANTITY = DecimalField(max_digits=10, decimal_places=2)
+MONEY = DecimalField(max_digits=10, decimal_places=2)
+
+
+class CheckoutError(Exception):
+    """Raised when a bill cannot be recorded; nothing is written to the database"""
+
+
+def _to_decimal(value, default='0'):
+    try:
+        return Decimal(str(value if value not in (None, '') else default))
+    except (InvalidOperation, ValueError):
+        raise CheckoutError(f'Invalid number: {value}')
+
+
+def _parse_lines(items):
+    """Split raw bill items into catalog lines and custom (one-time) lines"""
+    catalog_lines = []
+    custom_lines = []
+
+    for item in items:
+        if 'custom_name' in item:
+            price = _to_decimal(item.get('custom_price'))
+            quantity = _to_decimal(item.get('quantity', 1))
+            if quantity <= 0:
+                continue
+            custom_lines.append({
+                'name': item['custom_name'],
+                'description': item.get('custom_description', ''),
+                'quantity': quantity,
+                'price': price,
+            })
+        else:
+            quantity = _to_decimal(item.get('quantity', 0))
+            if quantity <= 0:
+                continue
+            try:
+                product_id = int(item.get('product_id'))
+            except (TypeError, ValueError):
+                raise CheckoutError('Invalid product in bill')
+            catalog_lines.append({
+                'product_id': product_id,
+                'quantity': quantity,
+                'price': _to_decimal(item.get('price', 0)),
+            })
+
+    return catalog_lines, custom_lines
+
+
+def _offer_lines(catalog_lines, custom_lines):
+    return [(line['product_id'], line['quantity'], line['price']) for line in catalog_lines] + [
+        (None, line['quantity'], line['price']) for line in custom_lines
+    ]
+
+
+def preview_offers(user, items):
+    """Offer evaluation of an unsaved bill, for the billing screen (no queries on a warm cache)"""
+    return offers.evaluate(offers.engine_for(user), _offer_lines(*_parse_lines(items)))
+
+
+def create_sale(user, items, customer_id=None, payment_method='cash', is_paid=True,
+                notes='', offer_id=None):
+    """
+    Record a bill atomically.
+
+    All referenced products are loaded (and row-locked where the database supports it)
+    in one query, sale items are bulk-created and stock is reduced with a single
+    set-based update. The discount of the chosen offer is computed here by the offer
+    engine; if that offer no longer applies (it ended, or the bill changed after the
+    page previewed it) the best offer that does apply is used instead, and the sale's
+    applied_offer_id says which one was. Any validation failure raises CheckoutError and
+    rolls back everything, including one-time products created for custom items.
+    """
+    catalog_lines, custom_lines = _parse_lines(items)
+    if not catalog_lines and not custom_lines:
+        raise CheckoutError('No items in bill')
+
+    with transaction.atomic():
+        product_ids = {line['product_id'] for line in catalog_lines}
+        products = Product.objects.select_for_update().filter(
+            user=user, pk__in=product_ids
+        ).in_bulk()
+
+        missing = product_ids - set(products)
+        if missing:
+            raise CheckoutError('Product not found')
+
+        # Same product may appear on several lines; check stock against the combined quantity
+        requested = {}
+        for line in catalog_lines:
+            requested[line['product_id']] = requested.get(line['product_id'], Decimal('0')) + line['quantity']
+
+        stock_changes = {}
+        for product_id, quantity in requested.items():
+            product = products[product_id]
+            # Only check stock for actual products, not services
+            if product.product_type != 'product':
+                continue
+            if product.stock_quantity < quantity:
+                raise CheckoutError(f'Insufficient stock for {product.name}')
+            stock_changes[product_id] = quantity
+
+        customer = None
+        if customer_id:
+            customer = Customer.objects.filter(pk=customer_id, user=user).first()
+            if customer is None:
+                raise CheckoutError('Customer not found')
+
+        # Custom items become inactive one-time services
+        custom_products = Product.objects.bulk_create([
+            Product(
+                user=user,
+                name=line['name'],
+                description=line['description'],
+                price=line['price'],
+                product_type='service',
+                unit='',
+                stock_quantity=Decimal('0'),
+                is_active=False,
+            )
+            for line in custom_lines
+        ])
+
+        lines = [(products[line['product_id']], line['quantity'], line['price']) for line in catalog_lines]
+        lines += [(product, line['quantity'], line['price']) for product, line in zip(custom_products, custom_lines)]
+
+        items_total = sum((quantity * price for _, quantity, price in lines), Decimal('0'))
+
+        # The discount is whatever the chosen offer is worth on this bill, never the client's figure
+        applied_offer_id, discount_amount = None, Decimal('0')
+        if offer_id:
+            evaluation = offers.evaluate(offers.engine_for(user), _offer_lines(catalog_lines, custom_lines))
+            try:
+                applied_offer_id = int(offer_id)
+            except (TypeError, ValueError):
+                applied_offer_id = None
+            if applied_offer_id in evaluation.discounts:
+                discount_amount = evaluation.discounts[applied_offer_id]
+            else:
+                # The preview is debounced and offers end; the bill is not refused for that
+                applied_offer_id, discount_amount = evaluation.best
+        final_total_amount = max(Decimal('0'), items_total - discount_amount)
+
+        sale = Sale.objects.create(
+            user=user,
+            customer=customer,
+            total_amount=final_total_amount,
+            discount_amount=discount_amount,
+            payment_method=payment_method,
+            is_paid=is_paid,
+            added_to_credit=not is_paid,
+            notes=notes
+        )
+
+        sale.applied_offer_id = applied_offer_id
+        if applied_offer_id:
+            SaleOffer.objects.create(sale=sale, offer_id=applied_offer_id, discount_amount=discount_amount)
+
+        SaleItem.objects.bulk_create([
+            SaleItem(sale=sale, product=product, quantity=quantity, price_at_sale=price)
+            for product, quantity, price in lines
+        ])
+
+        if stock_changes:
+            Product.objects.filter(pk__in=stock_changes).update(
+                stock_quantity=Case(
+                    *[When(pk=pk, then=F('stock_quantity') - Value(qty)) for pk, qty in stock_changes.items()],
+                    output_field=DecimalField(max_digits=10, decimal_places=2),
+                ),
+                updated_at=timezone.now(),
+            )
+
+        if customer:
+            counters = {
+                'total_purchased': F('total_purchased') + final_total_amount,
+                'total_visits': F('total_visits') + 1,
+                'updated_at': timezone.now(),
+            }
+            if not is_paid:
+                counters['credit_amount'] = F('credit_amount') + final_total_amount
+            Customer.objects.filter(pk=customer.pk).update(**counters)
+
+    return sale
+
+
+def voiding():
+    """True while void_sales is deleting; the per-sale delete signals leave the work to it"""
+    return _voiding.get()
+
+
+@contextmanager
+def _voiding_sales():
+    token = _voiding.set(True)
+    try:
+        yield
+    finally:
+        _voiding.reset(token)
+
+
+def _per_row(values, output_field):
+    """Case expression mapping pk -> value, for one UPDATE over many rows"""
+    return Case(
+        *[When(pk=pk, then=Value(value)) for pk, value in values.items()],
+        default=Value(0),
+        output_field=output_field,
+    )
+
+
+def void_sales(user, sales, expected=None):
+    """
+    Reverse and delete a queryset of the user's sales in one transaction; returns how many.
+    When expected is given and that is not how many sales match, nothing is voided and
+    CheckoutError is raised (the page confirmed a count that has since changed).
+
+    The sales are locked and read once, then stock is restored with one grouped update,
+    customer counters and credit with one update and the daily rollups with one update
+    per affected day, before the sales and their items are deleted. Credit repayments
+    settled against the voided sales are refunded with them: each payment loses what it
+    had allocated to those sales, and a payment left with nothing is deleted.
+    """
+    with transaction.atomic():
+        rows = list(
+            sales.filter(user=user).select_for_update().order_by().values(
+                'pk', 'customer_id', 'sale_date', 'total_amount', 'amount_paid',
+                'discount_amount', 'is_paid', 'added_to_credit',
+            )
+        )
+        if expected is not None and len(rows) != expected:
+            raise CheckoutError(f'{len(rows)} sale(s) match now, not the {expected} confirmed; nothing was voided')
+        if not rows:
+            return 0
+        sale_ids = [row['pk'] for row in rows]
+
+        # Stock comes back only for physical products, summed over every line of every sale
+        restocked = dict(
+            SaleItem.objects.filter(sale_id__in=sale_ids, product__product_type='product')
+            .order_by().values_list('product_id').annotate(quantity=Sum('quantity'))
+        )
+        if restocked:
+            Product.objects.filter(pk__in=restocked).update(
+                stock_quantity=F('stock_quantity') + _per_row(restocked, QUANTITY),
+                updated_at=timezone.now(),
+            )
+
+        purchased, visits, credit = {}, {}, {}
+        for row in rows:
+            customer_id = row['customer_id']
+            if customer_id:
+                purchased[customer_id] = purchased.get(customer_id, Decimal('0')) + row['total_amount']
+                visits[customer_id] = visits.get(customer_id, 0) + 1
+                if not row['is_paid']:
+                    remaining = max(Decimal('0'), row['total_amount'] - row['amount_paid'])
+                    credit[customer_id] = credit.get(customer_id, Decimal('0')) + remaining
+
+        if purchased:
+            zero = Value(Decimal('0'), output_field=MONEY)
+            Customer.objects.filter(pk__in=purchased).update(
+                total_purchased=Greatest(F('total_purchased') - _per_row(purchased, MONEY), zero, output_field=MONEY),
+                total_visits=Greatest(F('total_visits') - _per_row(visits, IntegerField()), Value(0)),
+                credit_amount=Greatest(F('credit_amount') - _per_row(credit, MONEY), zero, output_field=MONEY),
+                updated_at=timezone.now(),
+            )
+
+        rollups.reverse_sales(user.pk, rows)
+
+        allocations = CreditPaymentAllocation.objects.filter(sale_id__in=sale_ids)
+        refunded = dict(allocations.order_by().values_list('payment_id').annotate(amount=Sum('amount')))
+        if refunded:
+            payments = list(CreditPayment.objects.filter(pk__in=refunded).values_list('pk', 'amount', 'received_at'))
+            allocations.delete()
+            emptied = [pk for pk, amount, _ in payments if amount <= refunded[pk]]
+            CreditPayment.objects.filter(pk__in=emptied).delete()
+            CreditPayment.objects.filter(pk__in=refunded).exclude(pk__in=emptied).update(
+                amount=F('amount') - _per_row(refunded, MONEY)
+            )
+            rollups.reverse_payments(user.pk, [(received_at, refunded[pk]) for pk, _, received_at in payments])
+
+        # Items and applied offers cascade in one DELETE each; the per-sale delete signals
+        # are skipped since their work is done above
+        with _voiding_sales():
+            Sale.objects.filter(pk__in=sale_ids).delete()
+
+        for domain in ('sales', 'products', 'customers'):
+            caching.bump(user.pk, domain)
+
+    return len(rows)
+
+
+def day_sales(day):
+    """Sales recorded on one shop-local calendar day"""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    end = timezone.make_aware(datetime.combine(day, time.max))
+    return Sale.objects.filter(sale_date__range=(start, end))
+
+
+def void_day(user, day, expected=None):
+    """Void every sale recorded on one shop-local calendar day"""
+    return void_sales(user, day_sales(day), expected=expected)
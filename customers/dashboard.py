@@ -0,0 +1,116 @@
+"""
+Dashboard widgets
+The dashboard page is a shell; each widget is fetched separately (and in parallel) as
+JSON from DashboardWidgetView. A widget declares the data domains it reads and its own
+cache timeout, so adding a customer invalidates the cards but not the revenue chart, and
+a slow widget never holds up the others. The widget's versioned cache key doubles
+as its ETag.
+"""
+from django.db.models import Sum, Q, F, Value, DecimalField
+from django.db.models.functions import Coalesce
+from django.template.loader import render_to_string
+from django.utils import timezone
+from dataclasses import dataclass
+from datetime import datetime, time
+from decimal import Decimal
+from typing import Callable
+import hashlib
+
+from .models import Customer, Product, Sale, DailySalesRollup
+from . import caching, rollups
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+ZERO = Decimal('0')
+
+
+@dataclass(frozen=True)
+class Widget:
+    domains: tuple
+    timeout: int
+    compute: Callable  # (user, today) -> JSON-serialisable dict
+
+
+def _remaining(condition=None):
+    return Coalesce(
+        Sum(F('total_amount') - F('amount_paid'), filter=condition, output_field=MONEY),
+        Value(ZERO), output_field=MONEY,
+    )
+
+
+def metrics(user, today):
+    """Metric cards: sales from the daily rollups, credit and counts from the base tables"""
+    month_start = today.replace(day=1)
+    sales = DailySalesRollup.objects.filter(user=user, date__range=(month_start, today)).aggregate(
+        today_sales=Coalesce(Sum('revenue', filter=Q(date=today)), Value(ZERO), output_field=MONEY),
+        monthly_sales=Coalesce(Sum('revenue'), Value(ZERO), output_field=MONEY),
+    )
+
+    # Pending credit from unpaid sales (remaining amounts, summed in the database)
+    today_start = timezone.make_aware(datetime.combine(today, time.min))
+    today_end = timezone.make_aware(datetime.combine(today, time.max))
+    credit = Sale.objects.filter(user=user, is_paid=False).aggregate(
+        total_credit=_remaining(),
+        today_credit=_remaining(Q(sale_date__range=(today_start, today_end))),
+    )
+
+    return {
+        **sales,
+        **credit,
+        'total_customers': Customer.objects.filter(user=user).count(),
+        'total_products': Product.objects.filter(user=user).count(),
+    }
+
+
+def monthly(user, today):
+    """Revenue of the last six months (current one included) for the chart, in one grouped query"""
+    first_months = []
+    for i in range(5, -1, -1):
+        month = today.month - i
+        year = today.year
+        if month <= 0:
+            month += 12
+            year -= 1
+        first_months.append(datetime(year, month, 1).date())
+
+    totals = {
+        row['month']: row['total_revenue']
+        for row in rollups.monthly_revenue(DailySalesRollup.objects.filter(
+            user=user,
+            date__range=(first_months[0], today)
+        ))
+    }
+    return {
+        'labels': [first_day.strftime('%b %Y') for first_day in first_months],
+        'data': [float(totals.get(first_day, 0)) for first_day in first_months],
+    }
+
+
+def low_stock(user, today):
+    """Inventory alerts, rendered server-side"""
+    products = Product.objects.filter(
+        user=user,
+        stock_quantity__lt=10,
+        is_active=True
+    ).order_by('stock_quantity')[:5]
+    return {'html': render_to_string('customers/dashboard_low_stock.html', {'low_stock_products': products})}
+
+
+WIDGETS = {
+    'metrics': Widget(('sales', 'customers', 'products'), 300, metrics),
+    'monthly': Widget(('sales',), 3600, monthly),
+    'low-stock': Widget(('products',), 300, low_stock),
+}
+
+
+def widget_key(name, user, today):
+    return caching.versioned_key('dashboard', user, WIDGETS[name].domains, name, today)
+
+
+def etag(key):
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def widget_data(name, user, today, key=None):
+    """Cached data of one widget; key is widget_key() when the caller already has it"""
+    widget = WIDGETS[name]
+    return caching.fetch('dashboard', key or widget_key(name, user, today), lambda: widget.compute(user, today), widget.timeout)
@@ -0,0 +1,143 @@
+"""
+Image pipeline
+Saving a model never touches Pillow: a new upload is only hashed, and an upload whose
+content hash matches the stored one keeps the existing file. The process_images
+worker renders fixed-size JPEG variants (list, card, receipt) once per content hash
+and marks the row ready; templates pick a variant with the |variant filter and fall
+back to the original until it exists.
+"""
+from django.core.files.base import ContentFile
+from django.db.models import Q
+from PIL import Image, ImageOps
+from io import BytesIO
+import hashlib
+
+# Bounding boxes (px), roughly twice the largest size each place displays
+SIZES = {
+    'list': (96, 96),        # avatars and small thumbnails
+    'card': (480, 480),      # product cards, product detail, gallery, branding preview
+    'receipt': (160, 160),   # logo on printed bills
+}
+
+JPEG_QUALITY = 80
+
+
+def content_hash(file):
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def variant_name(digest, size):
+    """Storage path of one variant; shared by every file with the same content"""
+    return f'variants/{digest[:2]}/{digest}/{size}.jpg'
+
+
+def image_fields(model):
+    """Names of the model's pipeline-managed image fields"""
+    return getattr(model, 'IMAGE_FIELDS', ())
+
+
+def prepare(instance):
+    """
+    Called before save: hash new uploads and drop the ones identical to the stored
+    file, so re-uploading the same logo writes nothing and keeps the variants.
+    """
+    uploads = [
+        name for name in image_fields(type(instance))
+        if getattr(instance, name) and not getattr(instance, name)._committed
+    ]
+    if not uploads:
+        return
+
+    stored = {}
+    if instance.pk:
+        stored = type(instance).objects.filter(pk=instance.pk).values(*uploads).first() or {}
+
+    for name in uploads:
+        digest = content_hash(getattr(instance, name))
+        if stored.get(name) and digest == getattr(instance, f'{name}_hash'):
+            setattr(instance, name, stored[name])
+            continue
+        setattr(instance, f'{name}_hash', digest)
+        instance.images_ready = False
+
+
+def _flatten(img):
+    img = ImageOps.exif_transpose(img)
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, 'white')
+        background.paste(img, mask=img.getchannel('A'))
+        return background
+    return img.convert('RGB')
+
+
+def render_variants(file, digest):
+    """Write any missing variants for one source file; returns how many were written"""
+    storage = file.storage
+    missing = [size for size in SIZES if not storage.exists(variant_name(digest, size))]
+    if not missing:
+        return 0
+
+    with file.open('rb'), Image.open(file) as source:
+        img = _flatten(source)
+        for size in missing:
+            thumb = img.copy()
+            thumb.thumbnail(SIZES[size], Image.LANCZOS)
+            output = BytesIO()
+            thumb.save(output, format='JPEG', quality=JPEG_QUALITY, optimize=True)
+            storage.save(variant_name(digest, size), ContentFile(output.getvalue()))
+    return len(missing)
+
+
+def process(instance):
+    """Render variants for every image of one row, then mark it ready if it is unchanged"""
+    unchanged = Q(pk=instance.pk)
+    hashes = {}
+    for name in image_fields(type(instance)):
+        file = getattr(instance, name)
+        if not file:
+            unchanged &= Q(**{name: ''}) | Q(**{f'{name}__isnull': True})
+            continue
+        # A new upload since this row was read changes the file name, so it stays pending
+        unchanged &= Q(**{name: file.name})
+        digest = getattr(instance, f'{name}_hash')
+        try:
+            if not digest:
+                # Rows written without save() (bulk imports, older data) are hashed here
+                with file.open('rb'):
+                    digest = hashes[f'{name}_hash'] = content_hash(file)
+            render_variants(file, digest)
+        except (OSError, Image.DecompressionBombError):
+            # Unreadable or missing source: templates keep using the original
+            hashes[f'{name}_hash'] = ''
+    return type(instance).objects.filter(unchanged).update(images_ready=True, **hashes)
+
+
+def drain(models, batch_size=50):
+    """Process every pending row of the given models; returns the number marked ready"""
+    done = 0
+    for model in models:
+        last = 0
+        while True:
+            batch = list(model.objects.filter(images_ready=False, pk__gt=last).order_by('pk')[:batch_size])
+            if not batch:
+                break
+            for instance in batch:
+                done += process(instance)
+            last = batch[-1].pk
+    return done
+
+
+def variant_url(file, size):
+    """URL of a variant of file, or of the original while its variants are pending"""
+    if not file:
+        return ''
+    instance = file.instance
+    digest = getattr(instance, f'{file.field.name}_hash', '')
+    if digest and getattr(instance, 'images_ready', False):
+        return file.storage.url(variant_name(digest, size))
+    return file.url
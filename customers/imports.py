@@ -0,0 +1,636 @@
+"""
+Bulk imports
+An upload becomes an ImportJob that the process_imports worker runs. The file is read
+one row at a time (XLSX straight from its sheet XML, so the workbook is never loaded
+whole) and written in chunks matched against a map or set of the shop's existing rows
+loaded once, so memory stays flat and a file costs a few queries per thousand rows.
+Products are upserted by name; customers are deduplicated by normalized phone number and
+their opening balances become credit bills in the same chunk. Invalid rows are reported
+with their row number and skipped; progress is saved on the job after every chunk. A dry
+run validates and counts without writing.
+"""
+from django.db import transaction
+from django.utils import timezone
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from xml.etree.ElementTree import iterparse, ParseError
+import csv
+import io
+import logging
+import posixpath
+import re
+import zipfile
+import zlib
+
+from .models import ImportJob, Customer, Product, Sale
+from . import caching, rollups, search
+
+CHUNK_SIZE = 1000
+
+CENTS = Decimal('0.01')
+ZERO = Decimal('0')
+
+# Largest value a max_digits=10, decimal_places=2 column holds
+MAX_AMOUNT = Decimal('99999999.99')
+
+TABLE_EXTENSIONS = ('.csv', '.xlsx')
+
+# What a truncated or hand-edited workbook raises part way through reading it
+_BROKEN_XLSX = (ParseError, KeyError, IndexError, ValueError, EOFError, zipfile.BadZipFile, zlib.error)
+
+logger = logging.getLogger(__name__)
+
+_MAIN = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_DOC_RELS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_PKG_RELS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+
+class ImportFileError(Exception):
+    """The file cannot be imported at all (format, encoding or missing columns)"""
+
+
+class RowError(Exception):
+    """One row is invalid; it is reported and skipped"""
+
+
+@dataclass
+class Result:
+    processed: int = 0
+    created: int = 0
+    updated: int = 0
+    duplicates: int = 0
+    error_count: int = 0
+    errors: list = field(default_factory=list)
+
+    def error(self, row, message):
+        self.error_count += 1
+        if len(self.errors) < ImportJob.MAX_ERRORS:
+            self.errors.append({'row': row, 'message': message})
+
+
+# ==================== READING ====================
+
+def supported(filename, kind):
+    return filename.lower().endswith(IMPORTERS[kind].extensions)
+
+
+def _csv_rows(file):
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    try:
+        reader = csv.reader(text)
+        for values in reader:
+            yield reader.line_num, values
+    except UnicodeDecodeError:
+        raise ImportFileError('CSV files must be saved as UTF-8')
+    except csv.Error as e:
+        raise ImportFileError(f'Line {reader.line_num} of the CSV file could not be read: {e}')
+    finally:
+        text.detach()
+
+
+def _column_index(ref):
+    index = 0
+    for letter in re.match(r'[A-Z]*', ref).group():
+        index = index * 26 + ord(letter) - 64
+    return index - 1
+
+
+def _first_sheet(book):
+    """Path of the workbook's first sheet inside the archive"""
+    try:
+        sheet = next(_elements(book, 'xl/workbook.xml', _MAIN + 'sheet'), None)
+        if sheet is None:
+            raise ImportFileError('The workbook has no sheets')
+        rel_id = sheet.get(_DOC_RELS + 'id')
+        for rel in _elements(book, 'xl/_rels/workbook.xml.rels', _PKG_RELS + 'Relationship'):
+            if rel.get('Id') == rel_id:
+                target = rel.get('Target') or ''
+                return target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join('xl', target))
+    except _BROKEN_XLSX:
+        raise ImportFileError('The file is not a valid .xlsx workbook')
+    raise ImportFileError('The workbook has no sheets')
+
+
+def _elements(book, name, tag):
+    for _, elem in iterparse(book.open(name)):
+        if elem.tag == tag:
+            yield elem
+
+
+def _shared_strings(book):
+    if 'xl/sharedStrings.xml' not in book.namelist():
+        return []
+    strings = []
+    for item in _elements(book, 'xl/sharedStrings.xml', _MAIN + 'si'):
+        strings.append(''.join(text.text or '' for text in item.iter(_MAIN + 't')))
+        item.clear()
+    return strings
+
+
+def _xlsx_rows(file):
+    try:
+        book = zipfile.ZipFile(file)
+    except zipfile.BadZipFile:
+        raise ImportFileError('The file is not a valid .xlsx workbook')
+
+    with book:
+        try:
+            yield from _sheet_rows(book, _first_sheet(book))
+        except _BROKEN_XLSX:
+            raise ImportFileError('The file is not a valid .xlsx workbook')
+
+
+def _sheet_rows(book, sheet):
+    """(row number, values) of every row of one sheet, parsed as a stream"""
+    strings = _shared_strings(book)
+    sheet_data = None
+    for event, elem in iterparse(book.open(sheet), events=('start', 'end')):
+        if event == 'start':
+            if elem.tag == _MAIN + 'sheetData':
+                sheet_data = elem
+            continue
+        if elem.tag != _MAIN + 'row':
+            continue
+
+        values = []
+        for cell in elem.iter(_MAIN + 'c'):
+            ref = cell.get('r')
+            if ref:
+                values.extend([''] * (_column_index(ref) - len(values)))
+            kind = cell.get('t')
+            if kind == 'inlineStr':
+                value = ''.join(text.text or '' for text in cell.iter(_MAIN + 't'))
+            else:
+                number = cell.find(_MAIN + 'v')
+                value = (number.text or '') if number is not None else ''
+                if kind == 's' and value:
+                    value = strings[int(value)]
+            values.append(value)
+        yield int(elem.get('r') or 0), values
+        # Drop parsed rows so the tree never grows with the sheet
+        if sheet_data is not None:
+            sheet_data.clear()
+
+
+def _unfold(file):
+    """Logical vCard lines: continuation lines (leading space or tab) are joined back"""
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    try:
+        line, start = None, 0
+        for number, raw in enumerate(text, start=1):
+            raw = raw.rstrip('\r\n')
+            if raw[:1] in (' ', '\t') and line is not None:
+                line += raw[1:]
+                continue
+            if line is not None:
+                yield start, line
+            line, start = raw, number
+        if line is not None:
+            yield start, line
+    except UnicodeDecodeError:
+        raise ImportFileError('vCard files must be saved as UTF-8')
+    finally:
+        text.detach()
+
+
+def _vcard_value(value):
+    return re.sub(r'\\([,;\\nN])', lambda m: '\n' if m.group(1) in 'nN' else m.group(1), value).strip()
+
+
+def _vcard_rows(file):
+    """(line of BEGIN, {name, phone, address, notes}) per contact; the first TEL wins unless a CELL one follows"""
+    card = None
+    for number, line in _unfold(file):
+        name, _, value = line.partition(':')
+        prop, *params = name.split(';')
+        prop = prop.split('.')[-1].upper()
+        if prop == 'BEGIN' and value.upper() == 'VCARD':
+            card, start, mobile = {}, number, False
+        elif card is None:
+            continue
+        elif prop == 'END':
+            yield start, card
+            card = None
+        elif prop == 'FN':
+            card['name'] = _vcard_value(value)
+        elif prop == 'N' and 'name' not in card:
+            parts = [_vcard_value(part) for part in value.split(';')]
+            card['name'] = ' '.join(part for part in parts[1:2] + parts[:1] if part)
+        elif prop == 'TEL':
+            cell = any('CELL' in param.upper() for param in params)
+            if 'phone' not in card or (cell and not mobile):
+                card['phone'], mobile = value.strip(), cell
+        elif prop == 'ADR' and 'address' not in card:
+            card['address'] = ', '.join(part for part in (_vcard_value(p) for p in value.split(';')) if part)
+        elif prop == 'NOTE':
+            card['notes'] = _vcard_value(value)
+
+
+def _records(file, filename):
+    """(row number, values) of every non-empty row, header included"""
+    if filename.lower().endswith('.csv'):
+        rows = _csv_rows(file)
+    elif filename.lower().endswith('.xlsx'):
+        rows = _xlsx_rows(file)
+    else:
+        raise ImportFileError('Upload a .csv or .xlsx file')
+    return ((number, values) for number, values in rows if any(value.strip() for value in values))
+
+
+def _header(values, required):
+    header = [re.sub(r'\s+', '_', value.strip().lower()) for value in values]
+    missing = [column for column in required if column not in header]
+    if missing:
+        raise ImportFileError(f'Missing column(s): {", ".join(missing)}')
+    return header
+
+
+def read_rows(file, filename, required):
+    """
+    Yield (row number, {column: value}) for every non-empty data row (every contact of a
+    vCard file). Header names are matched case-insensitively with spaces as underscores;
+    ImportFileError when the format is not supported or a required column is missing.
+    """
+    if filename.lower().endswith('.vcf'):
+        yield from _vcard_rows(file)
+        return
+
+    header = None
+    for number, values in _records(file, filename):
+        if header is None:
+            header = _header(values, required)
+            continue
+        yield number, {column: value.strip() for column, value in zip(header, values) if column}
+
+
+def scan(file, filename, required):
+    """(data row count, column names) of a file, read without keeping it in memory"""
+    if filename.lower().endswith('.vcf'):
+        return sum(1 for _ in _vcard_rows(file)), {'name', 'phone', 'address', 'notes'}
+
+    header, count = None, 0
+    for _, values in _records(file, filename):
+        if header is None:
+            header = _header(values, required)
+        else:
+            count += 1
+    return count, set(header or ())
+
+
+# ==================== VALIDATION ====================
+
+def _choice(value, choices, column):
+    """Stored key of a choice given either its key or its label"""
+    wanted = value.strip().lower()
+    for key, label in choices:
+        if wanted in (key.lower(), label.lower()):
+            return key
+    raise RowError(f'{column} "{value}" is not one of: {", ".join(key for key, _ in choices)}')
+
+
+def _amount(value, column):
+    if not value:
+        raise RowError(f'{column} is required')
+    try:
+        number = Decimal(value.replace(',', ''))
+    except InvalidOperation:
+        raise RowError(f'{column} "{value}" is not a number')
+    if not number.is_finite() or abs(number) > MAX_AMOUNT:
+        raise RowError(f'{column} "{value}" is out of range')
+    return number.quantize(CENTS, ROUND_HALF_UP)
+
+
+# ==================== PRODUCTS ====================
+
+PRODUCT_COLUMNS = ('name', 'category', 'price')
+
+# Written on every imported product
+PRODUCT_FIELDS = ['name', 'category', 'price']
+
+# Overwritten on existing products only when the file has the column; new products get the
+# defaults. A product_type column also rewrites unit and stock, since services keep neither.
+OPTIONAL_PRODUCT_FIELDS = {
+    'product_type': ['product_type', 'unit', 'stock_quantity'],
+    'unit': ['unit'],
+    'stock_quantity': ['stock_quantity'],
+    'description': ['description'],
+}
+
+
+def _product_fields(columns):
+    fields = list(PRODUCT_FIELDS)
+    for column, written in OPTIONAL_PRODUCT_FIELDS.items():
+        if column in columns:
+            fields += [field for field in written if field not in fields]
+    return fields
+
+
+def parse_product(row):
+    name = row.get('name', '')
+    if not name:
+        raise RowError('name is required')
+    if len(name) > 255:
+        raise RowError('name is longer than 255 characters')
+
+    product_type = _choice(row.get('product_type') or 'product', Product.PRODUCT_TYPE_CHOICES, 'product_type')
+    category = _choice(row.get('category', ''), Product.CATEGORY_CHOICES, 'category')
+    price = _amount(row.get('price', ''), 'price')
+    if price <= 0:
+        raise RowError('price must be greater than 0')
+
+    # Services keep no stock, as in the product form
+    unit, stock_quantity = '', ZERO
+    if product_type == 'product':
+        unit = _choice(row.get('unit') or 'piece', Product.UNIT_CHOICES, 'unit')
+        stock_quantity = _amount(row.get('stock_quantity') or '0', 'stock_quantity')
+        if stock_quantity < 0:
+            raise RowError('stock_quantity cannot be negative')
+
+    return {
+        'name': name,
+        'product_type': product_type,
+        'category': category,
+        'price': price,
+        'unit': unit,
+        'stock_quantity': stock_quantity,
+        'description': row.get('description', ''),
+    }
+
+
+def _write_products(user, batch, existing, fields, dry_run, result):
+    now = timezone.now()
+    creates, updates = [], []
+    for key, values in batch.items():
+        product = Product(user=user, search_key=search.normalize(values['name']), updated_at=now, **values)
+        if key in existing:
+            product.pk = existing[key]
+            updates.append(product)
+        else:
+            creates.append(product)
+
+    result.created += len(creates)
+    result.updated += len(updates)
+    if dry_run:
+        existing.update(dict.fromkeys(product.name.casefold() for product in creates))
+        return
+
+    with transaction.atomic():
+        Product.objects.bulk_create(creates)
+        Product.objects.bulk_update(updates, fields + ['search_key', 'updated_at'])
+    existing.update({product.name.casefold(): product.pk for product in creates})
+
+
+def import_products(user, rows, columns, dry_run=False, on_chunk=None):
+    """
+    Upsert products from (row number, row) pairs, matching active products by name
+    (case-insensitive); a name repeated in the file keeps its last row. Returns a Result.
+    """
+    existing = {
+        name.casefold(): pk
+        for pk, name in Product.objects.filter(user=user, is_active=True).values_list('id', 'name')
+    }
+    fields = _product_fields(columns)
+
+    result = Result()
+    batch = {}
+    for number, row in rows:
+        result.processed += 1
+        try:
+            values = parse_product(row)
+        except RowError as e:
+            result.error(number, str(e))
+            continue
+        batch[values['name'].casefold()] = values
+
+        if len(batch) >= CHUNK_SIZE:
+            _write_products(user, batch, existing, fields, dry_run, result)
+            batch = {}
+            if on_chunk:
+                on_chunk(result)
+
+    _write_products(user, batch, existing, fields, dry_run, result)
+    if not dry_run and (result.created or result.updated):
+        caching.bump(user, 'products')
+    return result
+
+
+# ==================== CUSTOMERS ====================
+
+CUSTOMER_COLUMNS = ('name', 'phone')
+
+OPENING_BALANCE_NOTE = 'Opening balance'
+
+
+def normalize_phone(phone):
+    """10-digit Indian phone number with any +91/0 prefix and formatting removed, or None"""
+    digits = search.phone_digits(phone)
+    if len(digits) == 12 and digits.startswith('91'):
+        digits = digits[2:]
+    elif len(digits) == 11 and digits.startswith('0'):
+        digits = digits[1:]
+    return digits if len(digits) == 10 else None
+
+
+def parse_customer(row):
+    name = row.get('name', '')
+    if not name:
+        raise RowError('name is required')
+    if len(name) > 255:
+        raise RowError('name is longer than 255 characters')
+
+    phone = normalize_phone(row.get('phone', ''))
+    if phone is None:
+        raise RowError(f'phone "{row.get("phone", "")}" is not a 10-digit phone number')
+
+    balance = _amount(row['opening_balance'], 'opening_balance') if row.get('opening_balance') else ZERO
+    if balance < 0:
+        raise RowError('opening_balance cannot be negative')
+
+    return {
+        'name': name,
+        'phone': phone,
+        'address': row.get('address', ''),
+        'notes': row.get('notes', ''),
+        'balance': balance,
+    }
+
+
+def _write_customers(user, batch, dry_run, result):
+    result.created += len(batch)
+    if dry_run or not batch:
+        return
+
+    now = timezone.now()
+    with transaction.atomic():
+        customers = Customer.objects.bulk_create([
+            Customer(
+                user=user,
+                name=values['name'],
+                phone=values['phone'],
+                address=values['address'],
+                notes=values['notes'],
+                search_key=search.normalize(values['name']),
+                # Counters match what the ledger derives from the opening-balance bill
+                credit_amount=values['balance'],
+                total_purchased=values['balance'],
+                total_visits=1 if values['balance'] else 0,
+            )
+            for values in batch
+        ])
+        # An opening balance is an unpaid credit bill, so payments settle it FIFO like any other
+        sales = Sale.objects.bulk_create([
+            Sale(
+                user=user,
+                customer=customer,
+                total_amount=values['balance'],
+                amount_paid=ZERO,
+                payment_method='credit',
+                is_paid=False,
+                added_to_credit=True,
+                notes=OPENING_BALANCE_NOTE,
+                sale_date=now,
+            )
+            for customer, values in zip(customers, batch) if values['balance']
+        ])
+        rollups.record_sales(user.pk, [
+            {'sale_date': now, 'total_amount': sale.total_amount, 'discount_amount': ZERO, 'added_to_credit': True}
+            for sale in sales
+        ])
+
+
+def import_customers(user, rows, columns, dry_run=False, on_chunk=None):
+    """
+    Add customers from (row number, row) pairs, skipping phone numbers already in the
+    shop or earlier in the file (so re-importing a contact list is harmless). Returns a Result.
+    """
+    phones = {
+        normalize_phone(phone) or search.phone_digits(phone)
+        for phone in Customer.objects.filter(user=user).values_list('phone', flat=True).iterator()
+    }
+
+    result = Result()
+    batch = []
+    for number, row in rows:
+        result.processed += 1
+        try:
+            values = parse_customer(row)
+        except RowError as e:
+            result.error(number, str(e))
+            continue
+        if values['phone'] in phones:
+            result.duplicates += 1
+            continue
+        phones.add(values['phone'])
+        batch.append(values)
+
+        if len(batch) >= CHUNK_SIZE:
+            _write_customers(user, batch, dry_run, result)
+            batch = []
+            if on_chunk:
+                on_chunk(result)
+
+    _write_customers(user, batch, dry_run, result)
+    if not dry_run and result.created:
+        caching.bump(user, 'customers')
+        caching.bump(user, 'sales')
+    return result
+
+
+# ==================== JOBS ====================
+
+@dataclass(frozen=True)
+class Importer:
+    columns: tuple     # required columns
+    extensions: tuple
+    run: object        # (user, rows, columns, dry_run, on_chunk) -> Result
+
+
+IMPORTERS = {
+    'products': Importer(PRODUCT_COLUMNS, TABLE_EXTENSIONS, import_products),
+    'customers': Importer(CUSTOMER_COLUMNS, TABLE_EXTENSIONS + ('.vcf',), import_customers),
+}
+
+
+def run(job):
+    """Process one claimed job, saving progress on it after every chunk"""
+    importer = IMPORTERS[job.kind]
+
+    def progress(result):
+        ImportJob.objects.filter(pk=job.pk).update(
+            processed_rows=result.processed,
+            created_count=result.created,
+            updated_count=result.updated,
+            duplicate_count=result.duplicates,
+            error_count=result.error_count,
+        )
+
+    try:
+        with job.file.open('rb') as file:
+            job.total_rows, columns = scan(file, job.file.name, importer.columns)
+        ImportJob.objects.filter(pk=job.pk).update(total_rows=job.total_rows)
+
+        with job.file.open('rb') as file:
+            result = importer.run(job.user, read_rows(file, job.file.name, importer.columns), columns, job.dry_run, progress)
+    except ImportFileError as e:
+        job.status = 'failed'
+        job.message = str(e)
+    except Exception:
+        # Never leave a job running (and its page polling) because of a file we did not foresee
+        logger.exception('Import job %s failed', job.pk)
+        job.status = 'failed'
+        job.message = 'The file could not be read. Check that it is a valid, unedited export and try again.'
+    else:
+        job.status = 'done'
+        job.processed_rows = result.processed
+        job.created_count = result.created
+        job.updated_count = result.updated
+        job.duplicate_count = result.duplicates
+        job.error_count = result.error_count
+        job.errors = result.errors
+        verb = 'would be' if job.dry_run else 'were'
+        job.message = f'{result.created} {verb} created, {result.updated} {verb} updated, {result.error_count} skipped.'
+        if result.duplicates:
+            job.message += f' {result.duplicates} already existed.'
+
+    # Uploads are not kept once processed
+    job.file.delete(save=False)
+    job.finished_at = timezone.now()
+    job.save()
+    return job
+
+
+def claim():
+    """Take the oldest pending job, marking it running so other workers skip it"""
+    with transaction.atomic():
+        job = ImportJob.objects.select_for_update(skip_locked=True).filter(status='pending').order_by('created_at').first()
+        if job is not None:
+            job.status = 'running'
+            job.started_at = timezone.now()
+            job.save(update_fields=['status', 'started_at'])
+    return job
+
+
+def drain():
+    """Run pending jobs until none are left; returns how many ran"""
+    done = 0
+    while (job := claim()) is not None:
+        run(job)
+        done += 1
+    return done
+
+
+def progress(job):
+    """Status of a job for the import dialog"""
+    return {
+        'id': job.pk,
+        'status': job.status,
+        'dry_run': job.dry_run,
+        'total_rows': job.total_rows,
+        'processed_rows': job.processed_rows,
+        'created': job.created_count,
+        'updated': job.updated_count,
+        'duplicates': job.duplicate_count,
+        'error_count': job.error_count,
+        'errors': job.errors,
+        'message': job.message,
+    }
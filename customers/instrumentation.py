@@ -0,0 +1,136 @@
+"""
+Per-request instrumentation
+InstrumentationMiddleware keeps a RequestStats for the current request: SQL count and
+time on every database alias (through execute wrappers), versioned-cache hits and misses
+(reported by caching.get_or_set) and template render time (TimedDjangoTemplates). The
+totals go out as a Server-Timing header. A sampled share of requests also records each
+statement with its call site, and sampled requests slower than SLOW_REQUEST_MS are
+logged with their slowest statements.
+"""
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates, Template
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+import heapq
+import os
+import sys
+import time
+
+_current = ContextVar('request_stats', default=None)
+
+PROJECT_ROOT = str(settings.BASE_DIR) + os.sep
+
+
+@dataclass
+class Statement:
+    ms: float
+    sql: str
+    site: str
+
+    def __lt__(self, other):
+        return self.ms < other.ms
+
+
+@dataclass
+class RequestStats:
+    sampled: bool = False
+    top: int = 5
+    started: float = field(default_factory=time.perf_counter)
+    queries: int = 0
+    query_ms: float = 0.0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    template_ms: float = 0.0
+    slowest: list = field(default_factory=list)  # min-heap of the `top` slowest statements
+
+    @property
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def record_query(self, sql, ms):
+        self.queries += 1
+        self.query_ms += ms
+        if not self.sampled:
+            return
+        if len(self.slowest) < self.top:
+            heapq.heappush(self.slowest, Statement(ms, sql, call_site()))
+        elif ms > self.slowest[0].ms:
+            heapq.heapreplace(self.slowest, Statement(ms, sql, call_site()))
+
+    def server_timing(self):
+        total = self.total_ms
+        return ', '.join([
+            f'db;dur={self.query_ms:.1f};desc="{self.queries} queries"',
+            f'cache;desc="{self.cache_hits} hits, {self.cache_misses} misses"',
+            f'tpl;dur={self.template_ms:.1f}',
+            f'app;dur={max(total - self.query_ms - self.template_ms, 0):.1f}',
+            f'total;dur={total:.1f}',
+        ])
+
+
+def current():
+    """RequestStats of the request being handled, or None outside instrumented requests"""
+    return _current.get()
+
+
+def start(stats):
+    return _current.set(stats)
+
+
+def finish(token):
+    _current.reset(token)
+
+
+def call_site():
+    """file:line of the innermost project frame outside this module and installed packages"""
+    frame = sys._getframe(2)
+    while frame:
+        filename = frame.f_code.co_filename
+        if filename.startswith(PROJECT_ROOT) and 'site-packages' not in filename and filename != __file__:
+            return f'{os.path.relpath(filename, PROJECT_ROOT)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return ''
+
+
+def query_wrapper(execute, sql, params, many, context):
+    """connection.execute_wrapper hook timing every statement of the current request"""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.record_query(sql, (time.perf_counter() - started) * 1000)
+
+
+def count_cache(hit):
+    stats = _current.get()
+    if stats is not None:
+        if hit:
+            stats.cache_hits += 1
+        else:
+            stats.cache_misses += 1
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_ms += (time.perf_counter() - started) * 1000
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Django template backend that adds top-level render time to the request stats"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
@@ -0,0 +1,225 @@
+"""
+Customer credit ledger
+Customer.credit_amount is kept as the running balance of what the customer still owes
+on unpaid sales; the sale, payment and delete paths adjust it with set-based updates.
+Repayments are recorded as CreditPayment rows, with one allocation row per sale they
+settle, so a customer's history is the merge of credit sales and payments.
+"""
+from django.db import transaction
+from django.db.models import Sum, Count, F, Q, Value, CharField, DecimalField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from decimal import Decimal
+
+from .models import Customer, Sale, CreditPayment, CreditPaymentAllocation
+from . import rollups, caching
+
+MONEY = DecimalField(max_digits=10, decimal_places=2)
+
+
+def outstanding_expression():
+    """Sum of remaining amounts over unpaid sales, for use in aggregate()/annotate()"""
+    return Coalesce(
+        Sum(F('total_amount') - F('amount_paid'), filter=Q(is_paid=False), output_field=MONEY),
+        Value(Decimal('0')),
+        output_field=MONEY,
+    )
+
+
+def outstanding_amount(sales):
+    """Pending credit of a Sale queryset, computed in the database"""
+    return sales.aggregate(total=outstanding_expression())['total']
+
+
+def balance_subquery():
+    """Correlated subquery giving the correct balance for the outer Customer row"""
+    balances = Sale.objects.filter(
+        customer=OuterRef('pk'), is_paid=False
+    ).order_by().values('customer').annotate(
+        total=Sum(F('total_amount') - F('amount_paid'), output_field=MONEY)
+    ).values('total')
+    return Coalesce(Subquery(balances, output_field=MONEY), Value(Decimal('0')), output_field=MONEY)
+
+
+def purchased_subquery():
+    """Correlated subquery giving the lifetime billed total of the outer Customer row"""
+    totals = Sale.objects.filter(customer=OuterRef('pk')).order_by().values('customer').annotate(
+        total=Sum('total_amount')
+    ).values('total')
+    return Coalesce(Subquery(totals, output_field=MONEY), Value(Decimal('0')), output_field=MONEY)
+
+
+def visits_subquery():
+    """Correlated subquery giving the number of bills of the outer Customer row"""
+    visits = Sale.objects.filter(customer=OuterRef('pk')).order_by().values('customer').annotate(
+        visits=Count('id')
+    ).values('visits')
+    return Coalesce(Subquery(visits), Value(0))
+
+
+def reconcile_stats(customers=None):
+    """
+    Rewrite total_purchased/total_visits of the customers whose counters drifted from
+    their sales, in one UPDATE; returns how many were fixed.
+    """
+    customers = Customer.objects.all() if customers is None else customers
+    drifted = customers.annotate(
+        real_purchased=purchased_subquery(), real_visits=visits_subquery()
+    ).exclude(
+        total_purchased=F('real_purchased'), total_visits=F('real_visits')
+    ).values('pk')
+    return Customer.objects.filter(pk__in=drifted).update(
+        total_purchased=purchased_subquery(),
+        total_visits=visits_subquery(),
+        updated_at=timezone.now(),
+    )
+
+
+# Shops whose balances are checked with one grouped aggregate
+TENANT_BATCH = 50
+
+# Drifted customers rewritten per UPDATE (keeps the IN list under SQLite's parameter limit)
+UPDATE_CHUNK = 500
+
+
+def reconcile_credit(customers=None, fix=True, tenant_batch=TENANT_BATCH):
+    """
+    Compare credit_amount with the remaining amounts of unpaid sales, a batch of shops at
+    a time: one grouped aggregate gives the batch's true balances, and the drifted rows
+    are rewritten by an UPDATE with balance_subquery(), so a payment landing in between
+    is still counted. Yields (customer id, user id, name, phone, recorded, correct) for
+    every drifted customer, once its batch is fixed (unless fix is False).
+    """
+    customers = Customer.objects.all() if customers is None else customers
+    tenants = list(customers.order_by('user_id').values_list('user_id', flat=True).distinct())
+
+    for start in range(0, len(tenants), tenant_batch):
+        batch = tenants[start:start + tenant_batch]
+        balances = dict(
+            Sale.objects.filter(user_id__in=batch, is_paid=False, customer__isnull=False)
+            .order_by().values_list('customer_id')
+            .annotate(total=Sum(F('total_amount') - F('amount_paid'), output_field=MONEY))
+        )
+
+        drifted = []
+        rows = customers.filter(user_id__in=batch).order_by().values_list(
+            'pk', 'user_id', 'name', 'phone', 'credit_amount'
+        )
+        for pk, user_id, name, phone, recorded in rows.iterator(chunk_size=2000):
+            correct = balances.get(pk) or Decimal('0')
+            if recorded != correct:
+                drifted.append((pk, user_id, name, phone, recorded, correct))
+
+        if fix and drifted:
+            now = timezone.now()
+            with transaction.atomic():
+                for chunk in range(0, len(drifted), UPDATE_CHUNK):
+                    Customer.objects.filter(pk__in=[row[0] for row in drifted[chunk:chunk + UPDATE_CHUNK]]).update(
+                        credit_amount=balance_subquery(), updated_at=now,
+                    )
+            for user_id in {row[1] for row in drifted}:
+                caching.bump(user_id, 'customers')
+
+        yield from drifted
+
+
+def adjust_credit(customer_id, delta):
+    """Move a customer's balance by delta without reading it first; never goes below zero"""
+    if not customer_id or not delta:
+        return
+    Customer.objects.filter(pk=customer_id).update(
+        credit_amount=Greatest(F('credit_amount') + Value(delta, output_field=MONEY), Value(Decimal('0')), output_field=MONEY),
+        updated_at=timezone.now(),
+    )
+
+
+class PaymentError(Exception):
+    """Raised when a credit payment cannot be recorded; nothing is written to the database"""
+
+
+def record_payment(user, customer_id, amount, received_at=None):
+    """
+    Record a credit payment and settle the customer's unpaid sales oldest first.
+
+    The customer row is locked so concurrent payments queue up; unpaid sales are read
+    in FIFO order only until the payment is used up, then written back with a single
+    bulk_update next to one bulk insert of allocation rows.
+    """
+    if amount <= 0:
+        raise PaymentError('Invalid payment amount!')
+
+    with transaction.atomic():
+        pending_credit = Customer.objects.select_for_update().filter(
+            pk=customer_id, user=user
+        ).values_list('credit_amount', flat=True).first()
+        if pending_credit is None:
+            raise PaymentError('Customer not found')
+        if amount > pending_credit:
+            raise PaymentError('Payment amount exceeds outstanding credit!')
+
+        payment = CreditPayment.objects.create(
+            user=user, customer_id=customer_id, amount=amount, received_at=received_at or timezone.now()
+        )
+
+        unpaid = Sale.objects.filter(customer_id=customer_id, is_paid=False).order_by(
+            'sale_date', 'id'
+        ).values_list('pk', 'total_amount', 'amount_paid')
+
+        settled, allocations = [], []
+        left = amount
+        now = timezone.now()
+        for pk, total, paid in unpaid.iterator(chunk_size=100):
+            share = min(left, max(Decimal('0'), total - paid))
+            settled.append(Sale(pk=pk, amount_paid=paid + share, is_paid=paid + share >= total, updated_at=now))
+            if share:
+                allocations.append(CreditPaymentAllocation(payment=payment, sale_id=pk, amount=share))
+            left -= share
+            if not left:
+                break
+
+        Sale.objects.bulk_update(settled, ['amount_paid', 'is_paid', 'updated_at'])
+        CreditPaymentAllocation.objects.bulk_create(allocations)
+
+        adjust_credit(customer_id, -amount)
+        rollups.record_payment(user, amount, payment.received_at)
+
+        # bulk_update sends no signals
+        for domain in ('sales', 'customers'):
+            caching.bump(user.pk, domain)
+
+    return payment
+
+
+def _older(date_field, kind, before):
+    """Rows of one kind that come after before=(date, kind, ref) in (date, kind, ref) descending order"""
+    date, before_kind, ref = before
+    if kind == before_kind:
+        return Q(**{f'{date_field}__lt': date}) | Q(**{date_field: date, 'pk__lt': ref})
+    # A sale and a payment can share a timestamp (and an id); at equal dates the kind decides
+    return Q(**{f'{date_field}__lte' if kind < before_kind else f'{date_field}__lt': date})
+
+
+def timeline(customer, limit=50, before=None):
+    """
+    Newest-first credit history of a customer: credit sales and payments merged in one
+    UNION query, each side reading its (customer, date, id) index. Entries are ordered by
+    (date, kind, ref) so the order is total across both tables; pass those of the last
+    entry shown as before to get the next page.
+    """
+    credits = Sale.objects.filter(customer=customer, added_to_credit=True)
+    payments = CreditPayment.objects.filter(customer=customer)
+    if before is not None:
+        credits = credits.filter(_older('sale_date', 'credit', before))
+        payments = payments.filter(_older('received_at', 'payment', before))
+
+    credits = credits.order_by().values(
+        date=F('sale_date'), kind=Value('credit', output_field=CharField()), value=F('total_amount'), ref=F('pk')
+    )
+    payments = payments.order_by().values(
+        date=F('received_at'), kind=Value('payment', output_field=CharField()), value=F('amount'), ref=F('pk')
+    )
+    rows = credits.union(payments, all=True).order_by('-date', '-kind', '-ref')[:limit]
+    return [
+        {'date': row['date'], 'type': row['kind'], 'amount': row['value'], 'ref': row['ref']}
+        for row in rows
+    ]
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from customers import benchmarks
+
+class Command(BaseCommand):
+    help = 'Benchmark the hot views on seeded shops (in a throwaway test database) against query budgets and a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='small,medium', help=f"Comma-separated shop sizes: {', '.join(benchmarks.SIZES)}")
+        parser.add_argument('--baseline', default='benchmarks/baseline.json', help='Baseline JSON file')
+        parser.add_argument('--update-baseline', action='store_true', help='Write these results as the new baseline')
+        parser.add_argument('--table', help='Also write the comparison table (Markdown) to this file')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed requests per view')
+        parser.add_argument('--tolerance', type=float, default=benchmarks.TOLERANCE, help='Allowed slowdown factor over the baseline')
+
+    def handle(self, *args, **options):
+        sizes = [size.strip() for size in options['sizes'].split(',') if size.strip()]
+        unknown = set(sizes) - set(benchmarks.SIZES)
+        if unknown:
+            raise CommandError(f"Unknown sizes: {', '.join(sorted(unknown))}")
+
+        setup_test_environment()
+        databases = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            shops = []
+            for index, size in enumerate(sizes, 1):
+                self.stdout.write(f'Seeding {size} shop...')
+                shops.append(benchmarks.seed(size, index))
+            results = benchmarks.run(shops, repeat=options['repeat'])
+        finally:
+            teardown_databases(databases, verbosity=0)
+            teardown_test_environment()
+
+        baseline = benchmarks.load_baseline(options['baseline'])
+        report = benchmarks.table(results, baseline)
+        self.stdout.write(report)
+        if options['table']:
+            with open(options['table'], 'w') as f:
+                f.write(f"# View benchmarks\n\nShops: {', '.join(sizes)}. Changes are against the baseline.\n\n{report}\n")
+
+        if options['update_baseline']:
+            benchmarks.save_baseline(options['baseline'], results)
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['baseline']}"))
+            return
+
+        failures = benchmarks.check(results, baseline, tolerance=options['tolerance'])
+        if failures:
+            raise CommandError('Performance regressions:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('All views within their query budgets and baseline.'))
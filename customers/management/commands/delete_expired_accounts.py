@@ -1,45 +1,56 @@
-from django.core.management.base import BaseCommand
-from django.utils import timezone
-from django.contrib.auth import get_user_model
-from datetime import timedelta
-from customers.models import UserProfile, Customer, Product, Sale, Offer, EmailLog
-
-User = get_user_model()
+from django.core.management.base import BaseCommand, CommandError
+import time
+from customers import purge
 
 class Command(BaseCommand):
-    help = 'Permanently delete accounts that have been pending deletion for more than 30 days'
+    help = (
+        f'Permanently delete accounts that have been pending deletion for more than {purge.GRACE_DAYS} days, '
+        'a table at a time in short batches; an interrupted run resumes where it stopped'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only count the rows that would be deleted')
+        parser.add_argument('--max-seconds', type=float, help='Stop between batches after this long')
+        parser.add_argument('--batch-size', type=int, default=purge.BATCH_SIZE, help='Rows deleted per transaction')
 
     def handle(self, *args, **options):
-        # Calculate the threshold date (30 days ago)
-        threshold_date = timezone.now() - timedelta(days=30)
-        
-        # Find users pending deletion older than 30 days
-        users_to_delete = User.objects.filter(
-            is_pending_deletion=True,
-            deletion_requested_at__lte=threshold_date
-        )
-        
-        count = users_to_delete.count()
-        
-        if count == 0:
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        deadline = time.monotonic() + options['max_seconds'] if options['max_seconds'] else None
+
+        users = list(purge.expired_accounts())
+        if not users:
             self.stdout.write(self.style.SUCCESS('No expired accounts found to delete.'))
             return
-            
-        self.stdout.write(self.style.WARNING(f'Found {count} accounts eligible for deletion.'))
-        
-        for user in users_to_delete:
-            try:
-                # Log the deletion
-                self.stdout.write(f'Deleting user: {user.email} (Requested: {user.deletion_requested_at})')
-                
-                # Delete related data explicitly if needed (Django cascade usually handles this)
-                # Note: Django's on_delete=models.CASCADE in models ensures related data is deleted
-                # We are relying on that for Sales, Customers, Products, etc.
-                
-                # Delete the user
-                user.delete()
-                
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f'Error deleting user {user.email}: {str(e)}'))
-        
-        self.stdout.write(self.style.SUCCESS(f'Successfully deleted {count} expired accounts.'))
+
+        self.stdout.write(self.style.WARNING(f'Found {len(users)} accounts eligible for deletion.'))
+
+        if options['dry_run']:
+            for user in users:
+                counts = purge.count(user)
+                self.stdout.write(f'{user.email} (requested {user.deletion_requested_at}): {sum(counts.values())} rows')
+                for label, rows in counts.items():
+                    if rows:
+                        self.stdout.write(f'  {label}: {rows}')
+            self.stdout.write(self.style.SUCCESS('Dry run, nothing was deleted.'))
+            return
+
+        deleted = rows = 0
+        started = time.monotonic()
+        for user in users:
+            self.stdout.write(f'Deleting user: {user.email} (Requested: {user.deletion_requested_at})')
+            progress = purge.purge(user, batch_size=options['batch_size'], deadline=deadline)
+            rows += progress.rows
+            self.stdout.write(
+                f'  {progress.rows} rows and {progress.files} files in {progress.seconds:.1f}s ({progress.rate:.0f} rows/s)'
+            )
+            if not progress.done:
+                self.stdout.write(self.style.WARNING(f'  Time is up; the next run resumes at {progress.step}.'))
+                break
+            deleted += 1
+
+        elapsed = time.monotonic() - started
+        rate = rows / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} of {len(users)} expired accounts ({rows} rows, {rate:.0f} rows/s).'
+        ))
@@ -1,43 +1,72 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.utils import timezone
+from datetime import datetime, time
+import csv
 from customers.models import Customer, Sale
-from decimal import Decimal
-from django.db.models import Sum
+from customers import ledger
+
+User = get_user_model()
 
 class Command(BaseCommand):
-    help = 'Recalculate customer credit amounts based on unpaid sales'
+    help = (
+        'Reconcile the customer credit ledger against the remaining amounts of unpaid sales. '
+        'With --check nothing is changed and the exit status is 1 when any balance drifted.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', action='append', help='Only this account email (repeatable)')
+        parser.add_argument('--since', help='Only customers whose balance or sales changed on or after this day (YYYY-MM-DD)')
+        parser.add_argument('--report', help='Write the discrepancies to this CSV file')
+        parser.add_argument('--check', action='store_true', help='Report discrepancies without fixing them')
 
     def handle(self, *args, **options):
-        self.stdout.write('Starting customer credit amount recalculation...')
-        
-        customers_fixed = 0
-        total_adjustments = 0
-        
-        for customer in Customer.objects.all():
-            # Calculate the correct credit amount based on unpaid sales
-            correct_credit = Sale.objects.filter(
-                customer=customer,
-                is_paid=False
-            ).aggregate(total=Sum('total_amount'))['total'] or Decimal('0')
-            
-            # If the current credit amount is different from what it should be
-            if customer.credit_amount != correct_credit:
-                old_amount = customer.credit_amount
-                customer.credit_amount = correct_credit
-                
-                # Ensure non-negative values
-                if customer.credit_amount < 0:
-                    customer.credit_amount = Decimal('0')
-                
-                customer.save()
-                
-                customers_fixed += 1
-                
-                self.stdout.write(
-                    f'Fixed {customer.name}: {old_amount} -> {customer.credit_amount}'
-                )
-        
-        self.stdout.write(
-            self.style.SUCCESS(
-                f'Successfully fixed {customers_fixed} customers.'
+        customers = Customer.objects.all()
+
+        if options['tenant']:
+            emails = [email.lower() for email in options['tenant']]
+            tenants = list(User.objects.filter(email__in=emails).values_list('pk', flat=True))
+            if len(tenants) != len(set(emails)):
+                raise CommandError('No account found for one of the --tenant emails')
+            customers = customers.filter(user_id__in=tenants)
+
+        if options['since']:
+            try:
+                day = datetime.strptime(options['since'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--since must be in YYYY-MM-DD format')
+            since = timezone.make_aware(datetime.combine(day, time.min))
+            # Balances move through sales (bills, payments) and direct adjustments of the customer row
+            customers = customers.filter(
+                Q(updated_at__gte=since)
+                | Q(pk__in=Sale.objects.filter(updated_at__gte=since, customer__isnull=False).values('customer_id'))
             )
-        )
\ No newline at end of file
+
+        fix = not options['check']
+        self.stdout.write('Starting customer credit amount reconciliation...')
+
+        report = open(options['report'], 'w', newline='') if options['report'] else None
+        try:
+            writer = csv.writer(report) if report else None
+            if writer:
+                writer.writerow(['customer_id', 'user_id', 'name', 'phone', 'recorded', 'correct', 'difference'])
+
+            found = 0
+            for pk, user_id, name, phone, recorded, correct in ledger.reconcile_credit(customers, fix=fix):
+                found += 1
+                if writer:
+                    writer.writerow([pk, user_id, name, phone, f'{recorded:.2f}', f'{correct:.2f}', f'{recorded - correct:.2f}'])
+                else:
+                    self.stdout.write(f'{"Fixed" if fix else "Drifted"} {name}: {recorded:.2f} -> {correct:.2f}')
+        finally:
+            if report:
+                report.close()
+
+        if not fix:
+            if found:
+                raise CommandError(f'{found} customer balances drifted from their unpaid sales.', returncode=1)
+            self.stdout.write(self.style.SUCCESS('All customer balances match their unpaid sales.'))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f'Successfully fixed {found} customers.'))
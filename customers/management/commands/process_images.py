@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+import time
+from customers import images
+from customers.models import UserProfile, Product, ShopPhoto
+
+class Command(BaseCommand):
+    help = 'Generate list, card and receipt variants for new profile, product and gallery images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Rows read per query')
+        parser.add_argument('--loop', action='store_true', help='Keep running and poll for new images')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            done = images.drain((UserProfile, Product, ShopPhoto), options['batch_size'])
+            if done or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f'Processed images for {done} rows.'))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
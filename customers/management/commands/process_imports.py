@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+import time
+from customers import imports
+
+class Command(BaseCommand):
+    help = 'Run queued product and customer imports, saving progress after every chunk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep running and poll for new uploads')
+        parser.add_argument('--interval', type=float, default=2, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            done = imports.drain()
+            if done or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f'Ran {done} import(s).'))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
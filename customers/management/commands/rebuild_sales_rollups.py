@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from datetime import datetime
+from customers import rollups
+
+User = get_user_model()
+
+class Command(BaseCommand):
+    help = 'Backfill or rebuild the daily sales rollup table from recorded sales'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only rebuild rollups for this account email')
+        parser.add_argument('--from', dest='date_from', help='First day to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='date_to', help='Last day to rebuild (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        users = None
+        if options['user']:
+            users = User.objects.filter(email=options['user'].lower())
+            if not users.exists():
+                raise CommandError(f"No account found for {options['user']}")
+
+        try:
+            date_from = datetime.strptime(options['date_from'], '%Y-%m-%d').date() if options['date_from'] else None
+            date_to = datetime.strptime(options['date_to'], '%Y-%m-%d').date() if options['date_to'] else None
+        except ValueError:
+            raise CommandError('Dates must be in YYYY-MM-DD format')
+
+        self.stdout.write('Rebuilding daily sales rollups...')
+        written = rollups.rebuild(users=users, date_from=date_from, date_to=date_to)
+        self.stdout.write(self.style.SUCCESS(f'Successfully wrote {written} daily rollup rows.'))
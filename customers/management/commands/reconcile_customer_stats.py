@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+import time
+from customers import ledger
+
+class Command(BaseCommand):
+    help = 'Repair customer visit and purchase totals that drifted from their sales'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep running and reconcile periodically')
+        parser.add_argument('--interval', type=float, default=3600, help='Seconds between runs with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            fixed = ledger.reconcile_stats()
+            self.stdout.write(self.style.SUCCESS(f'Reconciled stats for {fixed} customers.'))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from datetime import datetime
+import time
+from customers import seeding
+
+class Command(BaseCommand):
+    help = 'Load synthetic products, customers, offers and sales history for load and benchmark testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=2000, help='Products per shop')
+        parser.add_argument('--customers', type=int, default=5000, help='Customers per shop')
+        parser.add_argument('--sales', type=int, default=20000, help='Sales per shop')
+        parser.add_argument('--offers', type=int, default=10, help='Offers per shop')
+        parser.add_argument('--days', type=int, default=365, help='Days of history ending at --end-date')
+        parser.add_argument('--end-date', help='Last day of history (YYYY-MM-DD, default today)')
+        parser.add_argument('--tenants', type=int, default=1, help='Number of seed shops (seed-shop-N@example.com)')
+        parser.add_argument('--user', help='Load into this existing account instead of seed shops')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same data')
+        parser.add_argument('--chunk-size', type=int, default=seeding.CHUNK_SIZE, help='Rows per bulk insert')
+
+    def handle(self, *args, **options):
+        try:
+            end_date = datetime.strptime(options['end_date'], '%Y-%m-%d').date() if options['end_date'] else None
+        except ValueError:
+            raise CommandError('Dates must be in YYYY-MM-DD format')
+        if options['days'] < 1 or options['chunk_size'] < 1:
+            raise CommandError('--days and --chunk-size must be positive')
+
+        if options['user']:
+            users = [seeding.User.objects.filter(email=options['user'].lower()).first()]
+            if users[0] is None:
+                raise CommandError(f"No account found for {options['user']}")
+        else:
+            users = [seeding.shop_user(index) for index in range(1, options['tenants'] + 1)]
+
+        for user in users:
+            started = time.monotonic()
+            self.stdout.write(f'Seeding {user.email}...')
+            result = seeding.seed_shop(
+                user,
+                products=options['products'],
+                customers=options['customers'],
+                sales=options['sales'],
+                offers=options['offers'],
+                days=options['days'],
+                seed=options['seed'],
+                end_date=end_date,
+                chunk_size=options['chunk_size'],
+                progress=lambda sales: self.stdout.write(f'  {sales} sales'),
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'{user.email}: {result.products} products, {result.customers} customers, {result.offers} offers, '
+                f'{result.sales} sales with {result.items} items in {time.monotonic() - started:.1f}s'
+            ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+import time
+from customers import outbox
+
+PRUNE_INTERVAL = 3600
+
+class Command(BaseCommand):
+    help = 'Send emails waiting in the outbox (OTP and other account emails)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Emails sent per SMTP connection')
+        parser.add_argument('--loop', action='store_true', help='Keep running and poll for new emails')
+        parser.add_argument('--interval', type=float, default=2, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        pruned_at = None
+        while True:
+            sent, failed = outbox.drain(options['batch_size'])
+            if sent or failed or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f'Sent {sent} emails, {failed} failed.'))
+            
+            # Old finished rows are cleared about once an hour, not on every poll
+            if pruned_at is None or time.monotonic() - pruned_at >= PRUNE_INTERVAL:
+                pruned = outbox.prune()
+                pruned_at = time.monotonic()
+                if pruned:
+                    self.stdout.write(f'Pruned {pruned} finished emails.')
+            
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
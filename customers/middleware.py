@@ -1,6 +1,73 @@
-"""Activity tracking middleware for monitoring user sessions"""
+"""Request middleware: instrumentation, activity tracking and read replica routing"""
+from django.conf import settings
+from django.db import connections
+from django.urls import Resolver404, resolve
 from django.utils import timezone
+from contextlib import ExitStack
 from datetime import datetime, timedelta
+import json
+import logging
+import random
+
+from . import instrumentation
+from .routers import read_replica, using_replica
+
+slow_request_logger = logging.getLogger('customers.slow_requests')
+
+
+class InstrumentationMiddleware:
+    """
+    Measure SQL, cache and template time for every request and report it in a
+    Server-Timing header.
+    
+    A share of requests (SLOW_REQUEST_SAMPLE_RATE) also records the call site of its
+    slowest statements; those taking longer than SLOW_REQUEST_MS are logged as one JSON
+    line on the customers.slow_requests logger.
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'SERVER_TIMING_HEADER', True)
+        self.sample_rate = getattr(settings, 'SLOW_REQUEST_SAMPLE_RATE', 0.1)
+        self.slow_ms = getattr(settings, 'SLOW_REQUEST_MS', 500)
+        self.top = getattr(settings, 'SLOW_REQUEST_TOP_QUERIES', 5)
+    
+    def __call__(self, request):
+        stats = instrumentation.RequestStats(sampled=random.random() < self.sample_rate, top=self.top)
+        token = instrumentation.start(stats)
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(instrumentation.query_wrapper))
+                response = self.get_response(request)
+        finally:
+            instrumentation.finish(token)
+        
+        if self.server_timing:
+            response['Server-Timing'] = stats.server_timing()
+        if stats.sampled and stats.total_ms >= self.slow_ms:
+            self.log_slow_request(request, response, stats)
+        return response
+    
+    def log_slow_request(self, request, response, stats):
+        match = request.resolver_match
+        slow_request_logger.warning(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'user_id': request.user.pk if getattr(request, 'user', None) and request.user.is_authenticated else None,
+            'total_ms': round(stats.total_ms, 1),
+            'db_ms': round(stats.query_ms, 1),
+            'queries': stats.queries,
+            'template_ms': round(stats.template_ms, 1),
+            'cache_hits': stats.cache_hits,
+            'cache_misses': stats.cache_misses,
+            'slowest': [
+                {'ms': round(statement.ms, 2), 'sql': statement.sql[:500], 'site': statement.site}
+                for statement in sorted(stats.slowest, reverse=True)
+            ],
+        }))
 
 
 class ActivityTrackingMiddleware:
@@ -10,12 +77,15 @@ class ActivityTrackingMiddleware:
     Tracks how long authenticated users are active on the site by:
     - Recording session start times
     - Calculating time between requests
-    - Updating UserActivity model with daily totals
+    - Buffering daily totals that are flushed to UserActivity in batches
     """
     
     # Consider user inactive after 5 minutes of no requests
     INACTIVE_THRESHOLD = 300  # seconds
     
+    # Minimum gap between session writes of the last activity time
+    SESSION_WRITE_INTERVAL = 60  # seconds
+    
     def __init__(self, get_response):
         self.get_response = get_response
     
@@ -28,47 +98,74 @@ class ActivityTrackingMiddleware:
         return response
     
     def track_activity(self, request):
-        """Track user activity and update UserActivity model"""
-        from customers.models import UserActivity
+        """Add the time since the user's previous request to today's buffered activity"""
+        from customers import activity
         
         user = request.user
         now = timezone.now()
-        today = now.date()
-        
-        # Get or create today's activity record
-        activity, created = UserActivity.objects.get_or_create(
-            user=user,
-            date=today,
-            defaults={'login_count': 1}
-        )
+        today = timezone.localdate(now)
         
         # Get last activity time from session
         last_activity_str = request.session.get('last_activity')
         
-        if last_activity_str:
-            try:
-                # Parse the stored timestamp
-                last_activity = datetime.fromisoformat(last_activity_str)
-                
-                # Make it timezone-aware if it isn't
-                if timezone.is_naive(last_activity):
-                    last_activity = timezone.make_aware(last_activity)
-                
-                # Calculate time since last activity
-                time_diff = (now - last_activity).total_seconds()
-                
-                # Only count if within inactive threshold
-                if time_diff <= self.INACTIVE_THRESHOLD:
-                    activity.total_active_seconds += int(time_diff)
-                    activity.save(update_fields=['total_active_seconds', 'last_activity'])
-            except (ValueError, TypeError):
-                # If parsing fails, just update last activity
-                pass
-        else:
-            # First activity of the session, increment login count
-            if not created:
-                activity.login_count += 1
-                activity.save(update_fields=['login_count', 'last_activity'])
+        if not last_activity_str:
+            # First activity of the session, count a login
+            activity.record(user.pk, today, logins=1)
+            request.session['last_activity'] = now.isoformat()
+            return
+        
+        try:
+            # Parse the stored timestamp
+            last_activity = datetime.fromisoformat(last_activity_str)
+            
+            # Make it timezone-aware if it isn't
+            if timezone.is_naive(last_activity):
+                last_activity = timezone.make_aware(last_activity)
+        except (ValueError, TypeError):
+            request.session['last_activity'] = now.isoformat()
+            return
+        
+        # Calculate time since last activity
+        time_diff = (now - last_activity).total_seconds()
+        
+        # Requests close together are counted with the next one, so the session is
+        # only written about once a minute while the user is active
+        if time_diff < self.SESSION_WRITE_INTERVAL:
+            return
+        
+        # Only count if within inactive threshold
+        if time_diff <= self.INACTIVE_THRESHOLD:
+            activity.record(user.pk, today, seconds=int(time_diff))
         
         # Update last activity time in session
         request.session['last_activity'] = now.isoformat()
+
+
+class ReadReplicaMiddleware:
+    """
+    Route the reads of read-heavy views (settings.READ_REPLICA_VIEWS) to the replica.
+    
+    The rest of the request (view, exception handling, template response rendering)
+    runs inside the replica context; Django still calls the view. Streamed responses
+    are produced after that returns, so their content is wrapped to keep reading from
+    the replica while it is sent. Last in MIDDLEWARE, so sessions and auth read from
+    the primary.
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.views = frozenset(getattr(settings, 'READ_REPLICA_VIEWS', ()))
+    
+    def __call__(self, request):
+        try:
+            view_name = resolve(request.path_info, getattr(request, 'urlconf', None)).view_name
+        except Resolver404:
+            view_name = None
+        if view_name not in self.views:
+            return self.get_response(request)
+        
+        with read_replica():
+            response = self.get_response(request)
+        if response.streaming:
+            response.streaming_content = using_replica(response.streaming_content)
+        return response
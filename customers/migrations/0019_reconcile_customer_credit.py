@@ -0,0 +1,33 @@
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def reconcile_credit(apps, schema_editor):
+    """Credit payments never reduced credit_amount before; rebuild it from unpaid sales"""
+    Customer = apps.get_model('customers', 'Customer')
+    Sale = apps.get_model('customers', 'Sale')
+    money = models.DecimalField(max_digits=10, decimal_places=2)
+
+    balances = Sale.objects.filter(
+        customer=OuterRef('pk'), is_paid=False
+    ).order_by().values('customer').annotate(
+        total=Sum(F('total_amount') - F('amount_paid'), output_field=money)
+    ).values('total')
+
+    Customer.objects.update(
+        credit_amount=Coalesce(Subquery(balances, output_field=money), Value(Decimal('0')), output_field=money)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0018_sale_amount_paid'),
+    ]
+
+    operations = [
+        migrations.RunPython(reconcile_credit, migrations.RunPython.noop),
+    ]
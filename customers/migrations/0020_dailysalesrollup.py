@@ -0,0 +1,71 @@
+# Generated by Django 5.2.7 on 2026-10-16 22:47
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+MONEY = models.DecimalField(max_digits=12, decimal_places=2)
+ZERO = Decimal('0')
+
+
+def backfill_rollups(apps, schema_editor):
+    """
+    Fill the new table from existing sales, frozen from rollups.rebuild at this point
+    (credit payments were not recorded yet, so credit_collected starts at zero)
+    """
+    Sale = apps.get_model('customers', 'Sale')
+    DailySalesRollup = apps.get_model('customers', 'DailySalesRollup')
+
+    day = TruncDate('sale_date', tzinfo=timezone.get_current_timezone())
+    totals = Sale.objects.annotate(day=day).order_by().values('user_id', 'day').annotate(
+        revenue=Coalesce(Sum('total_amount'), Value(ZERO), output_field=MONEY),
+        bill_count=Count('id'),
+        credit_issued=Coalesce(Sum('total_amount', filter=Q(added_to_credit=True)), Value(ZERO), output_field=MONEY),
+        discount=Coalesce(Sum('discount_amount'), Value(ZERO), output_field=MONEY),
+    )
+    DailySalesRollup.objects.bulk_create((
+        DailySalesRollup(
+            user_id=row['user_id'],
+            date=row['day'],
+            revenue=row['revenue'],
+            bill_count=row['bill_count'],
+            credit_issued=row['credit_issued'],
+            discount=row['discount'],
+        )
+        for row in totals.iterator()
+    ), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0019_reconcile_customer_credit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('bill_count', models.IntegerField(default=0)),
+                ('credit_issued', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('credit_collected', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('discount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Daily Sales Rollup',
+                'verbose_name_plural': 'Daily Sales Rollups',
+                'ordering': ['-date'],
+                'unique_together': {('user', 'date')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,112 @@
+# Generated by Django 5.2.7 on 2026-10-16 22:57
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+# Copy of customers.search.normalize as it was when search keys were introduced, so this
+# migration keeps producing the same keys whatever later happens to the live normalizer
+
+_CONSONANTS = {
+    'क': 'k', 'ख': 'kh', 'ग': 'g', 'घ': 'gh', 'ङ': 'n',
+    'च': 'ch', 'छ': 'chh', 'ज': 'j', 'झ': 'jh', 'ञ': 'n',
+    'ट': 't', 'ठ': 'th', 'ड': 'd', 'ढ': 'dh', 'ण': 'n',
+    'त': 't', 'थ': 'th', 'द': 'd', 'ध': 'dh', 'न': 'n',
+    'प': 'p', 'फ': 'ph', 'ब': 'b', 'भ': 'bh', 'म': 'm',
+    'य': 'y', 'र': 'r', 'ल': 'l', 'ळ': 'l', 'व': 'v',
+    'श': 'sh', 'ष': 'sh', 'स': 's', 'ह': 'h',
+}
+_VOWELS = {
+    'अ': 'a', 'आ': 'a', 'इ': 'i', 'ई': 'i', 'उ': 'u', 'ऊ': 'u', 'ऋ': 'ri',
+    'ए': 'e', 'ऐ': 'ai', 'ओ': 'o', 'औ': 'au', 'ऍ': 'e', 'ऑ': 'o',
+}
+_MATRAS = {
+    'ा': 'a', 'ि': 'i', 'ी': 'i', 'ु': 'u', 'ू': 'u', 'ृ': 'ri',
+    'े': 'e', 'ै': 'ai', 'ो': 'o', 'ौ': 'au', 'ॅ': 'e', 'ॉ': 'o',
+}
+_NASALS = {'ं': 'n', 'ँ': 'n', 'ः': 'h'}
+_VIRAMA = '्'
+_NUKTA = '़'
+
+# Applied after transliteration so "Raam", "Ram" and "राम" share a key
+_LATIN_FOLDS = (('ee', 'i'), ('oo', 'u'), ('w', 'v'))
+
+
+def _transliterate(text):
+    out = []
+    chars = [ch for ch in text if ch != _NUKTA]
+    for i, ch in enumerate(chars):
+        if ch in _CONSONANTS:
+            out.append(_CONSONANTS[ch])
+            following = chars[i + 1] if i + 1 < len(chars) else ''
+            # Inherent vowel, dropped before a vowel sign or virama and at the end of a word
+            if following and following not in _MATRAS and following != _VIRAMA and (
+                following in _CONSONANTS or following in _NASALS
+            ):
+                out.append('a')
+        elif ch in _MATRAS:
+            out.append(_MATRAS[ch])
+        elif ch in _VOWELS:
+            out.append(_VOWELS[ch])
+        elif ch in _NASALS:
+            out.append(_NASALS[ch])
+        elif ch == _VIRAMA:
+            continue
+        elif unicodedata.category(ch) == 'Nd':
+            out.append(str(unicodedata.digit(ch)))
+        else:
+            out.append(ch)
+    return ''.join(out)
+
+
+def normalize(text):
+    """Search key for a name or a query: folded Latin words separated by single spaces"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch) or ch in _MATRAS or ch in _NASALS or ch == _VIRAMA)
+    text = _transliterate(text).lower()
+    for source, target in _LATIN_FOLDS:
+        text = text.replace(source, target)
+    # Doubled letters are spelled inconsistently (Pappu/Papu, Sharmaa/Sharma)
+    text = re.sub(r'([a-z])\1+', r'\1', text)
+    return ' '.join(re.findall(r'[a-z0-9]+', text))
+
+
+
+def fill_search_keys(apps, schema_editor):
+    for model_name in ('Customer', 'Product'):
+        model = apps.get_model('customers', model_name)
+        rows = []
+        for row in model.objects.only('id', 'name').iterator(chunk_size=2000):
+            row.search_key = normalize(row.name)
+            rows.append(row)
+        model.objects.bulk_update(rows, ['search_key'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0021_catalogtombstone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='search_key',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='search_key',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['user', 'search_key'], name='customers_c_user_id_718e9a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['user', 'search_key'], name='customers_p_user_id_352b68_idx'),
+        ),
+        migrations.RunPython(fill_search_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0022_search_keys'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='sale',
+            name='customers_s_user_id_376a4b_idx',
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['user', '-sale_date', '-id'], name='customers_s_user_id_0f60e3_idx'),
+        ),
+    ]
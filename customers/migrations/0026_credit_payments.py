@@ -0,0 +1,68 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:45
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0025_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CreditPayment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('received_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Credit Payment',
+                'verbose_name_plural': 'Credit Payments',
+                'ordering': ['-received_at', '-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CreditPaymentAllocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+            ],
+            options={
+                'verbose_name': 'Credit Payment Allocation',
+                'verbose_name_plural': 'Credit Payment Allocations',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['customer', '-sale_date', '-id'], name='sale_customer_history'),
+        ),
+        migrations.AddField(
+            model_name='creditpayment',
+            name='customer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credit_payments', to='customers.customer'),
+        ),
+        migrations.AddField(
+            model_name='creditpayment',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credit_payments', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='creditpaymentallocation',
+            name='payment',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allocations', to='customers.creditpayment'),
+        ),
+        migrations.AddField(
+            model_name='creditpaymentallocation',
+            name='sale',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payment_allocations', to='customers.sale'),
+        ),
+        migrations.AddIndex(
+            model_name='creditpayment',
+            index=models.Index(fields=['customer', '-received_at', '-id'], name='customers_c_custome_9ee84a_idx'),
+        ),
+    ]
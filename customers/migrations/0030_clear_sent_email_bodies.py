@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def clear_bodies(apps, schema_editor):
+    """Finished emails kept their bodies (OTP codes included); only pending ones need them"""
+    QueuedEmail = apps.get_model('customers', 'QueuedEmail')
+    QueuedEmail.objects.filter(status__in=['sent', 'failed']).exclude(html_body='').update(html_body='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0029_purge_checkpoints'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_bodies, migrations.RunPython.noop),
+    ]
@@ -6,10 +6,6 @@ from datetime import timedelta
 from decimal import Decimal
 import random
 import string
-import os
-from PIL import Image
-from io import BytesIO
-from django.core.files.base import ContentFile
 
 class CustomUser(AbstractUser):
     """Custom User model with email-based authentication"""
@@ -118,8 +114,39 @@ class EmailLog(models.Model):
         return f"{self.email} - {self.subject}"
 
 
+class QueuedEmail(models.Model):
+    """Outgoing email waiting in the outbox; sent by the send_queued_emails worker"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    
+    log = models.OneToOneField(EmailLog, on_delete=models.CASCADE, related_name='queued_email')
+    to = models.EmailField()
+    subject = models.CharField(max_length=255)
+    html_body = models.TextField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['created_at']
+        verbose_name = 'Queued Email'
+        verbose_name_plural = 'Queued Emails'
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+    
+    def __str__(self):
+        return f"{self.to} - {self.subject} ({self.status})"
+
+
 class UserProfile(models.Model):
     """Store additional user profile information for shop branding"""
+    IMAGE_FIELDS = ('profile_picture', 'shop_logo')
+    
     user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, related_name='profile')
     shop_name = models.CharField(max_length=255, blank=True, default='My Shop')
     shop_category = models.CharField(
@@ -137,6 +164,10 @@ class UserProfile(models.Model):
     )
     profile_picture = models.ImageField(upload_to='profiles/', null=True, blank=True)
     shop_logo = models.ImageField(upload_to='logos/', blank=True, null=True)
+    # Content hashes of the images above and whether their variants exist (see images.py)
+    profile_picture_hash = models.CharField(max_length=64, blank=True, editable=False)
+    shop_logo_hash = models.CharField(max_length=64, blank=True, editable=False)
+    images_ready = models.BooleanField(default=False, editable=False)
     phone = models.CharField(max_length=20, blank=True)
     address = models.TextField(blank=True)
     city = models.CharField(max_length=100, blank=True)
@@ -153,27 +184,6 @@ class UserProfile(models.Model):
     def __str__(self):
         return f"{self.user.email} - {self.shop_name}"
 
-    def save(self, *args, **kwargs):
-        # Compress images if they are new or changed
-        if self.profile_picture:
-            self.profile_picture = self.compress_image(self.profile_picture)
-        if self.shop_logo:
-            self.shop_logo = self.compress_image(self.shop_logo)
-        super().save(*args, **kwargs)
-
-    def compress_image(self, image):
-        try:
-            img = Image.open(image)
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            output = BytesIO()
-            img.save(output, format='JPEG', quality=70)
-            output.seek(0)
-            return ContentFile(output.read(), name=os.path.basename(image.name))
-        except Exception:
-            return image
-
 
 class Customer(models.Model):
     """Customer model for tracking customer information and credit"""
@@ -185,6 +195,7 @@ class Customer(models.Model):
     credit_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     total_purchased = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     total_visits = models.IntegerField(default=0)
+    search_key = models.CharField(max_length=255, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -192,7 +203,10 @@ class Customer(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Customer'
         verbose_name_plural = 'Customers'
-        indexes = [models.Index(fields=['user', '-created_at'])]
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+            models.Index(fields=['user', 'search_key']),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.phone})"
@@ -201,6 +215,8 @@ class Customer(models.Model):
 class Product(models.Model):
     """Product model for inventory management"""
     
+    IMAGE_FIELDS = ('image',)
+    
     PRODUCT_TYPE_CHOICES = [
         ('product', 'Product'),
         ('service', 'Service'),
@@ -235,8 +251,11 @@ class Product(models.Model):
     unit = models.CharField(max_length=20, choices=UNIT_CHOICES, default='piece', blank=True)
     stock_quantity = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     image = models.ImageField(upload_to='products/', null=True, blank=True)
+    image_hash = models.CharField(max_length=64, blank=True, editable=False)
+    images_ready = models.BooleanField(default=False, editable=False)
     description = models.TextField(blank=True)
     is_active = models.BooleanField(default=True)
+    search_key = models.CharField(max_length=255, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -244,7 +263,12 @@ class Product(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Product'
         verbose_name_plural = 'Products'
-        indexes = [models.Index(fields=['user', 'category'])]
+        indexes = [
+            models.Index(fields=['user', 'category']),
+            models.Index(fields=['user', 'search_key']),
+            # Keeps the image worker's poll cheap on large catalogs
+            models.Index(fields=['id'], condition=Q(images_ready=False), name='product_images_pending'),
+        ]
     
     def __str__(self):
         return f"{self.name} (Rs. {self.price})"
@@ -292,7 +316,10 @@ class Sale(models.Model):
         ordering = ['-sale_date']
         verbose_name = 'Sale'
         verbose_name_plural = 'Sales'
-        indexes = [models.Index(fields=['user', '-sale_date'])]
+        indexes = [
+            models.Index(fields=['user', '-sale_date', '-id']),
+            models.Index(fields=['customer', '-sale_date', '-id'], name='sale_customer_history'),
+        ]
     
     def __str__(self):
         customer_name = self.customer.name if self.customer else 'Walk-in'
@@ -403,11 +430,84 @@ class SaleOffer(models.Model):
         verbose_name_plural = 'Sale Offers'
 
 
+class CreditPayment(models.Model):
+    """A credit (udhar) repayment received from a customer"""
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='credit_payments')
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='credit_payments')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    received_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['-received_at', '-id']
+        verbose_name = 'Credit Payment'
+        verbose_name_plural = 'Credit Payments'
+        indexes = [models.Index(fields=['customer', '-received_at', '-id'])]
+    
+    def __str__(self):
+        return f"{self.customer.name} - Rs. {self.amount} ({self.received_at.date()})"
+
+
+class CreditPaymentAllocation(models.Model):
+    """Part of a credit payment applied to one unpaid sale (oldest sales first)"""
+    payment = models.ForeignKey(CreditPayment, on_delete=models.CASCADE, related_name='allocations')
+    sale = models.ForeignKey(Sale, on_delete=models.CASCADE, related_name='payment_allocations')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    
+    class Meta:
+        verbose_name = 'Credit Payment Allocation'
+        verbose_name_plural = 'Credit Payment Allocations'
+
+
+
+class DailySalesRollup(models.Model):
+    """Per-shop daily sales totals, maintained incrementally for dashboard and reports"""
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='daily_rollups')
+    date = models.DateField()  # Local (shop timezone) date of the sales
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    bill_count = models.IntegerField(default=0)
+    credit_issued = models.DecimalField(max_digits=12, decimal_places=2, default=0)  # Billed on credit (udhar)
+    credit_collected = models.DecimalField(max_digits=12, decimal_places=2, default=0)  # Credit payments received
+    discount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['user', 'date']
+        ordering = ['-date']
+        verbose_name = 'Daily Sales Rollup'
+        verbose_name_plural = 'Daily Sales Rollups'
+    
+    def __str__(self):
+        return f"{self.user.email} - {self.date}"
+
+
+class CatalogTombstone(models.Model):
+    """Records hard-deleted catalog rows so billing screens can drop them on delta sync"""
+    KIND_CHOICES = [
+        ('product', 'Product'),
+        ('customer', 'Customer'),
+    ]
+    
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='catalog_tombstones')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-deleted_at']
+        indexes = [models.Index(fields=['user', 'deleted_at'])]
+    
+    def __str__(self):
+        return f"{self.kind} #{self.object_id} ({self.deleted_at.date()})"
+
 
 class ShopPhoto(models.Model):
     """Gallery photos for the shop"""
+    IMAGE_FIELDS = ('image',)
+    
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='shop_photos')
     image = models.ImageField(upload_to='shop_photos/')
+    image_hash = models.CharField(max_length=64, blank=True, editable=False)
+    images_ready = models.BooleanField(default=False, editable=False)
     caption = models.CharField(max_length=200, blank=True)
     display_order = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -418,24 +518,6 @@ class ShopPhoto(models.Model):
     def __str__(self):
         return f"Photo for {self.user.email} - {self.caption or 'No caption'}"
 
-    def save(self, *args, **kwargs):
-        if self.image:
-            self.image = self.compress_image(self.image)
-        super().save(*args, **kwargs)
-
-    def compress_image(self, image):
-        try:
-            img = Image.open(image)
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            output = BytesIO()
-            img.save(output, format='JPEG', quality=75)
-            output.seek(0)
-            return ContentFile(output.read(), name=os.path.basename(image.name))
-        except Exception:
-            return image
-
 
 class UserActivity(models.Model):
     """Track daily user activity for admin monitoring"""
@@ -470,3 +552,57 @@ class UserActivity(models.Model):
             return f"{minutes}m {seconds}s"
         else:
             return f"{seconds}s"
+
+
+class ImportJob(models.Model):
+    """Uploaded import file, processed in chunks by the process_imports worker"""
+    KIND_CHOICES = [
+        ('products', 'Products'),
+        ('customers', 'Customers'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    # Row errors kept for the report; later ones are only counted
+    MAX_ERRORS = 200
+    
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='import_jobs')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    file = models.FileField(upload_to='imports/')
+    dry_run = models.BooleanField(default=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    total_rows = models.PositiveIntegerField(default=0)
+    processed_rows = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+    updated_count = models.PositiveIntegerField(default=0)
+    duplicate_count = models.PositiveIntegerField(default=0)  # rows already in the shop, left as they are
+    error_count = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)  # [{'row': n, 'message': ...}]
+    message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'created_at'])]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} import #{self.pk} ({self.status})"
+
+
+class PurgeCheckpoint(models.Model):
+    """Progress of an expired account's purge, so an interrupted run resumes where it stopped"""
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, related_name='purge_checkpoint')
+    step = models.CharField(max_length=100, blank=True)  # label of the table being emptied
+    rows_deleted = models.BigIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Purge of {self.user.email} ({self.step or 'starting'})"
@@ -22,6 +22,10 @@ class UserProfile(models.Model):
     shop_name: str
     shop_category: str
     profile_picture: Any
+    shop_logo: Any
+    profile_picture_hash: str
+    shop_logo_hash: str
+    images_ready: bool
     phone: str
     address: str
     city: str
@@ -37,9 +41,10 @@ class Customer(models.Model):
     phone: str
     address: str
     notes: str
-    udhar_amount: Any
+    credit_amount: Any
     total_purchased: Any
     total_visits: int
+    search_key: str
     created_at: Any
     updated_at: Any
 
@@ -51,7 +56,11 @@ class Product(models.Model):
     price: Any
     stock_quantity: int
     description: str
+    image: Any
+    image_hash: str
+    images_ready: bool
     is_active: bool
+    search_key: str
     created_at: Any
     updated_at: Any
     is_low_stock: bool
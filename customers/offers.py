@@ -0,0 +1,150 @@
+"""
+Offer engine
+A shop's live offers are compiled once per offers version into plain data: each offer's
+terms plus an index from product id to the offers that cover it. Evaluating a cart is
+then a single pass over its lines with no queries, so checkout computes the discount
+itself instead of trusting the client, and the billing screen previews the same numbers.
+
+Offer terms:
+- flat: discount_value off, up to the value of the lines it covers
+- percentage: discount_value percent of the lines it covers
+- bogo: on each covered line, every buy_quantity + get_quantity units get get_quantity free
+An offer with no applicable products covers every line (one-time custom items included);
+min_purchase_amount is checked against the whole bill.
+"""
+from django.utils import timezone
+from dataclasses import dataclass, field
+from decimal import Decimal, ROUND_HALF_UP
+import json
+
+from .models import Offer
+from . import caching
+
+CENTS = Decimal('0.01')
+ZERO = Decimal('0')
+
+
+@dataclass(frozen=True)
+class CompiledOffer:
+    id: int
+    name: str
+    type: str
+    value: Decimal
+    min_purchase: Decimal
+    buy: int
+    get: int
+    start: object
+    end: object
+    all_products: bool
+
+    def live(self, now):
+        return self.start <= now <= self.end
+
+    def label(self):
+        if self.type == 'percentage':
+            return f'{self.name} ({self.value.normalize():f}% off)'
+        if self.type == 'flat':
+            return f'{self.name} (₹{self.value.normalize():f} off)'
+        return f'{self.name} (Buy {self.buy} Get {self.get})'
+
+
+@dataclass(frozen=True)
+class Engine:
+    offers: dict                                    # offer id -> CompiledOffer
+    by_product: dict = field(default_factory=dict)  # product id -> ids of offers covering it
+    general: tuple = ()                             # ids of offers covering every line
+
+
+@dataclass
+class Evaluation:
+    subtotal: Decimal
+    discounts: dict  # offer id -> discount, for every offer the cart qualifies for
+
+    @property
+    def best(self):
+        """(offer id, discount) of the largest discount, or (None, 0)"""
+        if not self.discounts:
+            return None, ZERO
+        offer_id = max(self.discounts, key=lambda pk: (self.discounts[pk], -pk))
+        return offer_id, self.discounts[offer_id]
+
+
+def compile_offers(user):
+    """Engine over the user's active offers that have not ended yet (two queries)"""
+    rows = Offer.objects.filter(
+        user=user, is_active=True, end_date__gte=timezone.now()
+    ).prefetch_related('applicable_products')
+
+    offers, by_product, general = {}, {}, []
+    for row in rows:
+        product_ids = [product.pk for product in row.applicable_products.all()]
+        offers[row.pk] = CompiledOffer(
+            id=row.pk,
+            name=row.name,
+            type=row.offer_type,
+            value=row.discount_value,
+            min_purchase=row.min_purchase_amount,
+            buy=row.buy_quantity,
+            get=row.get_quantity,
+            start=row.start_date,
+            end=row.end_date,
+            all_products=not product_ids,
+        )
+        if not product_ids:
+            general.append(row.pk)
+        for product_id in product_ids:
+            by_product.setdefault(product_id, []).append(row.pk)
+
+    return Engine(offers, {pk: tuple(ids) for pk, ids in by_product.items()}, tuple(general))
+
+
+def engine_for(user):
+    """Compiled engine of the user, cached until an offer changes (or 10 minutes pass)"""
+    return caching.get_or_set('offers', user, ('offers',), lambda: compile_offers(user), 600, 'engine')
+
+
+def evaluate(engine, lines, now=None):
+    """
+    Discounts of every live offer the cart qualifies for. lines are
+    (product_id or None, quantity, price) tuples; None marks a one-time custom item.
+    """
+    now = now or timezone.now()
+    live = {pk: offer for pk, offer in engine.offers.items() if offer.live(now)}
+    covered = dict.fromkeys(live, ZERO)  # value of the lines each offer covers
+    free = dict.fromkeys(live, ZERO)     # BOGO value given away
+
+    subtotal = ZERO
+    for product_id, quantity, price in lines:
+        amount = quantity * price
+        subtotal += amount
+        for pk in engine.general + engine.by_product.get(product_id, ()):
+            offer = live.get(pk)
+            if offer is None:
+                continue
+            covered[pk] += amount
+            if offer.type == 'bogo' and offer.buy > 0 and offer.get > 0:
+                free[pk] += (quantity // (offer.buy + offer.get)) * offer.get * price
+
+    discounts = {}
+    for pk, offer in live.items():
+        if not covered[pk] or subtotal < offer.min_purchase:
+            continue
+        if offer.type == 'percentage':
+            discount = covered[pk] * offer.value / 100
+        elif offer.type == 'flat':
+            discount = min(offer.value, covered[pk])
+        else:
+            discount = free[pk]
+        discount = discount.quantize(CENTS, ROUND_HALF_UP)
+        if discount > 0:
+            discounts[pk] = discount
+    return Evaluation(subtotal.quantize(CENTS, ROUND_HALF_UP), discounts)
+
+
+def as_json(engine, now=None):
+    """Live offers for the billing screen's dropdown"""
+    now = now or timezone.now()
+    return json.dumps([
+        {'id': offer.id, 'name': offer.name, 'label': offer.label(), 'type': offer.type}
+        for offer in engine.offers.values() if offer.live(now)
+    ])
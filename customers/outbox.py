@@ -0,0 +1,127 @@
+"""
+Email outbox
+Requests only queue emails; the send_queued_emails worker sends them in batches over
+one SMTP connection, retries failures with exponential backoff and records the
+outcome on EmailLog with bulk updates. A body is cleared as soon as its email is sent
+or given up on (OTP codes must not sit in the table), and finished rows are deleted
+after RETENTION; the EmailLog entry stays as the record of what was sent.
+"""
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from datetime import timedelta
+
+from .models import EmailLog, QueuedEmail
+
+MAX_ATTEMPTS = 5
+
+# First retry after this delay, doubling with every failed attempt
+RETRY_BASE = timedelta(seconds=30)
+
+# A claimed batch is hidden from other workers for this long while it is being sent
+LEASE = timedelta(minutes=5)
+
+# Sent and failed outbox rows are deleted once they are this old
+RETENTION = timedelta(days=7)
+
+
+def enqueue(to, subject, html_body, purpose):
+    """Queue an HTML email and its EmailLog entry; returns the QueuedEmail"""
+    with transaction.atomic():
+        log = EmailLog.objects.create(email=to, subject=subject, purpose=purpose, is_sent=False)
+        return QueuedEmail.objects.create(log=log, to=to, subject=subject, html_body=html_body)
+
+
+def _claim(batch_size):
+    """Take up to batch_size due emails, leasing them so concurrent workers skip them"""
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            QueuedEmail.objects.select_for_update(skip_locked=True).filter(
+                status='pending', next_attempt_at__lte=now
+            ).order_by('next_attempt_at')[:batch_size]
+        )
+        QueuedEmail.objects.filter(pk__in=[email.pk for email in batch]).update(next_attempt_at=now + LEASE)
+    return batch
+
+
+def send_batch(batch_size=50):
+    """Send one batch of due emails over a single connection; returns (sent, failed)"""
+    batch = _claim(batch_size)
+    if not batch:
+        return 0, 0
+
+    sent = []
+    failed = []
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        failed = [(email, e) for email in batch]
+    else:
+        try:
+            for email in batch:
+                message = EmailMessage(
+                    subject=email.subject,
+                    body=email.html_body,
+                    from_email=settings.DEFAULT_FROM_EMAIL,
+                    to=[email.to],
+                    connection=connection,
+                )
+                message.content_subtype = 'html'
+                try:
+                    message.send(fail_silently=False)
+                    sent.append(email)
+                except Exception as e:
+                    failed.append((email, e))
+        finally:
+            connection.close()
+
+    _record(sent, failed)
+    return len(sent), len(failed)
+
+
+def _record(sent, failed):
+    now = timezone.now()
+    with transaction.atomic():
+        if sent:
+            QueuedEmail.objects.filter(pk__in=[email.pk for email in sent]).update(
+                status='sent', sent_at=now, attempts=F('attempts') + 1, last_error='', html_body=''
+            )
+            EmailLog.objects.filter(pk__in=[email.log_id for email in sent]).update(is_sent=True, error_message='')
+
+        if failed:
+            logs = []
+            for email, error in failed:
+                email.attempts += 1
+                email.last_error = str(error)
+                if email.attempts >= MAX_ATTEMPTS:
+                    email.status = 'failed'
+                    email.html_body = ''
+                else:
+                    email.next_attempt_at = now + RETRY_BASE * 2 ** (email.attempts - 1)
+                logs.append(EmailLog(pk=email.log_id, error_message=email.last_error))
+            QueuedEmail.objects.bulk_update(
+                [email for email, _ in failed], ['attempts', 'last_error', 'status', 'next_attempt_at', 'html_body']
+            )
+            EmailLog.objects.bulk_update(logs, ['error_message'])
+
+
+def drain(batch_size=50):
+    """Send batches until nothing is due; returns (sent, failed) totals"""
+    total_sent = total_failed = 0
+    while True:
+        sent, failed = send_batch(batch_size)
+        if not sent and not failed:
+            return total_sent, total_failed
+        total_sent += sent
+        total_failed += failed
+
+
+def prune(now=None):
+    """Delete sent and failed outbox rows older than RETENTION; returns how many"""
+    cutoff = (now or timezone.now()) - RETENTION
+    deleted, _ = QueuedEmail.objects.filter(status__in=['sent', 'failed'], created_at__lt=cutoff).delete()
+    return deleted
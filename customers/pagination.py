@@ -0,0 +1,94 @@
+"""
+Keyset pagination for sales and customer credit history
+Pages are addressed by an opaque, signed cursor holding the (sale_date, id) of the row
+they continue from, so every page is an index range scan instead of an OFFSET that
+reads and discards all earlier rows. Credit history merges sales and payments, whose
+ids overlap, so its cursor also holds the kind of the entry.
+"""
+from django.core import signing
+from django.db.models import Q
+from datetime import datetime
+
+from . import ledger
+
+CURSOR_SALT = 'customers.sales-cursor'
+TIMELINE_SALT = 'customers.timeline-cursor'
+TIMELINE_KINDS = ('credit', 'payment')
+
+
+def before(sale_date, pk):
+    """Sales older than (sale_date, pk) in newest-first order"""
+    return Q(sale_date__lt=sale_date) | Q(sale_date=sale_date, id__lt=pk)
+
+
+def after(sale_date, pk):
+    """Sales newer than (sale_date, pk) in newest-first order"""
+    return Q(sale_date__gt=sale_date) | Q(sale_date=sale_date, id__gt=pk)
+
+
+def encode_position(direction, sale_date, pk):
+    return signing.dumps([direction, sale_date.isoformat(), pk], salt=CURSOR_SALT)
+
+
+def encode_cursor(sale, direction):
+    return encode_position(direction, sale.sale_date, sale.pk)
+
+
+def decode_cursor(token):
+    """(direction, sale_date, pk), or None for a missing or tampered cursor"""
+    try:
+        direction, sale_date, pk = signing.loads(token, salt=CURSOR_SALT)
+        return direction, datetime.fromisoformat(sale_date), int(pk)
+    except (signing.BadSignature, ValueError, TypeError):
+        return None
+
+
+def paginate_sales(sales, cursor=None, per_page=20):
+    """
+    One page of sales, newest first.
+
+    Returns (sales, next_cursor, prev_cursor); a cursor is None when there is no
+    page in that direction. Invalid cursors start from the newest sale.
+    """
+    position = decode_cursor(cursor) if cursor else None
+
+    if position and position[0] == 'prev':
+        rows = list(sales.filter(after(*position[1:])).order_by('sale_date', 'id')[:per_page + 1])
+        has_prev = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        has_next = True
+    else:
+        if position:
+            sales = sales.filter(before(*position[1:]))
+        rows = list(sales.order_by('-sale_date', '-id')[:per_page + 1])
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_prev = position is not None
+
+    next_cursor = encode_cursor(rows[-1], 'next') if rows and has_next else None
+    prev_cursor = encode_cursor(rows[0], 'prev') if rows and has_prev else None
+    return rows, next_cursor, prev_cursor
+
+
+def encode_entry(entry):
+    return signing.dumps([entry['date'].isoformat(), entry['type'], entry['ref']], salt=TIMELINE_SALT)
+
+
+def decode_entry(token):
+    """(date, kind, ref) of a credit history entry, or None for a missing or tampered cursor"""
+    try:
+        date, kind, ref = signing.loads(token, salt=TIMELINE_SALT)
+        if kind not in TIMELINE_KINDS:
+            return None
+        return datetime.fromisoformat(date), kind, int(ref)
+    except (signing.BadSignature, ValueError, TypeError):
+        return None
+
+
+def paginate_timeline(customer, cursor=None, per_page=20):
+    """One page of a customer's credit history, newest first; returns (entries, next_cursor)"""
+    position = decode_entry(cursor) if cursor else None
+    entries = ledger.timeline(customer, per_page + 1, position)
+    if len(entries) <= per_page:
+        return entries, None
+    return entries[:per_page], encode_entry(entries[per_page - 1])
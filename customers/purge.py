@@ -0,0 +1,150 @@
+"""
+Account purge
+Expired accounts are emptied table by table instead of through user.delete(), whose
+cascade collector loads every row of the shop into memory to send signals (and refuses
+to delete products that sale items PROTECT). Tables are emptied children first, in
+batches of ids: each batch is one SELECT, one DELETE and a checkpoint update in its own
+short transaction, so the write lock is held briefly and memory stays flat however big
+the shop is. The table being emptied is recorded on a PurgeCheckpoint, so a run stopped
+by its time budget (or killed) carries on from there. Uploaded files of deleted rows are
+removed from storage once their batch has committed; image variants are shared by every
+file with the same content and are left in place.
+"""
+from django.db import connection, transaction
+from django.db.models import F, FileField
+from django.utils import timezone
+from dataclasses import dataclass, field
+from datetime import timedelta
+import time
+
+from .models import (
+    CustomUser, UserProfile, Customer, Product, Sale, SaleItem, Offer, SaleOffer,
+    CreditPayment, CreditPaymentAllocation, DailySalesRollup, CatalogTombstone,
+    ShopPhoto, UserActivity, ImportJob, PurgeCheckpoint,
+)
+
+BATCH_SIZE = 500
+
+# Days an account stays recoverable after the owner asks for deletion
+GRACE_DAYS = 30
+
+
+@dataclass(frozen=True)
+class Step:
+    model: object
+    owner: str  # lookup from the table to the account
+
+    @property
+    def label(self):
+        return self.model._meta.label_lower
+
+    def rows(self, user):
+        return self.model.objects.filter(**{self.owner: user})
+
+
+# Children before parents, so no DELETE cascades, sets null or trips PROTECT
+PLAN = (
+    Step(CreditPaymentAllocation, 'payment__user'),
+    Step(CreditPayment, 'user'),
+    Step(SaleOffer, 'sale__user'),
+    Step(SaleItem, 'sale__user'),
+    Step(Sale, 'user'),
+    Step(Offer.applicable_products.through, 'offer__user'),
+    Step(Offer, 'user'),
+    Step(Customer, 'user'),
+    Step(Product, 'user'),
+    Step(CatalogTombstone, 'user'),
+    Step(DailySalesRollup, 'user'),
+    Step(UserActivity, 'user'),
+    Step(ShopPhoto, 'user'),
+    Step(ImportJob, 'user'),
+    Step(UserProfile, 'user'),
+)
+
+
+@dataclass
+class Progress:
+    rows: int = 0
+    files: int = 0
+    seconds: float = 0
+    done: bool = False
+    step: str = ''                               # table the next run starts from, when not done
+    tables: dict = field(default_factory=dict)   # table label -> rows deleted
+
+    @property
+    def rate(self):
+        return self.rows / self.seconds if self.seconds else 0
+
+
+def expired_accounts(now=None):
+    """Accounts whose deletion request is older than the grace period"""
+    threshold = (now or timezone.now()) - timedelta(days=GRACE_DAYS)
+    return CustomUser.objects.filter(is_pending_deletion=True, deletion_requested_at__lte=threshold)
+
+
+def count(user):
+    """Rows a purge of user would delete, per table (what --dry-run reports)"""
+    return {step.label: step.rows(user).count() for step in PLAN}
+
+
+def _delete_batch(step, user, batch_size):
+    """Delete up to batch_size rows of one table; returns the stored files they referenced"""
+    fields = [f for f in step.model._meta.concrete_fields if isinstance(f, FileField)]
+    rows = list(
+        step.rows(user).order_by().values_list('pk', *[f.attname for f in fields])[:batch_size]
+    )
+    if rows:
+        sql = 'DELETE FROM {} WHERE {} IN ({})'.format(
+            connection.ops.quote_name(step.model._meta.db_table),
+            connection.ops.quote_name(step.model._meta.pk.column),
+            ', '.join(['%s'] * len(rows)),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [row[0] for row in rows])
+    return len(rows), [(f, name) for row in rows for f, name in zip(fields, row[1:]) if name]
+
+
+def purge(user, batch_size=BATCH_SIZE, deadline=None):
+    """
+    Delete an account and everything it owns, or as much as fits before deadline (a
+    time.monotonic() value). Returns a Progress; when the deadline stops it, done is
+    False and the next call resumes from the checkpoint.
+    """
+    started = time.monotonic()
+    progress = Progress()
+
+    checkpoint, created = PurgeCheckpoint.objects.get_or_create(user=user)
+    if created:
+        # Logging in cancels a deletion; once rows start disappearing that must not happen
+        CustomUser.objects.filter(pk=user.pk).update(is_active=False)
+    labels = [step.label for step in PLAN]
+    first = labels.index(checkpoint.step) if checkpoint.step in labels else 0
+
+    for step in PLAN[first:]:
+        while True:
+            if deadline is not None and time.monotonic() >= deadline:
+                progress.step = step.label
+                progress.seconds = time.monotonic() - started
+                return progress
+
+            with transaction.atomic():
+                deleted, files = _delete_batch(step, user, batch_size)
+                if deleted:
+                    PurgeCheckpoint.objects.filter(pk=checkpoint.pk).update(
+                        step=step.label, rows_deleted=F('rows_deleted') + deleted, updated_at=timezone.now()
+                    )
+            if not deleted:
+                break
+
+            for file_field, name in files:
+                file_field.storage.delete(name)
+            progress.rows += deleted
+            progress.files += len(files)
+            progress.tables[step.label] = progress.tables.get(step.label, 0) + deleted
+
+    # Only the account row, its checkpoint and auth links are left for the collector
+    user.delete()
+    progress.rows += 1
+    progress.done = True
+    progress.seconds = time.monotonic() - started
+    return progress
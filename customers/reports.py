@@ -0,0 +1,296 @@
+"""
+Sales report engine
+Builds every report table for a shop and filter set with one grouped query per
+dimension: all time buckets (months, years, today/yesterday/last 7 days) come from a
+single pass over the daily rollups, and products, categories, customers and offers are
+each one GROUP BY. The result is a SalesReport shared by the reports page and the
+CSV downloads.
+"""
+from django.db.models import Sum, Count, Q, F, Value, DecimalField
+from django.db.models.functions import Coalesce, TruncMonth, TruncYear
+from django.utils import timezone
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from .models import DailySalesRollup, Sale, SaleItem, SaleOffer
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+ZERO = Decimal('0')
+
+SECTIONS = ('periods', 'products', 'categories', 'customers', 'offers')
+
+
+@dataclass(frozen=True)
+class ReportFilters:
+    date_from: date | None = None
+    date_to: date | None = None
+    year: int | None = None
+
+    @classmethod
+    def from_query(cls, params):
+        """Parse date_from/date_to/year query parameters, ignoring malformed values"""
+        def parse_date(value):
+            try:
+                return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+            except ValueError:
+                return None
+
+        try:
+            year = int(params.get('year')) if params.get('year') else None
+        except ValueError:
+            year = None
+        return cls(parse_date(params.get('date_from')), parse_date(params.get('date_to')), year)
+
+    def cache_parts(self):
+        return (self.date_from, self.date_to, self.year)
+
+    def apply(self, queryset, sale_date):
+        """Filter a queryset whose sale timestamp is reached through sale_date"""
+        if self.date_from:
+            queryset = queryset.filter(**{f'{sale_date}__gte': timezone.make_aware(datetime.combine(self.date_from, time.min))})
+        if self.date_to:
+            queryset = queryset.filter(**{f'{sale_date}__lte': timezone.make_aware(datetime.combine(self.date_to, time.max))})
+        if self.year:
+            queryset = queryset.filter(**{f'{sale_date}__year': self.year})
+        return queryset
+
+    def apply_daily(self, rollups):
+        if self.date_from:
+            rollups = rollups.filter(date__gte=self.date_from)
+        if self.date_to:
+            rollups = rollups.filter(date__lte=self.date_to)
+        if self.year:
+            rollups = rollups.filter(date__year=self.year)
+        return rollups
+
+
+@dataclass
+class PeriodRow:
+    period: date
+    revenue: Decimal
+
+
+@dataclass
+class ProductRow:
+    name: str
+    category: str
+    quantity: Decimal
+    revenue: Decimal
+
+
+@dataclass
+class CategoryRow:
+    category: str
+    quantity: Decimal
+    revenue: Decimal
+
+
+@dataclass
+class CustomerRow:
+    name: str
+    visits: int
+    amount: Decimal
+
+
+@dataclass
+class OfferRow:
+    name: str
+    uses: int
+    discount: Decimal
+
+
+@dataclass
+class SalesReport:
+    filters: ReportFilters
+    years: list = field(default_factory=list)
+    monthly: list = field(default_factory=list)
+    yearly: list = field(default_factory=list)
+    products: list = field(default_factory=list)
+    categories: list = field(default_factory=list)
+    customers: list = field(default_factory=list)
+    offers: list = field(default_factory=list)
+    today: Decimal = ZERO
+    yesterday: Decimal = ZERO
+    last_7_days: Decimal = ZERO
+    previous_7_days: Decimal = ZERO
+
+    @staticmethod
+    def _change(current, previous):
+        if previous > 0:
+            change = (current - previous) / previous * 100
+            return f"{change:+.1f}%", 'positive' if change >= 0 else 'negative'
+        return "-", ""
+
+    def template_context(self, limit=10):
+        """Context for customers/reports.html"""
+        today_change, today_change_class = self._change(self.today, self.yesterday)
+        week_change, week_change_class = self._change(self.last_7_days, self.previous_7_days)
+        return {
+            'monthly_sales': [
+                {'month': row.period.strftime('%Y-%m'), 'month_display': row.period.strftime('%B %Y'), 'total_revenue': row.revenue}
+                for row in self.monthly
+            ],
+            'yearly_sales': [{'year': str(row.period.year), 'total_revenue': row.revenue} for row in self.yearly],
+            'product_sales': [
+                {'product__name': row.name, 'product__category': row.category,
+                 'total_quantity': row.quantity, 'total_revenue': row.revenue}
+                for row in self.products[:limit]
+            ],
+            'category_sales': [
+                {'product__category': row.category, 'total_sales': row.quantity, 'total_revenue': row.revenue}
+                for row in self.categories
+            ],
+            'customer_purchases': [
+                {'customer__name': row.name, 'total_visits': row.visits, 'purchase_count': row.visits, 'total_amount': row.amount}
+                for row in self.customers[:limit]
+            ],
+            'today_sales': self.today,
+            'yesterday_sales': self.yesterday,
+            'last_7_days_sales': self.last_7_days,
+            'today_change': today_change,
+            'today_change_class': today_change_class,
+            'last_7_days_change': week_change,
+            'last_7_days_change_class': week_change_class,
+            'years': self.years,
+        }
+
+
+def _money_sum(expression, **kwargs):
+    return Coalesce(Sum(expression, output_field=MONEY, **kwargs), Value(ZERO), output_field=MONEY)
+
+
+def _periods(report, user, filters):
+    """Months, years and the recent-day comparisons in one pass over the daily rollups"""
+    today = timezone.localdate()
+    last_7_start = today - timedelta(days=7)
+    previous_7 = (last_7_start - timedelta(days=8), last_7_start - timedelta(days=1))
+
+    months = filters.apply_daily(DailySalesRollup.objects.filter(user=user)).annotate(
+        month=TruncMonth('date')
+    ).values('month').annotate(
+        total_revenue=_money_sum('revenue'),
+        today=_money_sum('revenue', filter=Q(date=today)),
+        yesterday=_money_sum('revenue', filter=Q(date=today - timedelta(days=1))),
+        last_7_days=_money_sum('revenue', filter=Q(date__gte=last_7_start)),
+        previous_7_days=_money_sum('revenue', filter=Q(date__range=previous_7)),
+    ).order_by('month')
+
+    yearly = {}
+    for row in months:
+        report.monthly.append(PeriodRow(row['month'], row['total_revenue']))
+        year = row['month'].replace(month=1)
+        yearly[year] = yearly.get(year, ZERO) + row['total_revenue']
+        report.today += row['today']
+        report.yesterday += row['yesterday']
+        report.last_7_days += row['last_7_days']
+        report.previous_7_days += row['previous_7_days']
+    report.yearly = [PeriodRow(year, revenue) for year, revenue in sorted(yearly.items())]
+
+    # Year dropdown lists every year with sales, regardless of the filters
+    report.years = [
+        str(row['year'].year)
+        for row in DailySalesRollup.objects.filter(user=user).annotate(
+            year=TruncYear('date')
+        ).values('year').annotate(n=Count('id')).order_by('-year')
+    ]
+
+
+def build_report(user, filters, sections=SECTIONS, limit=None):
+    """
+    SalesReport for one shop.
+
+    sections limits which tables are computed (downloads only need one); limit caps
+    the product and customer tables at the top rows by revenue.
+    """
+    report = SalesReport(filters)
+    items = filters.apply(SaleItem.objects.filter(sale__user=user), 'sale__sale_date')
+    line_revenue = F('quantity') * F('price_at_sale')
+
+    if 'periods' in sections:
+        _periods(report, user, filters)
+
+    if 'products' in sections:
+        products = items.values('product__name', 'product__category').annotate(
+            total_quantity=Sum('quantity'), total_revenue=_money_sum(line_revenue),
+        ).order_by('-total_revenue')
+        if limit:
+            products = products[:limit]
+        report.products = [
+            ProductRow(row['product__name'], row['product__category'], row['total_quantity'], row['total_revenue'])
+            for row in products
+        ]
+
+    if 'categories' in sections:
+        report.categories = [
+            CategoryRow(row['product__category'], row['total_quantity'], row['total_revenue'])
+            for row in items.values('product__category').annotate(
+                total_quantity=Sum('quantity'), total_revenue=_money_sum(line_revenue),
+            ).order_by('-total_revenue')
+        ]
+
+    if 'customers' in sections:
+        customers = filters.apply(Sale.objects.filter(user=user, customer__isnull=False), 'sale_date').values(
+            'customer__name'
+        ).annotate(visits=Count('id'), amount=_money_sum('total_amount')).order_by('-amount')
+        if limit:
+            customers = customers[:limit]
+        report.customers = [CustomerRow(row['customer__name'], row['visits'], row['amount']) for row in customers]
+
+    if 'offers' in sections:
+        report.offers = [
+            OfferRow(row['offer__name'], row['uses'], row['discount'])
+            for row in filters.apply(SaleOffer.objects.filter(sale__user=user), 'sale__sale_date').values(
+                'offer__name'
+            ).annotate(uses=Count('id'), discount=_money_sum('discount_amount')).order_by('-uses')
+        ]
+
+    return report
+
+
+# Download report types and the section each one needs
+DOWNLOADS = {
+    'monthly': 'periods', 'monthly-sales': 'periods',
+    'yearly': 'periods', 'yearly-sales': 'periods',
+    'daily': 'periods', 'daily-comparison': 'periods',
+    'product': 'products', 'product-sales': 'products',
+    'category': 'categories', 'category-sales': 'categories',
+    'customer': 'customers', 'customer-purchases': 'customers',
+    'offers': 'offers',
+}
+
+
+def csv_rows(report, report_type):
+    """Header and data rows of one downloadable report"""
+    if report_type in ('monthly-sales', 'monthly'):
+        yield ['Month', 'Sales (₹)']
+        for row in report.monthly:
+            yield [row.period.strftime('%B %Y'), row.revenue]
+    elif report_type in ('yearly-sales', 'yearly'):
+        yield ['Year', 'Sales (₹)']
+        for row in report.yearly:
+            yield [row.period.year, row.revenue]
+    elif report_type in ('product-sales', 'product'):
+        yield ['Product', 'Quantity Sold', 'Revenue (₹)']
+        for row in report.products:
+            yield [row.name, row.quantity, row.revenue]
+    elif report_type in ('category-sales', 'category'):
+        yield ['Category', 'Sales (₹)']
+        for row in report.categories:
+            yield [row.category, row.revenue]
+    elif report_type in ('customer-purchases', 'customer'):
+        yield ['Customer', 'Total Purchases', 'Amount Spent (₹)']
+        for row in report.customers:
+            yield [row.name or "Walking Customer", row.visits, row.amount]
+    elif report_type == 'offers':
+        yield ['Offer', 'Times Used', 'Total Discount (₹)']
+        for row in report.offers:
+            yield [row.name, row.uses, row.discount]
+    elif report_type in ('daily', 'daily-comparison'):
+        yield ['Period', 'Sales (₹)']
+        yield ['Today', report.today]
+        yield ['Yesterday', report.yesterday]
+        yield ['Last 7 Days', report.last_7_days]
+    else:
+        yield ['Report Type', 'Value']
+        yield ['No data available for this report type', '']
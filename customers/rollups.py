@@ -0,0 +1,197 @@
+"""
+Daily sales rollups
+One DailySalesRollup row per shop per local day, updated incrementally when sales are
+recorded, paid or deleted, so dashboard cards and report tables read a few dozen rows
+instead of scanning every sale.
+"""
+from django.db import transaction, IntegrityError
+from django.db.models import Sum, Count, F, Q, Value, DecimalField
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth, TruncYear
+from django.utils import timezone
+from datetime import datetime, time
+from decimal import Decimal
+
+from .models import DailySalesRollup, Sale, CreditPayment
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+ZERO = Decimal('0')
+
+
+def local_date(value):
+    """Shop-local calendar date of a datetime (sales before midnight IST belong to that day)"""
+    return timezone.localtime(value).date()
+
+
+def _apply(user_id, day, create=True, **deltas):
+    """Add deltas to the rollup row for (user, day), creating it if needed"""
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    def increment():
+        return DailySalesRollup.objects.filter(user_id=user_id, date=day).update(
+            **{field: F(field) + delta for field, delta in deltas.items()},
+            updated_at=timezone.now(),
+        )
+
+    # Common case is a single UPDATE; only the first event of a day inserts the row
+    if increment() or not create:
+        return
+    try:
+        with transaction.atomic():
+            DailySalesRollup.objects.create(user_id=user_id, date=day, **deltas)
+    except IntegrityError:
+        # Another worker created the row first
+        increment()
+
+
+def record_sale(sale):
+    """Count a newly recorded sale"""
+    _apply(
+        sale.user_id,
+        local_date(sale.sale_date),
+        revenue=sale.total_amount,
+        bill_count=1,
+        credit_issued=sale.total_amount if sale.added_to_credit else ZERO,
+        discount=sale.discount_amount,
+    )
+
+
+def reverse_sale(sale):
+    """Remove a deleted sale from the day it was recorded on"""
+    # Never create rows here: when a whole account is deleted the rollups may already be gone
+    _apply(
+        sale.user_id,
+        local_date(sale.sale_date),
+        create=False,
+        revenue=-sale.total_amount,
+        bill_count=-1,
+        credit_issued=-sale.total_amount if sale.added_to_credit else ZERO,
+        discount=-sale.discount_amount,
+    )
+
+
+def _day_totals(rows, sign):
+    days = {}
+    for row in rows:
+        day = days.setdefault(local_date(row['sale_date']), {
+            'revenue': ZERO, 'bill_count': 0, 'credit_issued': ZERO, 'discount': ZERO,
+        })
+        day['revenue'] += sign * row['total_amount']
+        day['bill_count'] += sign
+        day['discount'] += sign * row['discount_amount']
+        if row['added_to_credit']:
+            day['credit_issued'] += sign * row['total_amount']
+    return days
+
+
+def record_sales(user_id, rows):
+    """Count many bulk-created sales (value dicts of Sale fields) with one update per day"""
+    for day, deltas in _day_totals(rows, 1).items():
+        _apply(user_id, day, **deltas)
+
+
+def reverse_sales(user_id, rows):
+    """Remove many deleted sales (value dicts of Sale fields) with one update per day"""
+    for day, deltas in _day_totals(rows, -1).items():
+        _apply(user_id, day, create=False, **deltas)
+
+
+def record_payment(user, amount, when=None):
+    """Count a credit payment on the day it was received"""
+    _apply(user.pk, local_date(when or timezone.now()), credit_collected=amount)
+
+
+def reverse_payments(user_id, payments):
+    """Take (received_at, amount) pairs of refunded payments off the days they were received"""
+    days = {}
+    for received_at, amount in payments:
+        day = local_date(received_at)
+        days[day] = days.get(day, ZERO) + amount
+    for day, amount in days.items():
+        _apply(user_id, day, create=False, credit_collected=-amount)
+
+
+def rebuild(users=None, date_from=None, date_to=None):
+    """
+    Recompute rollups from the Sale and CreditPayment tables.
+
+    Revenue, bill count, credit issued and discount are derived from sales, credit
+    collected from the payments received that day. Returns the number of rollup rows written.
+    """
+    sales = Sale.objects.all()
+    payments = CreditPayment.objects.all()
+    rollups = DailySalesRollup.objects.all()
+    if users is not None:
+        sales = sales.filter(user__in=users)
+        payments = payments.filter(user__in=users)
+        rollups = rollups.filter(user__in=users)
+
+    if date_from:
+        start = timezone.make_aware(datetime.combine(date_from, time.min))
+        sales = sales.filter(sale_date__gte=start)
+        payments = payments.filter(received_at__gte=start)
+        rollups = rollups.filter(date__gte=date_from)
+    if date_to:
+        end = timezone.make_aware(datetime.combine(date_to, time.max))
+        sales = sales.filter(sale_date__lte=end)
+        payments = payments.filter(received_at__lte=end)
+        rollups = rollups.filter(date__lte=date_to)
+
+    day = TruncDate('sale_date', tzinfo=timezone.get_current_timezone())
+    totals = sales.annotate(day=day).order_by().values('user_id', 'day').annotate(
+        revenue=Coalesce(Sum('total_amount'), Value(ZERO), output_field=MONEY),
+        bill_count=Count('id'),
+        credit_issued=Coalesce(Sum('total_amount', filter=Q(added_to_credit=True)), Value(ZERO), output_field=MONEY),
+        discount=Coalesce(Sum('discount_amount'), Value(ZERO), output_field=MONEY),
+    )
+
+    collected = payments.annotate(
+        day=TruncDate('received_at', tzinfo=timezone.get_current_timezone())
+    ).order_by().values('user_id', 'day').annotate(amount=Sum('amount'))
+
+    with transaction.atomic():
+        collected = {(row['user_id'], row['day']): row['amount'] for row in collected}
+        rollups.delete()
+
+        rows = [
+            DailySalesRollup(
+                user_id=row['user_id'],
+                date=row['day'],
+                revenue=row['revenue'],
+                bill_count=row['bill_count'],
+                credit_issued=row['credit_issued'],
+                discount=row['discount'],
+                credit_collected=collected.pop((row['user_id'], row['day']), ZERO),
+            )
+            for row in totals
+        ]
+        # Days with payments but no sales
+        rows += [
+            DailySalesRollup(user_id=user_id, date=date, credit_collected=amount)
+            for (user_id, date), amount in collected.items()
+        ]
+        DailySalesRollup.objects.bulk_create(rows, batch_size=1000)
+
+    return len(rows)
+
+
+def revenue_between(user, date_from, date_to):
+    """Revenue for an inclusive range of local dates"""
+    return DailySalesRollup.objects.filter(
+        user=user, date__range=(date_from, date_to)
+    ).aggregate(total=Coalesce(Sum('revenue'), Value(ZERO), output_field=MONEY))['total']
+
+
+def monthly_revenue(rollups):
+    """[{'month': date, 'total_revenue': Decimal}] in month order"""
+    return rollups.annotate(month=TruncMonth('date')).values('month').annotate(
+        total_revenue=Sum('revenue')
+    ).order_by('month')
+
+
+def yearly_revenue(rollups):
+    """[{'year': date, 'total_revenue': Decimal}] in year order"""
+    return rollups.annotate(year=TruncYear('date')).values('year').annotate(
+        total_revenue=Sum('revenue')
+    ).order_by('year')
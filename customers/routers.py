@@ -0,0 +1,63 @@
+"""
+Read replica routing
+Code running inside read_replica() reads through the 'replica' database alias; every
+write, and every read outside it, uses 'default'. ReadReplicaMiddleware enables it for
+the views listed in settings.READ_REPLICA_VIEWS, so views need no `using()` calls and
+the same code runs on SQLite (a read-only connection to the WAL database) and on
+Postgres (a streaming replica).
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.db import connections
+
+REPLICA = 'replica'
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def replica_available():
+    """
+    True when 'replica' is configured as a separate database. Test mirrors are given
+    the primary's NAME, so tests (and setups without a replica) read from 'default'.
+    """
+    if REPLICA not in connections.settings:
+        return False
+    replica = connections[REPLICA].settings_dict
+    primary = connections['default'].settings_dict
+    return (replica['NAME'], replica['HOST'], replica['PORT']) != (primary['NAME'], primary['HOST'], primary['PORT'])
+
+
+@contextmanager
+def read_replica():
+    token = _use_replica.set(replica_available())
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def using_replica(iterator):
+    """Wrap a lazy iterator (streamed response content) so each step reads from the replica"""
+    iterator = iter(iterator)
+    while True:
+        with read_replica():
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return REPLICA if _use_replica.get() else 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
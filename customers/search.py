@@ -0,0 +1,288 @@
+"""
+Product and customer search for the billing screen
+Names are folded into a normalized search key (lowercase, accents stripped, Devanagari
+transliterated to Latin, common spelling variants collapsed) stored on the row. Short
+queries use the (user, search_key) prefix index; longer ones go through an in-process
+trigram index per shop that is updated on save and refreshed from updated_at when
+another worker changes the shop's catalog.
+"""
+from django.utils import timezone
+from collections import OrderedDict, defaultdict
+from datetime import timedelta
+import re
+import threading
+import unicodedata
+
+from .models import Customer, Product
+from . import caching
+
+# Queries shorter than this are answered from the database prefix index
+MIN_TRIGRAM_QUERY = 3
+
+# Shops whose trigram index is kept in memory per process
+MAX_INDEXES = 64
+
+# Re-read rows changed slightly before the last sync so late commits are not missed
+OVERLAP = timedelta(minutes=1)
+
+_CONSONANTS = {
+    'क': 'k', 'ख': 'kh', 'ग': 'g', 'घ': 'gh', 'ङ': 'n',
+    'च': 'ch', 'छ': 'chh', 'ज': 'j', 'झ': 'jh', 'ञ': 'n',
+    'ट': 't', 'ठ': 'th', 'ड': 'd', 'ढ': 'dh', 'ण': 'n',
+    'त': 't', 'थ': 'th', 'द': 'd', 'ध': 'dh', 'न': 'n',
+    'प': 'p', 'फ': 'ph', 'ब': 'b', 'भ': 'bh', 'म': 'm',
+    'य': 'y', 'र': 'r', 'ल': 'l', 'ळ': 'l', 'व': 'v',
+    'श': 'sh', 'ष': 'sh', 'स': 's', 'ह': 'h',
+}
+_VOWELS = {
+    'अ': 'a', 'आ': 'a', 'इ': 'i', 'ई': 'i', 'उ': 'u', 'ऊ': 'u', 'ऋ': 'ri',
+    'ए': 'e', 'ऐ': 'ai', 'ओ': 'o', 'औ': 'au', 'ऍ': 'e', 'ऑ': 'o',
+}
+_MATRAS = {
+    'ा': 'a', 'ि': 'i', 'ी': 'i', 'ु': 'u', 'ू': 'u', 'ृ': 'ri',
+    'े': 'e', 'ै': 'ai', 'ो': 'o', 'ौ': 'au', 'ॅ': 'e', 'ॉ': 'o',
+}
+_NASALS = {'ं': 'n', 'ँ': 'n', 'ः': 'h'}
+_VIRAMA = '्'
+_NUKTA = '़'
+
+# Applied after transliteration so "Raam", "Ram" and "राम" share a key
+_LATIN_FOLDS = (('ee', 'i'), ('oo', 'u'), ('w', 'v'))
+
+
+def _transliterate(text):
+    out = []
+    chars = [ch for ch in text if ch != _NUKTA]
+    for i, ch in enumerate(chars):
+        if ch in _CONSONANTS:
+            out.append(_CONSONANTS[ch])
+            following = chars[i + 1] if i + 1 < len(chars) else ''
+            # Inherent vowel, dropped before a vowel sign or virama and at the end of a word
+            if following and following not in _MATRAS and following != _VIRAMA and (
+                following in _CONSONANTS or following in _NASALS
+            ):
+                out.append('a')
+        elif ch in _MATRAS:
+            out.append(_MATRAS[ch])
+        elif ch in _VOWELS:
+            out.append(_VOWELS[ch])
+        elif ch in _NASALS:
+            out.append(_NASALS[ch])
+        elif ch == _VIRAMA:
+            continue
+        elif unicodedata.category(ch) == 'Nd':
+            out.append(str(unicodedata.digit(ch)))
+        else:
+            out.append(ch)
+    return ''.join(out)
+
+
+def normalize(text):
+    """Search key for a name or a query: folded Latin words separated by single spaces"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch) or ch in _MATRAS or ch in _NASALS or ch == _VIRAMA)
+    text = _transliterate(text).lower()
+    for source, target in _LATIN_FOLDS:
+        text = text.replace(source, target)
+    # Doubled letters are spelled inconsistently (Pappu/Papu, Sharmaa/Sharma)
+    text = re.sub(r'([a-z])\1+', r'\1', text)
+    return ' '.join(re.findall(r'[a-z0-9]+', text))
+
+
+def phone_digits(phone):
+    return re.sub(r'\D', '', phone or '')
+
+
+def _trigrams(text, pad=True):
+    if pad:
+        text = f' {text} '
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class _ShopIndex:
+    """Trigram postings for one shop's products or customers"""
+
+    def __init__(self):
+        self.entries = {}
+        self.grams = defaultdict(set)
+        self.version = None
+        self.synced_at = None
+
+    def add(self, object_id, name_key, extra):
+        self.remove(object_id)
+        self.entries[object_id] = (name_key, extra)
+        for gram in _trigrams(f'{name_key} {extra}'.strip()):
+            self.grams[gram].add(object_id)
+
+    def remove(self, object_id):
+        entry = self.entries.pop(object_id, None)
+        if entry is None:
+            return
+        for gram in _trigrams(f'{entry[0]} {entry[1]}'.strip()):
+            postings = self.grams.get(gram)
+            if postings is not None:
+                postings.discard(object_id)
+                if not postings:
+                    del self.grams[gram]
+
+    def candidates(self, query):
+        # Queries match anywhere in a word, so they are not padded like indexed text
+        postings = sorted((self.grams.get(gram, ()) for gram in _trigrams(query, pad=False)), key=len)
+        if not postings or not postings[0]:
+            return set()
+        found = set(postings[0])
+        for ids in postings[1:]:
+            found &= ids
+            if not found:
+                break
+        return found
+
+
+class _Kind:
+    def __init__(self, model, domain, extra_field, active_only):
+        self.model = model
+        self.domain = domain
+        self.extra_field = extra_field
+        self.active_only = active_only
+
+    def rows(self, user_id):
+        rows = self.model.objects.filter(user_id=user_id)
+        if self.active_only:
+            rows = rows.filter(is_active=True)
+        return rows
+
+    def extra(self, value):
+        return phone_digits(value) if self.extra_field == 'phone' else value
+
+
+PRODUCTS = _Kind(Product, 'products', 'category', active_only=True)
+CUSTOMERS = _Kind(Customer, 'customers', 'phone', active_only=False)
+
+_indexes = OrderedDict()
+_lock = threading.Lock()
+
+
+def _build(kind, user_id, version):
+    index = _ShopIndex()
+    index.version = version
+    index.synced_at = timezone.now()
+    for object_id, key, name, extra in kind.rows(user_id).values_list('id', 'search_key', 'name', kind.extra_field):
+        index.add(object_id, key or normalize(name), kind.extra(extra))
+    return index
+
+
+def _refresh(kind, user_id, index, version):
+    """Apply rows changed by other workers since the last sync"""
+    synced_at = timezone.now()
+    changed = kind.model.objects.filter(user_id=user_id, updated_at__gt=index.synced_at - OVERLAP)
+    fields = ['id', 'search_key', 'name', kind.extra_field] + (['is_active'] if kind.active_only else [])
+    for row in changed.values_list(*fields):
+        object_id, key, name, extra = row[:4]
+        if kind.active_only and not row[4]:
+            index.remove(object_id)
+        else:
+            index.add(object_id, key or normalize(name), kind.extra(extra))
+    index.version = version
+    index.synced_at = synced_at
+
+
+def _get_index(kind, user_id):
+    version = caching.get_versions(user_id, (kind.domain,))[kind.domain]
+    with _lock:
+        index = _indexes.get((kind.domain, user_id))
+        if index is None:
+            index = _build(kind, user_id, version)
+            _indexes[(kind.domain, user_id)] = index
+            while len(_indexes) > MAX_INDEXES:
+                _indexes.popitem(last=False)
+        else:
+            _indexes.move_to_end((kind.domain, user_id))
+            if index.version != version:
+                _refresh(kind, user_id, index, version)
+    return index
+
+
+def _rank(query, digits, name_key, extra, phone_kind):
+    if phone_kind and digits and (extra == digits or (len(digits) >= 10 and extra.endswith(digits))):
+        return 0
+    if name_key.startswith(query):
+        return 1
+    if any(word.startswith(query) for word in name_key.split()) or (phone_kind and digits and extra.startswith(digits)):
+        return 2
+    return 3
+
+
+def _search(kind, user, query, limit):
+    key = normalize(query)
+    if not key:
+        return list(kind.rows(user.pk)[:limit])
+
+    phone_kind = kind.extra_field == 'phone'
+    digits = phone_digits(query) if phone_kind else ''
+    phone_query = bool(digits) and not re.search(r'[^\d\s+()-]', query)
+
+    if phone_query and len(digits) < MIN_TRIGRAM_QUERY:
+        # The first digits of a number; names never start with them
+        return list(kind.rows(user.pk).filter(phone__startswith=digits).order_by('phone')[:limit])
+
+    if len(key) < MIN_TRIGRAM_QUERY:
+        # Range scan instead of LIKE so the (user, search_key) index serves it on every backend
+        return list(kind.rows(user.pk).filter(
+            search_key__gte=key, search_key__lt=key + '\uffff'
+        ).order_by('search_key')[:limit])
+
+    if phone_query:
+        # Phone numbers are typed with or without spaces and country code
+        key = digits
+    index = _get_index(kind, user.pk)
+    with _lock:
+        entries = index.entries
+        ranked = []
+        for object_id in index.candidates(key):
+            name_key, extra = entries[object_id]
+            if key not in f'{name_key} {extra}':
+                continue
+            ranked.append((_rank(key, digits, name_key, extra, phone_kind), name_key, object_id))
+    ranked.sort()
+
+    ids = [object_id for _, _, object_id in ranked[:limit]]
+    found = kind.rows(user.pk).in_bulk(ids)
+    # Rows deleted by another worker drop out here
+    return [found[object_id] for object_id in ids if object_id in found]
+
+
+def search_products(user, query, limit=20):
+    """Active products of this shop matching query, best matches first"""
+    return _search(PRODUCTS, user, query, limit)
+
+
+def search_customers(user, query, limit=20):
+    """Customers of this shop matching query: exact phone, then name prefix, then substring"""
+    return _search(CUSTOMERS, user, query, limit)
+
+
+def index_saved(instance):
+    """Update this process's index after a save (other workers catch up via updated_at)"""
+    kind = PRODUCTS if isinstance(instance, Product) else CUSTOMERS
+    with _lock:
+        index = _indexes.get((kind.domain, instance.user_id))
+        if index is None:
+            return
+        if kind.active_only and not instance.is_active:
+            index.remove(instance.pk)
+        else:
+            index.add(instance.pk, instance.search_key, kind.extra(getattr(instance, kind.extra_field)))
+
+
+def index_deleted(instance):
+    kind = PRODUCTS if isinstance(instance, Product) else CUSTOMERS
+    with _lock:
+        index = _indexes.get((kind.domain, instance.user_id))
+        if index is not None:
+            index.remove(instance.pk)
+
+
+def clear():
+    """Drop all in-memory indexes (tests, and after bulk imports)"""
+    with _lock:
+        _indexes.clear()
@@ -0,0 +1,384 @@
+"""
+Synthetic shop data
+Generates realistic catalogs, customers, offers and sales history for load and
+benchmark testing. Sales are written in chronological chunks, one multi-row insert
+per table per chunk, and derived totals (customer counters, credit, daily rollups) are
+filled in afterwards with set-based writes. The same seed and end date always produce the same data.
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from itertools import accumulate, islice
+import random
+
+from .models import Customer, Product, Sale, SaleItem, Offer, SaleOffer, UserProfile
+from . import caching, ledger, rollups, search
+
+User = get_user_model()
+
+CHUNK_SIZE = 5000
+
+# Catalog vocabulary per category: (items, brands or styles, sizes, unit, price range in rupees)
+CATALOG = {
+    'grocery': (
+        ['Atta', 'Basmati Rice', 'Sona Masoori Rice', 'Toor Dal', 'Moong Dal', 'Chana Dal', 'Sugar', 'Salt',
+         'Mustard Oil', 'Sunflower Oil', 'Ghee', 'Tea', 'Coffee', 'Poha', 'Besan', 'Jaggery', 'Turmeric',
+         'Red Chilli Powder', 'Biscuits', 'Namkeen', 'Maggi', 'Soap', 'Detergent', 'Toothpaste'],
+        ['Aashirvaad', 'Tata', 'Fortune', 'Patanjali', 'Amul', 'Everest', 'MDH', 'Britannia', 'Haldiram', 'Local'],
+        ['250g', '500g', '1kg', '5kg'], 'kg', (10, 900),
+    ),
+    'pizza': (
+        ['Margherita', 'Farmhouse', 'Paneer Tikka', 'Veg Burger', 'Aloo Tikki Burger', 'French Fries',
+         'Garlic Bread', 'Cold Coffee', 'Pasta', 'Sandwich', 'Momos', 'Cold Drink'],
+        ['Regular', 'Cheese Burst', 'Spicy', 'Classic'],
+        ['Small', 'Medium', 'Large'], 'piece', (40, 600),
+    ),
+    'clothes': (
+        ['Kurta', 'Saree', 'Shirt', 'T-Shirt', 'Jeans', 'Leggings', 'Dupatta', 'Lehenga', 'Kids Frock', 'Pyjama'],
+        ['Cotton', 'Silk', 'Rayon', 'Denim', 'Linen', 'Printed'],
+        ['S', 'M', 'L', 'XL'], 'piece', (150, 4000),
+    ),
+    'bartan': (
+        ['Kadhai', 'Tawa', 'Pressure Cooker', 'Steel Glass', 'Thali', 'Katori', 'Patila', 'Spoon Set', 'Lunch Box'],
+        ['Prestige', 'Hawkins', 'Pigeon', 'Steel', 'Aluminium'],
+        ['Small', 'Medium', 'Large', 'Set of 6'], 'piece', (40, 3500),
+    ),
+    'medical': (
+        ['Paracetamol', 'Cough Syrup', 'Antacid', 'Bandage', 'ORS', 'Vitamin C', 'Balm', 'Antiseptic Liquid', 'Thermometer'],
+        ['Cipla', 'Sun Pharma', 'Dabur', 'Himalaya', 'Generic'],
+        ['Strip of 10', '100ml', '200ml', 'Pack'], 'packet', (15, 450),
+    ),
+    'electronics': (
+        ['LED Bulb', 'Extension Board', 'Phone Charger', 'Earphones', 'USB Cable', 'Battery', 'Torch', 'Ceiling Fan'],
+        ['Philips', 'Syska', 'Havells', 'boAt', 'Eveready', 'Bajaj'],
+        ['Basic', 'Pro', 'Pack of 2'], 'piece', (30, 3000),
+    ),
+}
+
+FIRST_NAMES = [
+    'Aarav', 'Vivaan', 'Aditya', 'Arjun', 'Rohan', 'Rahul', 'Amit', 'Suresh', 'Ramesh', 'Mahesh', 'Vikas', 'Deepak',
+    'Sanjay', 'Manoj', 'Anil', 'Sunil', 'Ravi', 'Karan', 'Priya', 'Pooja', 'Neha', 'Anjali', 'Sunita', 'Kavita',
+    'Geeta', 'Seema', 'Rekha', 'Meena', 'Asha', 'Lakshmi', 'Divya', 'Sneha', 'Farhan', 'Imran', 'Ayesha', 'Gurpreet',
+]
+LAST_NAMES = [
+    'Sharma', 'Verma', 'Gupta', 'Agarwal', 'Singh', 'Kumar', 'Yadav', 'Patel', 'Shah', 'Mehta', 'Jain', 'Reddy',
+    'Nair', 'Iyer', 'Das', 'Bose', 'Mishra', 'Tiwari', 'Pandey', 'Chauhan', 'Khan', 'Sheikh', 'Joshi', 'Kulkarni',
+]
+CUSTOM_ITEMS = ['Delivery Charge', 'Packing', 'Alteration', 'Repair Service', 'Gift Wrap', 'Loose Item', 'Home Delivery']
+
+# Busier evenings and weekends; a festival season in October-November
+HOUR_WEIGHTS = [0] * 8 + [2, 4, 6, 8, 8, 6, 4, 4, 5, 7, 9, 10, 9, 5, 2, 0]
+WEEKDAY_WEIGHTS = [1.0, 0.95, 0.95, 1.0, 1.1, 1.3, 1.4]
+MONTH_WEIGHTS = {3: 1.1, 10: 1.5, 11: 1.4, 12: 1.1}
+
+PAYMENT_METHODS = ['cash', 'upi', 'card']
+PAYMENT_WEIGHTS = [55, 35, 10]
+
+WALK_IN_SHARE = 0.4
+CREDIT_SHARE = 0.12       # of sales to known customers
+PARTIAL_SHARE = 0.5       # of credit sales, some amount paid up front
+OFFER_SHARE = 0.08
+CUSTOM_ITEM_SHARE = 0.03
+
+
+@dataclass
+class SeedResult:
+    user: object
+    products: int = 0
+    customers: int = 0
+    offers: int = 0
+    sales: int = 0
+    items: int = 0
+
+
+@contextmanager
+def _historical_timestamps(*models):
+    """Let bulk_create write given created/sale dates instead of auto_now(_add) values"""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _zipf_weights(count, skew=1.1):
+    """Cumulative popularity weights: a few products and regulars account for most sales"""
+    return list(accumulate(1 / (rank + 1) ** skew for rank in range(count)))
+
+
+def shop_user(index, email=None):
+    """Seed account for tenant index, created (verified, with a profile) if missing"""
+    email = email or f'seed-shop-{index}@example.com'
+    user = User.objects.filter(email=email).first()
+    if user is None:
+        user = User.objects.create_user(
+            username=email.split('@')[0], email=email, password='seed-password', is_verified=True,
+        )
+    UserProfile.objects.get_or_create(user=user, defaults={'shop_name': f'Seed Shop {index}', 'shop_category': 'grocery'})
+    return user
+
+
+def _products(rng, user, count, created_at):
+    categories = list(CATALOG)
+    products = []
+    names = set()
+    for n in range(count):
+        category = categories[n % len(categories)]
+        items, brands, sizes, unit, (low, high) = CATALOG[category]
+        name = f'{rng.choice(brands)} {rng.choice(items)} {rng.choice(sizes)}'
+        if name in names:
+            name = f'{name} ({n})'
+        names.add(name)
+        product_type = 'service' if category == 'pizza' and rng.random() < 0.1 else 'product'
+        products.append(Product(
+            user=user,
+            name=name,
+            product_type=product_type,
+            category=category,
+            # Most items are cheap, a few sit near the top of the range
+            price=Decimal(round(low + (high - low) * rng.betavariate(1.2, 4))),
+            unit=unit if product_type == 'product' else '',
+            stock_quantity=Decimal(rng.randint(0, 500)) if product_type == 'product' else Decimal('0'),
+            search_key=search.normalize(name),
+            created_at=created_at,
+            updated_at=created_at,
+        ))
+    return products
+
+
+def _customers(rng, user, count, created_at):
+    customers = []
+    phones = rng.sample(range(6_000_000_000, 9_999_999_999), count)
+    for phone in phones:
+        name = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+        customers.append(Customer(
+            user=user,
+            name=name,
+            phone=str(phone),
+            search_key=search.normalize(name),
+            created_at=created_at,
+            updated_at=created_at,
+        ))
+    return customers
+
+
+def _offers(rng, user, count, start, end):
+    """Consecutive offer windows covering the whole period, so each sale date has one offer"""
+    if not count:
+        return [], None
+    span = (end - start) / count
+    offers = []
+    for n in range(count):
+        offer_type = rng.choice(['flat', 'percentage', 'percentage', 'bogo'])
+        offers.append(Offer(
+            user=user,
+            name=f'{rng.choice(["Diwali", "Weekend", "Monsoon", "Festive", "Clearance", "Loyalty"])} Offer {n + 1}',
+            offer_type=offer_type,
+            discount_value=Decimal(rng.choice([5, 10, 15, 20])) if offer_type == 'percentage' else Decimal(rng.choice([20, 50, 100])),
+            min_purchase_amount=Decimal(rng.choice([0, 200, 500])),
+            buy_quantity=2 if offer_type == 'bogo' else 0,
+            get_quantity=1 if offer_type == 'bogo' else 0,
+            start_date=start + span * n,
+            end_date=start + span * (n + 1),
+            is_active=n == count - 1,
+            created_at=start + span * n,
+            updated_at=start + span * n,
+        ))
+    return offers, span
+
+
+def _sale_times(rng, count, first_day, days):
+    """Yield count sale timestamps spread over the period, in chronological order"""
+    tz = timezone.get_current_timezone()
+    day_weights = list(accumulate(
+        (0.6 + 0.4 * n / max(days - 1, 1)) * WEEKDAY_WEIGHTS[day.weekday()] * MONTH_WEIGHTS.get(day.month, 1.0)
+        for n, day in enumerate(first_day + timedelta(days=n) for n in range(days))
+    ))
+    hour_weights = list(accumulate(HOUR_WEIGHTS))
+
+    # Sales per day first, drawn in blocks so millions of sales never sit in one list
+    per_day = [0] * days
+    for start in range(0, count, 100_000):
+        for day in rng.choices(range(days), cum_weights=day_weights, k=min(100_000, count - start)):
+            per_day[day] += 1
+
+    for n, sales in enumerate(per_day):
+        day_start = timezone.make_aware(datetime.combine(first_day + timedelta(days=n), time.min), tz)
+        yield from sorted(
+            day_start + timedelta(hours=hour, seconds=rng.randrange(3600))
+            for hour in rng.choices(range(24), cum_weights=hour_weights, k=sales)
+        )
+
+
+def _quantity(rng, unit):
+    if unit in ('kg', 'lt'):
+        return rng.choice((Decimal('0.50'), Decimal('1'), Decimal('1'), Decimal('2'), Decimal('5')))
+    return Decimal(rng.choice((1, 1, 1, 2, 2, 3, 4)))
+
+
+def _insert(model, columns, rows):
+    """
+    Insert prepared value tuples with executemany. Sales and items are the bulk of a
+    seed, and building model instances for bulk_create costs more than the insert itself.
+    """
+    if not rows:
+        return
+    fields = [model._meta.get_field(name) for name in columns]
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        connection.ops.quote_name(model._meta.db_table),
+        ', '.join(connection.ops.quote_name(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def seed_shop(user, products=2000, customers=5000, sales=20000, offers=10, days=365,
+              seed=0, end_date=None, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Load a synthetic history into one shop and return a SeedResult.
+
+    Sales are spread over the `days` days ending at end_date (default today) with
+    weekly and seasonal peaks; a share are on credit (some partly paid), use an offer or
+    contain a one-time custom item. progress, if given, is called with the sales written so far.
+    Sale ids are assigned here, so nothing else should write sales while seeding.
+    """
+    rng = random.Random(f'{seed}:{user.email}')
+    end_date = end_date or timezone.localdate()
+    first_day = end_date - timedelta(days=days - 1)
+    opened = timezone.make_aware(datetime.combine(first_day, time(9)))
+    result = SeedResult(user)
+
+    with _historical_timestamps(Product, Customer, Offer):
+        with transaction.atomic():
+            catalog = Product.objects.bulk_create(_products(rng, user, products, opened), batch_size=chunk_size)
+            regulars = Customer.objects.bulk_create(_customers(rng, user, customers, opened), batch_size=chunk_size)
+            offer_rows, offer_span = _offers(rng, user, offers, opened, timezone.make_aware(datetime.combine(end_date, time.max)))
+            offer_rows = Offer.objects.bulk_create(offer_rows)
+            for offer in offer_rows:
+                offer.applicable_products.set(rng.sample(catalog, min(len(catalog), 5)))
+    result.products, result.customers, result.offers = len(catalog), len(regulars), len(offer_rows)
+
+    catalog = [(product.pk, product.unit, product.price) for product in catalog]
+    regulars = [customer.pk for customer in regulars]
+    product_weights = _zipf_weights(len(catalog))
+    customer_weights = _zipf_weights(len(regulars), skew=0.8)
+    next_id = (Sale.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+    times = _sale_times(rng, sales, first_day, days)
+    adapt_datetime = connection.ops.adapt_datetimefield_value
+    zero = Decimal('0')
+
+    while chunk_times := list(islice(times, chunk_size)):
+        bills = []
+        for sold_at in chunk_times:
+            lines = [
+                (product_id, _quantity(rng, unit), price)
+                for product_id, unit, price in rng.choices(
+                    catalog, cum_weights=product_weights, k=min(1 + int(rng.expovariate(0.6)), 12)
+                )
+            ] if catalog else []
+            custom = None
+            if not lines or rng.random() < CUSTOM_ITEM_SHARE:
+                custom = (rng.choice(CUSTOM_ITEMS), Decimal(1), Decimal(rng.choice((10, 20, 30, 50, 100, 150))))
+            customer = None
+            if regulars and rng.random() >= WALK_IN_SHARE:
+                customer = rng.choices(regulars, cum_weights=customer_weights)[0]
+            bills.append((sold_at, lines, custom, customer))
+
+        with transaction.atomic():
+            # Custom items become inactive one-time services, as at checkout
+            with _historical_timestamps(Product):
+                customs = iter(Product.objects.bulk_create([
+                    Product(user=user, name=custom[0], price=custom[2], product_type='service', unit='',
+                            stock_quantity=zero, is_active=False, search_key=search.normalize(custom[0]),
+                            created_at=sold_at, updated_at=sold_at)
+                    for sold_at, _, custom, _ in bills if custom
+                ]))
+
+            sale_rows = []
+            item_rows = []
+            offer_uses = []
+            for sale_id, (sold_at, lines, custom, customer) in enumerate(bills, next_id):
+                if custom:
+                    lines.append((next(customs).pk, custom[1], custom[2]))
+                subtotal = sum((quantity * price for _, quantity, price in lines), zero)
+
+                discount = zero
+                if offer_rows and rng.random() < OFFER_SHARE:
+                    window = int((sold_at - opened) / offer_span)
+                    offer = offer_rows[max(0, min(window, len(offer_rows) - 1))]
+                    if offer.offer_type == 'percentage':
+                        discount = (subtotal * offer.discount_value / 100).quantize(Decimal('0.01'))
+                    elif offer.offer_type == 'flat':
+                        discount = min(offer.discount_value, subtotal)
+                    else:
+                        discount = min(price for _, _, price in lines)
+                    offer_uses.append((sale_id, offer.pk, discount))
+                total = subtotal - discount
+
+                is_paid = True
+                amount_paid = total
+                if customer and rng.random() < CREDIT_SHARE:
+                    is_paid = False
+                    amount_paid = zero
+                    if rng.random() < PARTIAL_SHARE:
+                        amount_paid = (total * Decimal(rng.randint(10, 90)) / 100).quantize(Decimal('1'))
+
+                stamp = adapt_datetime(sold_at)
+                sale_rows.append((
+                    sale_id, user.pk, customer, total, discount, amount_paid,
+                    rng.choices(PAYMENT_METHODS, PAYMENT_WEIGHTS)[0], is_paid, not is_paid, '', stamp, stamp, stamp,
+                ))
+                item_rows += [(sale_id, product_id, quantity, price) for product_id, quantity, price in lines]
+
+            _insert(Sale, SALE_COLUMNS, sale_rows)
+            _insert(SaleItem, ('sale', 'product', 'quantity', 'price_at_sale'), item_rows)
+            _insert(SaleOffer, ('sale', 'offer', 'discount_amount'), offer_uses)
+
+        next_id += len(sale_rows)
+        result.sales += len(sale_rows)
+        result.items += len(item_rows)
+        if progress:
+            progress(result.sales)
+
+    _finish(user)
+    return result
+
+
+SALE_COLUMNS = (
+    'id', 'user', 'customer', 'total_amount', 'discount_amount', 'amount_paid',
+    'payment_method', 'is_paid', 'added_to_credit', 'notes', 'sale_date', 'created_at', 'updated_at',
+)
+
+
+def _finish(user):
+    """Derive customer counters and credit from the sales, rebuild rollups and invalidate caches"""
+    with connection.cursor() as cursor:
+        # Sale ids were assigned explicitly; move sequences past them (no-op on SQLite)
+        for sql in connection.ops.sequence_reset_sql(no_style(), [Sale]):
+            cursor.execute(sql)
+
+    Customer.objects.filter(user=user).update(
+        total_purchased=ledger.purchased_subquery(),
+        total_visits=ledger.visits_subquery(),
+        credit_amount=ledger.balance_subquery(),
+        updated_at=timezone.now(),
+    )
+
+    rollups.rebuild(users=[user.pk])
+    for domain in caching.DOMAINS:
+        caching.bump(user, domain)
+    search.clear()
@@ -0,0 +1,78 @@
+"""Model signal handlers for the customers app"""
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .models import Sale, Customer, Product, Offer, UserProfile, ShopPhoto
+from . import rollups, caching, search, images, checkout
+
+
+@receiver(post_save, sender=Sale)
+def sale_recorded(sender, instance, created, raw=False, **kwargs):
+    """Add new sales to the daily rollup (payments update existing sales and are counted separately)"""
+    if created and not raw:
+        rollups.record_sale(instance)
+
+
+@receiver(post_delete, sender=Sale)
+def sale_deleted(sender, instance, **kwargs):
+    """Take deleted sales back out of the daily rollup"""
+    if not checkout.voiding():
+        rollups.reverse_sale(instance)
+
+
+@receiver([post_save, post_delete], sender=Sale)
+def sale_changed(sender, instance, **kwargs):
+    # Sales also move stock and customer balances through queryset updates, which send no signals
+    if checkout.voiding():
+        return
+    for domain in ('sales', 'products', 'customers'):
+        caching.bump(instance.user_id, domain)
+
+
+@receiver([post_save, post_delete], sender=Customer)
+def customer_changed(sender, instance, **kwargs):
+    caching.bump(instance.user_id, 'customers')
+
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, instance, **kwargs):
+    caching.bump(instance.user_id, 'products')
+
+
+@receiver(pre_save, sender=Customer)
+@receiver(pre_save, sender=Product)
+def set_search_key(sender, instance, **kwargs):
+    instance.search_key = search.normalize(instance.name)
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Product)
+def search_row_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_saved(instance)
+
+
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Product)
+def search_row_deleted(sender, instance, **kwargs):
+    search.index_deleted(instance)
+
+
+@receiver(pre_save, sender=UserProfile)
+@receiver(pre_save, sender=Product)
+@receiver(pre_save, sender=ShopPhoto)
+def hash_new_images(sender, instance, raw=False, **kwargs):
+    """Hash new uploads and keep the stored file when the content is unchanged"""
+    if not raw:
+        images.prepare(instance)
+
+
+@receiver([post_save, post_delete], sender=Offer)
+def offer_changed(sender, instance, **kwargs):
+    caching.bump(instance.user_id, 'offers')
+
+
+@receiver(m2m_changed, sender=Offer.applicable_products.through)
+def offer_products_changed(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        caching.bump(instance.user_id, 'offers')
@@ -0,0 +1,11 @@
+from django import template
+
+from customers.images import variant_url
+
+register = template.Library()
+
+
+@register.filter
+def variant(file, size):
+    """{{ product.image|variant:'card' }}: URL of a resized copy, falling back to the original"""
+    return variant_url(file, size)
@@ -0,0 +1,102 @@
+from django.test import TestCase, Client
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils import timezone
+from customers.models import UserActivity, UserProfile
+from customers import activity
+from datetime import timedelta
+from unittest import mock
+
+User = get_user_model()
+
+class BufferedActivityTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        activity.flush()
+        self.user = User.objects.create_user(
+            username='active_user',
+            email='active@example.com',
+            password='password123',
+            is_verified=True
+        )
+        UserProfile.objects.create(user=self.user, shop_name="Active Shop")
+        self.client = Client()
+        self.client.login(email='active@example.com', password='password123')
+
+    def set_last_activity(self, seconds_ago):
+        session = self.client.session
+        session['last_activity'] = (timezone.now() - timedelta(seconds=seconds_ago)).isoformat()
+        session.save()
+
+    def test_requests_are_buffered_until_flush(self):
+        """Page views do not write UserActivity; a flush adds them with one update"""
+        self.client.get('/dashboard/')
+        self.client.get('/dashboard/')
+        self.assertFalse(UserActivity.objects.exists())
+        
+        activity.flush()
+        row = UserActivity.objects.get(user=self.user)
+        self.assertEqual(row.login_count, 1)
+        self.assertEqual(row.date, timezone.localdate())
+        
+        self.set_last_activity(120)
+        self.client.get('/dashboard/')
+        activity.flush()
+        row.refresh_from_db()
+        self.assertGreaterEqual(row.total_active_seconds, 120)
+        self.assertEqual(row.login_count, 1)
+
+    def test_flushes_accumulate(self):
+        """Increments from separate flushes (or workers) add up instead of overwriting"""
+        today = timezone.localdate()
+        activity.record(self.user.pk, today, seconds=30, logins=1)
+        activity.flush()
+        activity.record(self.user.pk, today, seconds=45)
+        activity.flush()
+        
+        row = UserActivity.objects.get(user=self.user, date=today)
+        self.assertEqual((row.total_active_seconds, row.login_count), (75, 1))
+
+    def test_idle_worker_flushes_on_timer(self):
+        """The first buffered event schedules a flush that needs no further request"""
+        today = timezone.localdate()
+        with mock.patch.object(activity, '_timer', None), mock.patch.object(activity.threading, 'Timer') as timer:
+            activity.record(self.user.pk, today, seconds=30, logins=1)
+            activity.record(self.user.pk, today, seconds=15)
+            timer.assert_called_once_with(activity.FLUSH_INTERVAL, activity._flush_on_timer)
+            timer.return_value.start.assert_called_once_with()
+            self.assertFalse(UserActivity.objects.exists())
+            
+            # The worker stays idle: only the timer fires. It closes its own thread's
+            # connections, which here would be the test's.
+            with mock.patch.object(activity.connections, 'close_all') as close_all:
+                activity._flush_on_timer()
+            close_all.assert_called_once_with()
+            self.assertIsNone(activity._timer)
+        
+        row = UserActivity.objects.get(user=self.user, date=today)
+        self.assertEqual((row.total_active_seconds, row.login_count), (45, 1))
+
+    def test_failed_flush_keeps_the_buffer(self):
+        """Rows a flush could not write stay buffered for the next one"""
+        today = timezone.localdate()
+        activity.record(self.user.pk, today, seconds=20, logins=1)
+        with mock.patch.object(activity, '_apply', side_effect=activity.DatabaseError('locked')):
+            with self.assertRaises(activity.DatabaseError):
+                activity.flush()
+        
+        self.assertEqual(activity.flush(), 1)
+        row = UserActivity.objects.get(user=self.user, date=today)
+        self.assertEqual((row.total_active_seconds, row.login_count), (20, 1))
+
+    def test_locked_database_does_not_fail_the_request(self):
+        """A due flush that hits a locked database leaves the page view alone"""
+        self.client.get('/dashboard/')
+        locked = activity.DatabaseError('database is locked')
+        with mock.patch.object(activity, '_last_flush', 0), mock.patch.object(activity, '_apply', side_effect=locked):
+            response = self.client.get('/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(UserActivity.objects.exists())
+        
+        activity.flush()
+        self.assertEqual(UserActivity.objects.get(user=self.user).login_count, 1)
@@ -0,0 +1,26 @@
+from django.test import TestCase
+from customers import benchmarks
+
+
+class ViewQueryBudgetTest(TestCase):
+    """Every benchmarked view stays within its query budget, whatever the shop size"""
+
+    @classmethod
+    def setUpTestData(cls):
+        tiny = dict(products=5, customers=5, sales=30, offers=2, days=10)
+        cls.shops = [benchmarks.seed('tiny', 1, tiny), benchmarks.seed('small', 2)]
+
+    def test_views_within_query_budgets(self):
+        results = benchmarks.run(self.shops, repeat=1)
+        
+        self.assertEqual(len(results), 2 * len(benchmarks.BENCHMARKS))
+        self.assertEqual(benchmarks.check(results), [])
+
+    def test_baseline_regressions_are_reported(self):
+        result = benchmarks.Result('dashboard', 'small', queries=3, ms=40.0, peak_kb=100)
+        baseline = {result.key: {'queries': 2, 'ms': 20.0, 'peak_kb': 100}}
+        
+        failures = benchmarks.check([result], baseline)
+        
+        self.assertEqual(len(failures), 2)
+        self.assertIn('(+50%)', benchmarks.table([result], baseline))
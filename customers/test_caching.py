@@ -0,0 +1,112 @@
+from django.test import TestCase, Client
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from customers.models import Customer, Product, Offer, UserProfile
+from customers import caching
+from decimal import Decimal
+import json
+
+User = get_user_model()
+
+class VersionedCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='cache_user',
+            email='cache@example.com',
+            password='password123',
+            is_verified=True
+        )
+        UserProfile.objects.create(user=self.user, shop_name="Cache Shop")
+        self.client = Client()
+        self.client.login(email='cache@example.com', password='password123')
+        self.product = Product.objects.create(
+            user=self.user,
+            name="Sugar",
+            category="grocery",
+            price=Decimal("40.00"),
+            stock_quantity=Decimal("20.00")
+        )
+
+    def stats(self, name):
+        return next(row for row in caching.stats() if row['name'] == name)
+
+    def test_dashboard_metrics_cached_until_product_change(self):
+        """Dashboard metrics are served from cache and refreshed by a product edit"""
+        self.client.get('/dashboard/widgets/metrics/')
+        response = self.client.get('/dashboard/widgets/metrics/')
+        self.assertEqual(response.json()['total_products'], 1)
+        self.assertEqual(self.stats('dashboard')['hits'], 1)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(user=self.user, name="Salt", category="grocery", price=Decimal("20.00"))
+        response = self.client.get('/dashboard/widgets/metrics/')
+        self.assertEqual(response.json()['total_products'], 2)
+        self.assertEqual(self.stats('dashboard')['misses'], 2)
+
+    def test_dashboard_widgets_revalidate_with_etags(self):
+        """Each widget has its own ETag, which only changes with the domains it reads"""
+        shell = self.client.get('/dashboard/')
+        self.assertEqual(shell.context['widgets'], ['metrics', 'monthly', 'low-stock'])
+        
+        etags = {}
+        for name in shell.context['widgets']:
+            response = self.client.get(f'/dashboard/widgets/{name}/')
+            self.assertEqual(response.status_code, 200)
+            etags[name] = response['ETag']
+        self.assertIn('well-stocked', self.client.get('/dashboard/widgets/low-stock/').json()['html'])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Customer.objects.create(user=self.user, name="New", phone="123")
+        # Only the session and user are read for a 304
+        with self.assertNumQueries(2):
+            response = self.client.get('/dashboard/widgets/monthly/', HTTP_IF_NONE_MATCH=etags['monthly'])
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get('/dashboard/widgets/metrics/', HTTP_IF_NONE_MATCH=etags['metrics'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total_customers'], 1)
+        self.assertEqual(self.client.get('/dashboard/widgets/nope/').status_code, 404)
+
+    def test_offer_and_catalog_caches_follow_edits(self):
+        """Billing catalog and active offers are rebuilt after product and offer edits"""
+        self.client.get('/billing/')
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = Decimal("45.00")
+            self.product.save()
+            Offer.objects.create(
+                user=self.user, name="Festive", offer_type='flat', discount_value=Decimal("10.00"),
+                start_date=self.product.created_at, end_date=self.product.created_at.replace(year=2100)
+            )
+        
+        response = self.client.get('/billing/')
+        products = self.client.get('/api/billing/catalog/').json()['products']
+        offers = json.loads(response.context['offers_json'])
+        self.assertEqual(products[0]['price'], '45.00')
+        self.assertEqual([o['name'] for o in offers], ["Festive"])
+
+    def test_versions_are_per_shop(self):
+        """Bumping one shop's domain leaves other shops' caches valid"""
+        other = User.objects.create_user(username='other', email='other@example.com', password='password123')
+        before = caching.versioned_key('dashboard', other, ('products',))
+        caching.bump(self.user, 'products')
+        self.assertEqual(caching.versioned_key('dashboard', other, ('products',)), before)
+
+    def test_bumps_wait_for_commit(self):
+        """Inside a transaction the version only moves once the transaction commits"""
+        before = caching.versioned_key('dashboard', self.user, ('products',))
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            caching.bump(self.user, 'products')
+            self.assertEqual(caching.versioned_key('dashboard', self.user, ('products',)), before)
+        self.assertEqual(len(callbacks), 1)
+        self.assertNotEqual(caching.versioned_key('dashboard', self.user, ('products',)), before)
+
+    def test_admin_shows_hit_miss_counters(self):
+        """Staff can read the cache counters from the admin"""
+        self.client.get('/dashboard/widgets/metrics/')
+        User.objects.create_superuser(username='admin', email='admin@example.com', password='password123')
+        self.client.login(email='admin@example.com', password='password123')
+        
+        response = self.client.get('/admin/cache-stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'dashboard')
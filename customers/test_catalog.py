@@ -0,0 +1,78 @@
+from django.test import TestCase, Client
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from customers.models import Customer, Product, UserProfile
+from customers.checkout import create_sale
+from decimal import Decimal
+
+User = get_user_model()
+
+class BillingCatalogSyncTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='catalog_user',
+            email='catalog@example.com',
+            password='password123',
+            is_verified=True
+        )
+        UserProfile.objects.create(user=self.user, shop_name="Catalog Shop")
+        self.client = Client()
+        self.client.login(email='catalog@example.com', password='password123')
+        self.product = Product.objects.create(
+            user=self.user,
+            name="Tea",
+            category="grocery",
+            price=Decimal("120.00"),
+            stock_quantity=Decimal("10.00")
+        )
+        self.customer = Customer.objects.create(user=self.user, name="Meena", phone="9000000001")
+
+    def test_full_catalog_supports_etag(self):
+        """Unchanged catalog answers a conditional request with 304"""
+        response = self.client.get('/api/billing/catalog/')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data['full'])
+        self.assertEqual([p['name'] for p in data['products']], ["Tea"])
+        self.assertEqual([c['name'] for c in data['customers']], ["Meena"])
+        
+        response = self.client.get('/api/billing/catalog/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_delta_returns_only_changes(self):
+        """?since= returns edited products and deleted customers, not the whole catalog"""
+        version = self.client.get('/api/billing/catalog/').json()['version']
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = Decimal("125.00")
+            self.product.save()
+            self.client.post(f'/customers/{self.customer.pk}/delete/')
+        
+        data = self.client.get('/api/billing/catalog/', {'since': version}).json()
+        self.assertFalse(data['full'])
+        self.assertGreater(data['version'], version)
+        self.assertEqual([(p['id'], p['price']) for p in data['products']], [(self.product.pk, '125.00')])
+        self.assertEqual(data['deleted_customers'], [self.customer.pk])
+
+    def test_catalog_read_during_a_sale_keeps_the_old_version(self):
+        """A read between a sale's write and its commit cannot cache under the new version"""
+        before = self.client.get('/api/billing/catalog/').json()
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            create_sale(self.user, [{'product_id': self.product.pk, 'quantity': 1, 'price': 120}])
+            # Other connections still read the pre-sale snapshot at this point; the
+            # version they key their cache on must not have moved yet
+            during = self.client.get('/api/billing/catalog/').json()
+            self.assertEqual(during['version'], before['version'])
+        
+        after = self.client.get('/api/billing/catalog/').json()
+        self.assertGreater(after['version'], before['version'])
+        self.assertEqual([p['stock_quantity'] for p in after['products']], ['9.00'])
+
+    def test_invalid_version_falls_back_to_full_catalog(self):
+        """Unknown versions get the full catalog so the client can start over"""
+        data = self.client.get('/api/billing/catalog/', {'since': 'abc'}).json()
+        self.assertTrue(data['full'])
+        data = self.client.get('/api/billing/catalog/', {'since': '1'}).json()
+        self.assertTrue(data['full'])
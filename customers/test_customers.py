@@ -1,14 +1,24 @@
 from django.test import TestCase, Client
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.utils import timezone
-from customers.models import Customer
+from django.core.management import call_command, CommandError
+from customers.models import Customer, Product, Sale, CreditPayment
+from customers import ledger
+from customers.pagination import paginate_timeline
 from decimal import Decimal
+from io import StringIO
+import csv
 import json
+import os
+import shutil
+import tempfile
 
 User = get_user_model()
 
 class CustomerModuleTest(TestCase):
     def setUp(self):
+        cache.clear()
         self.user = User.objects.create_user(
             username='testuser_c', 
             email='test_c@example.com', 
@@ -21,23 +31,24 @@ class CustomerModuleTest(TestCase):
     def test_customer_creation_dashboard_update(self):
         """Test customer creation and dashboard cache invalidation"""
         # 1. Initial Dashboard Load
-        response = self.client.get('/dashboard/')
-        self.assertEqual(response.context['total_customers'], 0)
+        response = self.client.get('/dashboard/widgets/metrics/')
+        self.assertEqual(response.json()['total_customers'], 0)
         
         # 2. Create Customer
-        response = self.client.post('/customers/create/', {
-            'name': 'New Customer',
-            'phone': '1234567890',
-            'address': 'Test Address',
-            'notes': 'Test Note'
-        })
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/customers/create/', {
+                'name': 'New Customer',
+                'phone': '1234567890',
+                'address': 'Test Address',
+                'notes': 'Test Note'
+            })
         self.assertEqual(response.status_code, 302) # Redirect to list
         
         # 3. Check Dashboard again
-        response = self.client.get('/dashboard/')
+        response = self.client.get('/dashboard/widgets/metrics/')
         # If cache invalidation is missing, this might still show 0 depending on cache duration
         # We want to ensure it shows 1
-        self.assertEqual(response.context['total_customers'], 1, "Dashboard not updating after customer creation")
+        self.assertEqual(response.json()['total_customers'], 1, "Dashboard not updating after customer creation")
 
     def test_customer_creation_duplicate(self):
         """Test duplicate phone number check"""
@@ -78,20 +89,203 @@ class CustomerModuleTest(TestCase):
         # 3. Pay partial valid amount
         self.client.post(url, {'amount': '200'})
         customer.refresh_from_db()
-        self.assertEqual(customer.udhar_amount, Decimal("300.00"))
+        self.assertEqual(customer.credit_amount, Decimal("300.00"))
 
     def test_customer_deletion_dashboard_update(self):
         """Test customer deletion and dashboard logic"""
         customer = Customer.objects.create(user=self.user, name="To Delete", phone="000")
         
         # Verify count is 1
-        response = self.client.get('/dashboard/')
-        self.assertEqual(response.context['total_customers'], 1)
+        response = self.client.get('/dashboard/widgets/metrics/')
+        self.assertEqual(response.json()['total_customers'], 1)
         
         # Delete
-        self.client.post(f'/customers/{customer.id}/delete/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/customers/{customer.id}/delete/')
         
         # Verify count is 0
-        response = self.client.get('/dashboard/')
-        self.assertEqual(response.context['total_customers'], 0, "Dashboard not updating after deletion")
+        response = self.client.get('/dashboard/widgets/metrics/')
+        self.assertEqual(response.json()['total_customers'], 0, "Dashboard not updating after deletion")
+
 
+    def test_credit_ledger_follows_sales_and_payments(self):
+        """credit_amount tracks remaining amounts and drives the customer list filter"""
+        debtor = Customer.objects.create(user=self.user, name="Debtor", phone="111")
+        Customer.objects.create(user=self.user, name="Clear", phone="222")
+        product = Product.objects.create(
+            user=self.user, name="Rice", category="grocery",
+            price=Decimal("100.00"), stock_quantity=Decimal("50.00")
+        )
+        for _ in range(2):
+            response = self.client.post('/billing/', json.dumps({
+                'customer_id': debtor.id,
+                'is_paid': False,
+                'items': [{'product_id': product.id, 'quantity': 1, 'price': 100}],
+            }), content_type='application/json')
+            self.assertTrue(response.json()['success'])
+        
+        debtor.refresh_from_db()
+        self.assertEqual(debtor.credit_amount, Decimal("200.00"))
+        
+        self.client.post(f'/customers/{debtor.id}/pay-credit/', {'amount': '150'})
+        debtor.refresh_from_db()
+        self.assertEqual(debtor.credit_amount, Decimal("50.00"))
+        self.assertEqual(Sale.objects.filter(customer=debtor, is_paid=False).count(), 1)
+        
+        response = self.client.get('/customers/', {'credit_filter': 'remaining'})
+        self.assertEqual([c.name for c in response.context['customers']], ["Debtor"])
+        self.assertEqual(response.context['customers'][0].pending_credit, Decimal("50.00"))
+        response = self.client.get('/customers/', {'credit_filter': 'cleared'})
+        self.assertEqual([c.name for c in response.context['customers']], ["Clear"])
+
+    def test_credit_payment_ledger_allocates_oldest_first(self):
+        """A payment is recorded with FIFO allocations and shows up in the credit history"""
+        customer = Customer.objects.create(user=self.user, name="Ledger", phone="444", credit_amount=Decimal("600.00"))
+        now = timezone.now()
+        sales = []
+        for days_ago, total in ((3, '100.00'), (2, '200.00'), (1, '300.00')):
+            sale = Sale.objects.create(
+                user=self.user, customer=customer, total_amount=Decimal(total),
+                payment_method="cash", is_paid=False, added_to_credit=True
+            )
+            Sale.objects.filter(pk=sale.pk).update(sale_date=now - timezone.timedelta(days=days_ago))
+            sales.append(sale)
+        
+        self.client.post(f'/customers/{customer.id}/pay-credit/', {'amount': '250'})
+        
+        payment = CreditPayment.objects.get(customer=customer)
+        self.assertEqual(payment.amount, Decimal("250.00"))
+        self.assertEqual(
+            list(payment.allocations.order_by('sale_id').values_list('sale_id', 'amount')),
+            [(sales[0].pk, Decimal("100.00")), (sales[1].pk, Decimal("150.00"))]
+        )
+        self.assertEqual(
+            list(Sale.objects.filter(customer=customer).order_by('sale_date').values_list('amount_paid', 'is_paid')),
+            [(Decimal("100.00"), True), (Decimal("150.00"), False), (Decimal("0.00"), False)]
+        )
+        customer.refresh_from_db()
+        self.assertEqual(customer.credit_amount, Decimal("350.00"))
+        
+        response = self.client.get(f'/customers/{customer.id}/')
+        history = response.context['credit_transactions']
+        self.assertEqual([entry['type'] for entry in history], ['payment', 'credit', 'credit', 'credit'])
+        self.assertEqual(history[0]['amount'], Decimal("250.00"))
+        self.assertContains(response, 'Payment Received')
+
+    def test_credit_history_pages_through_ties_between_sales_and_payments(self):
+        """A sale and a payment with the same time and id are both listed, once, across pages"""
+        customer = Customer.objects.create(user=self.user, name="Ties", phone="666")
+        when = timezone.now().replace(microsecond=0)
+        for _ in range(3):
+            sale = Sale.objects.create(
+                user=self.user, customer=customer, total_amount=Decimal("10.00"),
+                payment_method="cash", is_paid=False, added_to_credit=True, sale_date=when
+            )
+            Sale.objects.filter(pk=sale.pk).update(sale_date=when)
+            CreditPayment.objects.create(pk=sale.pk, user=self.user, customer=customer, amount=Decimal("5.00"), received_at=when)
+        
+        seen, cursor = [], None
+        for _ in range(10):
+            page, cursor = paginate_timeline(customer, cursor, per_page=1)
+            seen += [(entry['type'], entry['ref']) for entry in page]
+            if cursor is None:
+                break
+        
+        self.assertEqual(len(seen), 6)
+        self.assertEqual(set(seen), {(kind, pk) for kind in ('credit', 'payment') for pk in CreditPayment.objects.values_list('pk', flat=True)})
+        self.assertEqual([kind for kind, _ in seen], ['payment'] * 3 + ['credit'] * 3)
+
+    def test_customer_detail_pages_history_without_writes(self):
+        """Detail shows one page of each history, later pages come from ?partial= and GET never writes"""
+        customer = Customer.objects.create(user=self.user, name="Regular", phone="555", total_visits=99)
+        for _ in range(25):
+            Sale.objects.create(
+                user=self.user, customer=customer, total_amount=Decimal("10.00"),
+                payment_method="cash", is_paid=False, added_to_credit=True
+            )
+        
+        response = self.client.get(f'/customers/{customer.id}/')
+        self.assertEqual(len(response.context['purchases']), 20)
+        self.assertEqual(len(response.context['credit_transactions']), 20)
+        self.assertEqual(response.context['stats']['visits'], 25)
+        self.assertEqual(response.context['stats']['purchased'], Decimal("250.00"))
+        customer.refresh_from_db()
+        self.assertEqual(customer.total_visits, 99)
+        
+        for partial, marker in (('purchases', 'class="purchase-item"'), ('credit', 'class="credit-transaction"')):
+            data = self.client.get(f'/customers/{customer.id}/', {
+                'partial': partial, 'cursor': response.context[f'{partial}_cursor'],
+            }).json()
+            self.assertEqual(data['rows'].count(marker), 5)
+            self.assertIsNone(data['next_cursor'])
+        
+        call_command('reconcile_customer_stats', stdout=StringIO())
+        customer.refresh_from_db()
+        self.assertEqual(customer.total_visits, 25)
+        self.assertEqual(customer.total_purchased, Decimal("250.00"))
+
+    def test_fix_credit_amounts_reconciles_ledger(self):
+        """The reconciler rebuilds drifted balances from unpaid sales"""
+        customer = Customer.objects.create(user=self.user, name="Drifted", phone="333", credit_amount=Decimal("999.00"))
+        Sale.objects.create(
+            user=self.user, customer=customer, total_amount=Decimal("300.00"),
+            amount_paid=Decimal("120.00"), payment_method="cash", is_paid=False
+        )
+        call_command('fix_customer_credit_amounts', stdout=StringIO())
+        customer.refresh_from_db()
+        self.assertEqual(customer.credit_amount, Decimal("180.00"))
+
+    def test_credit_reconciler_is_set_based(self):
+        """Drifted balances are found with one grouped aggregate and fixed with one UPDATE"""
+        for n in range(30):
+            customer = Customer.objects.create(user=self.user, name=f"C{n}", phone=str(n), credit_amount=Decimal("5.00"))
+            Sale.objects.create(
+                user=self.user, customer=customer, total_amount=Decimal("40.00"),
+                amount_paid=Decimal("10.00"), payment_method="credit", is_paid=False, added_to_credit=True
+            )
+        
+        # Shops, balances, customers, then a savepoint, the UPDATE and a release
+        with self.assertNumQueries(6):
+            drifted = list(ledger.reconcile_credit())
+        self.assertEqual(len(drifted), 30)
+        self.assertEqual(drifted[0][4:], (Decimal("5.00"), Decimal("30.00")))
+        self.assertEqual(set(Customer.objects.values_list('credit_amount', flat=True)), {Decimal("30.00")})
+        self.assertEqual(list(ledger.reconcile_credit()), [])
+
+    def test_fix_credit_amounts_check_tenant_since_and_report(self):
+        """--check reports without fixing and exits non-zero; --tenant and --since narrow the run"""
+        other = User.objects.create_user(username='other_c', email='other_c@example.com', password='password123')
+        mine = Customer.objects.create(user=self.user, name="Mine", phone="111", credit_amount=Decimal("50.00"))
+        theirs = Customer.objects.create(user=other, name="Theirs", phone="222", credit_amount=Decimal("70.00"))
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder, ignore_errors=True)
+        report = os.path.join(folder, 'drift.csv')
+        
+        with self.assertRaises(CommandError) as raised:
+            call_command('fix_customer_credit_amounts', '--check', '--tenant', 'TEST_C@example.com',
+                         '--report', report, stdout=StringIO())
+        self.assertEqual(raised.exception.returncode, 1)
+        with open(report, newline='') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual([(r['name'], r['recorded'], r['correct'], r['difference']) for r in rows], [("Mine", "50.00", "0.00", "50.00")])
+        mine.refresh_from_db()
+        self.assertEqual(mine.credit_amount, Decimal("50.00"))
+        
+        call_command('fix_customer_credit_amounts', '--tenant', 'test_c@example.com', stdout=StringIO())
+        mine.refresh_from_db()
+        theirs.refresh_from_db()
+        self.assertEqual((mine.credit_amount, theirs.credit_amount), (Decimal("0.00"), Decimal("70.00")))
+        
+        # Untouched since last month: outside --since today, inside --since before then
+        Customer.objects.filter(pk=theirs.pk).update(updated_at=timezone.now() - timezone.timedelta(days=40))
+        today = timezone.localdate()
+        call_command('fix_customer_credit_amounts', '--since', today.isoformat(), stdout=StringIO())
+        theirs.refresh_from_db()
+        self.assertEqual(theirs.credit_amount, Decimal("70.00"))
+        call_command('fix_customer_credit_amounts', '--since', (today - timezone.timedelta(days=60)).isoformat(), stdout=StringIO())
+        theirs.refresh_from_db()
+        self.assertEqual(theirs.credit_amount, Decimal("0.00"))
+        
+        out = StringIO()
+        call_command('fix_customer_credit_amounts', '--check', stdout=out)
+        self.assertIn('All customer balances match', out.getvalue())
@@ -0,0 +1,109 @@
+from django.test import TestCase, Client, override_settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from customers.models import UserProfile, Product
+from customers import images
+from PIL import Image
+from io import BytesIO, StringIO
+from unittest import mock
+import shutil
+import tempfile
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def upload(name, size=(1200, 900), color='red', mode='RGB'):
+    output = BytesIO()
+    Image.new(mode, size, color).save(output, format='PNG')
+    return SimpleUploadedFile(name, output.getvalue(), content_type='image/png')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ImagePipelineTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='image_user',
+            email='images@example.com',
+            password='password123',
+            is_verified=True
+        )
+        self.profile = UserProfile.objects.create(user=self.user, shop_name="Image Shop")
+        self.client = Client()
+        self.client.login(email='images@example.com', password='password123')
+
+    def test_unchanged_logo_is_not_reprocessed(self):
+        """Saving text fields or re-uploading the same logo does no image work"""
+        self.profile.shop_logo = upload('logo.png')
+        self.profile.save()
+        call_command('process_images', stdout=StringIO())
+        self.profile.refresh_from_db()
+        stored = self.profile.shop_logo.name
+        self.assertTrue(self.profile.images_ready)
+        
+        with mock.patch('customers.images.Image.open') as pillow:
+            self.profile.shop_name = "Renamed Shop"
+            self.profile.save()
+            self.profile.shop_logo = upload('logo-again.png')
+            self.profile.save()
+            call_command('process_images', stdout=StringIO())
+        pillow.assert_not_called()
+        
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.shop_logo.name, stored)
+        self.assertTrue(self.profile.images_ready)
+
+    def test_worker_renders_variants_once_per_content(self):
+        product = Product.objects.create(user=self.user, name='Banner', category='other', price=10)
+        product.image = upload('banner.png', mode='RGBA', color=(0, 0, 255, 0))
+        product.save()
+        
+        # Until the worker runs the original is served
+        self.assertEqual(images.variant_url(product.image, 'card'), product.image.url)
+        
+        call_command('process_images', stdout=StringIO())
+        product.refresh_from_db()
+        self.assertTrue(product.images_ready)
+        for size, box in images.SIZES.items():
+            name = images.variant_name(product.image_hash, size)
+            with product.image.storage.open(name) as variant, Image.open(variant) as img:
+                self.assertTrue(img.width <= box[0] and img.height <= box[1])
+                self.assertEqual(img.format, 'JPEG')
+                # Transparent areas are flattened onto white, not black
+                self.assertEqual(img.getpixel((0, 0)), (255, 255, 255))
+        
+        response = self.client.get(f'/products/{product.pk}/')
+        self.assertContains(response, images.variant_name(product.image_hash, 'card'))
+        self.assertNotContains(response, product.image.url)
+
+    def test_new_upload_during_processing_stays_pending(self):
+        product = Product.objects.create(user=self.user, name='Cup', category='other', price=5, image=upload('cup.png'))
+        stale = Product.objects.get(pk=product.pk)
+        
+        product.image = upload('cup-new.png', color='green')
+        product.save()
+        
+        self.assertEqual(images.process(stale), 0)
+        product.refresh_from_db()
+        self.assertFalse(product.images_ready)
+        self.assertEqual(images.process(product), 1)
+
+    def test_rows_saved_without_hash_are_hashed_by_worker(self):
+        product = Product.objects.create(user=self.user, name='Plate', category='other', price=5, image=upload('plate.png'))
+        Product.objects.filter(pk=product.pk).update(image_hash='', images_ready=False)
+        
+        call_command('process_images', stdout=StringIO())
+        
+        product.refresh_from_db()
+        with product.image.open('rb'):
+            self.assertEqual(product.image_hash, images.content_hash(product.image))
+        self.assertTrue(product.images_ready)
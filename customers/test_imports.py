@@ -0,0 +1,335 @@
+from django.test import TestCase, Client, override_settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.utils import timezone
+from customers.models import Customer, Product, Sale, ImportJob, DailySalesRollup
+from customers import imports, ledger, rollups
+from decimal import Decimal
+from io import BytesIO
+from unittest import mock
+import csv
+import shutil
+import tempfile
+import zipfile
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def xlsx(rows):
+    """Minimal workbook: first row as shared strings, the rest inline or numeric"""
+    strings = rows[0]
+    cells = []
+    for r, row in enumerate(rows, start=1):
+        out = []
+        for c, value in enumerate(row):
+            ref = f'{chr(65 + c)}{r}'
+            if value == '':
+                continue
+            if r == 1:
+                out.append(f'<c r="{ref}" t="s"><v>{strings.index(value)}</v></c>')
+            elif isinstance(value, str):
+                out.append(f'<c r="{ref}" t="inlineStr"><is><t>{value}</t></is></c>')
+            else:
+                out.append(f'<c r="{ref}"><v>{value}</v></c>')
+        cells.append(f'<row r="{r}">{"".join(out)}</row>')
+
+    main = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+    output = BytesIO()
+    with zipfile.ZipFile(output, 'w') as book:
+        book.writestr('xl/workbook.xml', (
+            f'<workbook xmlns="{main}" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            '<sheets><sheet name="Products" sheetId="1" r:id="rId1"/></sheets></workbook>'
+        ))
+        book.writestr('xl/_rels/workbook.xml.rels', (
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Target="worksheets/sheet1.xml"/></Relationships>'
+        ))
+        book.writestr('xl/sharedStrings.xml', f'<sst xmlns="{main}">' + ''.join(f'<si><t>{s}</t></si>' for s in strings) + '</sst>')
+        book.writestr('xl/worksheets/sheet1.xml', f'<worksheet xmlns="{main}"><sheetData>{"".join(cells)}</sheetData></worksheet>')
+    return output.getvalue()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ProductImportTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='import_user',
+            email='import@example.com',
+            password='password123',
+            is_verified=True
+        )
+        self.client = Client()
+        self.client.login(email='import@example.com', password='password123')
+        
+        self.atta = Product.objects.create(
+            user=self.user, name="Aashirvaad Atta 5kg", category='grocery', price=Decimal("250.00"),
+            unit='kg', stock_quantity=Decimal("10.00"), description="Keep me"
+        )
+
+    def upload(self, name, content, **data):
+        response = self.client.post('/products/import/', {
+            'file': SimpleUploadedFile(name, content), **data,
+        })
+        self.assertTrue(response.json()['success'])
+        imports.drain()
+        return self.client.get(response.json()['status_url']).json()
+
+    def test_csv_import_upserts_and_reports_row_errors(self):
+        """New names are created, existing ones updated, bad rows skipped with their row number"""
+        job = self.upload('products.csv', (
+            'Name,Category,Price,Unit,Stock Quantity\n'
+            'aashirvaad atta 5KG,Grocery,265,kg,40\n'
+            'Steel Thali,bartan,"1,200.50",piece,5\n'
+            'Haircut,other,150,,\n'
+            'Mystery,toys,10,piece,1\n'
+            ',grocery,10,piece,1\n'
+            'Free Sample,grocery,0,piece,1\n'
+        ).encode())
+        
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual((job['total_rows'], job['processed_rows']), (6, 6))
+        self.assertEqual((job['created'], job['updated'], job['error_count']), (2, 1, 3))
+        self.assertEqual([error['row'] for error in job['errors']], [5, 6, 7])
+        self.assertIn('category "toys"', job['errors'][0]['message'])
+        
+        self.atta.refresh_from_db()
+        self.assertEqual((self.atta.price, self.atta.stock_quantity), (Decimal("265.00"), Decimal("40.00")))
+        self.assertEqual(self.atta.description, "Keep me")
+        thali = Product.objects.get(user=self.user, name="Steel Thali")
+        self.assertEqual((thali.price, thali.search_key), (Decimal("1200.50"), 'stil thali'))
+        self.assertEqual(Product.objects.get(name="Haircut").unit, 'piece')
+        self.assertFalse(ImportJob.objects.get().file)
+        
+        # The billing catalog and search see the import at once
+        names = [p['name'] for p in self.client.get('/api/billing/catalog/').json()['products']]
+        self.assertIn("Steel Thali", names)
+        self.assertEqual(self.client.get('/api/products/search/?q=thali').json()['products'][0]['name'], "Steel Thali")
+
+    def test_price_list_leaves_stock_and_unit_alone(self):
+        """Columns missing from the file are not reset on the products it updates"""
+        haircut = Product.objects.create(
+            user=self.user, name="Haircut", category='other', price=Decimal("100.00"),
+            product_type='service', unit='', stock_quantity=Decimal("0")
+        )
+        job = self.upload('prices.csv', b'name,category,price\nAashirvaad Atta 5kg,grocery,270\nHaircut,other,120\n')
+        self.assertEqual((job['updated'], job['error_count']), (2, 0))
+        
+        self.atta.refresh_from_db()
+        self.assertEqual((self.atta.price, self.atta.unit, self.atta.stock_quantity), (Decimal("270.00"), 'kg', Decimal("10.00")))
+        haircut.refresh_from_db()
+        self.assertEqual((haircut.price, haircut.product_type), (Decimal("120.00"), 'service'))
+
+    def test_dry_run_writes_nothing(self):
+        """A dry run validates and counts but leaves the catalog alone"""
+        job = self.upload('products.csv', b'name,category,price\nNew Item,grocery,10\nNew Item,grocery,12\n', dry_run='1')
+        self.assertEqual((job['created'], job['updated'], job['error_count']), (1, 0, 0))
+        self.assertIn('would be created', job['message'])
+        self.assertEqual(Product.objects.count(), 1)
+
+    def test_xlsx_import(self):
+        """Shared strings, inline strings, numbers and blank cells are read from the sheet XML"""
+        content = xlsx([
+            ['name', 'category', 'price', 'unit', 'stock_quantity', 'product_type'],
+            ['LED Bulb', 'electronics', 99.9, '', 12, ''],
+            ['Repair', 'electronics', 300, '', '', 'service'],
+        ])
+        job = self.upload('catalog.xlsx', content)
+        
+        self.assertEqual((job['created'], job['error_count']), (2, 0))
+        bulb = Product.objects.get(name="LED Bulb")
+        self.assertEqual((bulb.price, bulb.unit, bulb.stock_quantity), (Decimal("99.90"), 'piece', Decimal("12.00")))
+        self.assertEqual(Product.objects.get(name="Repair").product_type, 'service')
+
+    def test_bad_files_fail_the_job(self):
+        """Missing columns or an unreadable workbook fail the job with a message"""
+        job = self.upload('products.csv', b'name,price\nTea,10\n')
+        self.assertEqual(job['status'], 'failed')
+        self.assertEqual(job['message'], 'Missing column(s): category')
+        
+        job = self.upload('products.xlsx', b'not a zip')
+        self.assertEqual(job['status'], 'failed')
+        
+        job = self.upload('products.csv', b'name,category,price\n"' + b'x' * (csv.field_size_limit() + 1) + b'",grocery,1\n')
+        self.assertEqual(job['status'], 'failed')
+        self.assertIn('Line 2', job['message'])
+        
+        response = self.client.post('/products/import/', {'file': SimpleUploadedFile('products.xls', b'')})
+        self.assertEqual(response.status_code, 400)
+
+    def test_malformed_workbooks_fail_the_job(self):
+        """A truncated sheet, a bad shared string or an unforeseen error ends the job as failed"""
+        good = xlsx([['name', 'category', 'price'], ['Tea', 'grocery', 10]])
+        
+        truncated = BytesIO()
+        with zipfile.ZipFile(BytesIO(good)) as source, zipfile.ZipFile(truncated, 'w') as book:
+            for name in source.namelist():
+                data = source.read(name)
+                book.writestr(name, data[:len(data) // 2] if name.endswith('sheet1.xml') else data)
+        # The header's third cell points past the end of the shared strings
+        bad_string = good.replace(b'<v>2</v>', b'<v>7</v>')
+        
+        for content in (truncated.getvalue(), bad_string):
+            job = self.upload('products.xlsx', content)
+            self.assertEqual(job['status'], 'failed')
+            self.assertEqual(job['message'], 'The file is not a valid .xlsx workbook')
+        
+        broken = imports.Importer(imports.PRODUCT_COLUMNS, imports.TABLE_EXTENSIONS, mock.Mock(side_effect=RuntimeError))
+        with mock.patch.dict(imports.IMPORTERS, {'products': broken}), self.assertLogs('customers.imports', 'ERROR'):
+            job = self.upload('products.xlsx', good)
+        self.assertEqual(job['status'], 'failed')
+        self.assertFalse(ImportJob.objects.filter(status='running').exists())
+        self.assertFalse(ImportJob.objects.exclude(file='').exists())
+        self.assertFalse(Product.objects.filter(name='Tea').exists())
+
+    def test_queries_grow_per_chunk_not_per_row(self):
+        """Rows are written in chunks: one preload plus a fixed number of queries per chunk"""
+        def rows(count):
+            return [(n + 2, {'name': f'Item {n}', 'category': 'grocery', 'price': '10'}) for n in range(count)]
+        
+        # Preload, then a savepoint, one INSERT and a release for each of the three chunks
+        with mock.patch.object(imports, 'CHUNK_SIZE', 50):
+            with self.assertNumQueries(10):
+                result = imports.import_products(self.user, rows(120), {'name', 'category', 'price'})
+        self.assertEqual(result.created, 120)
+        
+        with mock.patch.object(imports, 'CHUNK_SIZE', 50):
+            with self.assertNumQueries(10):
+                result = imports.import_products(self.user, rows(120), {'name', 'category', 'price'})
+        self.assertEqual(result.updated, 120)
+
+    def test_status_is_private(self):
+        """Another shop cannot read an import's progress"""
+        job = ImportJob.objects.create(user=self.user, kind='products', file=SimpleUploadedFile('a.csv', b''))
+        other = User.objects.create_user(username='other', email='other@example.com', password='password123')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(f'/imports/{job.pk}/').status_code, 404)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class CustomerImportTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='contacts_user',
+            email='contacts@example.com',
+            password='password123',
+            is_verified=True
+        )
+        self.client = Client()
+        self.client.login(email='contacts@example.com', password='password123')
+        
+        self.ramesh = Customer.objects.create(user=self.user, name="Ramesh", phone="98765 43210", notes="Keep me")
+
+    def upload(self, name, content, **data):
+        response = self.client.post('/customers/import/', {
+            'file': SimpleUploadedFile(name, content), **data,
+        })
+        self.assertTrue(response.json()['success'])
+        imports.drain()
+        return self.client.get(response.json()['status_url']).json()
+
+    def test_phone_numbers_are_normalized(self):
+        """+91, leading 0 and formatting are stripped; anything but 10 digits is rejected"""
+        self.assertEqual(imports.normalize_phone('+91 98765-43210'), '9876543210')
+        self.assertEqual(imports.normalize_phone('098765 43210'), '9876543210')
+        self.assertEqual(imports.normalize_phone('(987) 654-3210'), '9876543210')
+        self.assertIsNone(imports.normalize_phone('12345'))
+        self.assertIsNone(imports.normalize_phone('+44 20 7946 0958'))
+
+    def test_csv_import_skips_existing_and_repeated_phones(self):
+        """Phones already in the shop or earlier in the file are left alone, so re-importing is harmless"""
+        content = (
+            'Name,Phone,Address,Notes\n'
+            'Ramesh Kumar,+91 98765 43210,,New note\n'
+            'Sita,09123456789,"12 MG Road, Pune",\n'
+            'Sita again,91234 56789,,\n'
+            'No Phone,,,\n'
+            ',9000000000,,\n'
+        ).encode()
+        job = self.upload('contacts.csv', content)
+        
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual((job['created'], job['duplicates'], job['error_count']), (1, 2, 2))
+        self.assertEqual([error['row'] for error in job['errors']], [5, 6])
+        self.assertIn('2 already existed', job['message'])
+        
+        self.ramesh.refresh_from_db()
+        self.assertEqual((self.ramesh.name, self.ramesh.notes), ("Ramesh", "Keep me"))
+        sita = Customer.objects.get(user=self.user, name="Sita")
+        self.assertEqual((sita.phone, sita.address, sita.search_key), ('9123456789', '12 MG Road, Pune', 'sita'))
+        self.assertEqual(self.client.get('/api/customers/search/?q=sita').json()['customers'][0]['name'], "Sita")
+        
+        job = self.upload('contacts.csv', content)
+        self.assertEqual((job['created'], job['duplicates']), (0, 3))
+        self.assertEqual(Customer.objects.filter(user=self.user).count(), 2)
+
+    def test_opening_balance_becomes_a_credit_bill(self):
+        """The balance is an unpaid credit sale: counters, ledger, rollup and FIFO payments agree"""
+        job = self.upload('contacts.csv', (
+            'name,phone,opening_balance\n'
+            'Gopal,9811111111,"1,250.50"\n'
+            'Meena,9822222222,\n'
+            'Bad,9833333333,-5\n'
+        ).encode())
+        self.assertEqual((job['created'], job['error_count']), (2, 1))
+        
+        gopal = Customer.objects.get(name="Gopal")
+        self.assertEqual((gopal.credit_amount, gopal.total_purchased, gopal.total_visits), (Decimal("1250.50"), Decimal("1250.50"), 1))
+        sale = Sale.objects.get(customer=gopal)
+        self.assertEqual((sale.payment_method, sale.is_paid, sale.added_to_credit), ('credit', False, True))
+        self.assertEqual(sale.notes, imports.OPENING_BALANCE_NOTE)
+        self.assertFalse(Sale.objects.filter(customer__name="Meena").exists())
+        self.assertEqual(ledger.reconcile_stats(Customer.objects.filter(user=self.user)), 0)
+        
+        rollup = DailySalesRollup.objects.get(user=self.user, date=rollups.local_date(timezone.now()))
+        self.assertEqual((rollup.revenue, rollup.bill_count, rollup.credit_issued), (Decimal("1250.50"), 1, Decimal("1250.50")))
+        
+        ledger.record_payment(self.user, gopal.pk, Decimal("1250.50"))
+        sale.refresh_from_db()
+        self.assertTrue(sale.is_paid)
+
+    def test_vcard_contacts(self):
+        """Folded lines, escaped values and several numbers per contact (mobile preferred) are read"""
+        job = self.upload('contacts.vcf', (
+            'BEGIN:VCARD\r\nVERSION:3.0\r\nN:Sharma;Anil;;;\r\nFN:Anil Sharma\r\n'
+            'TEL;TYPE=HOME:020 2612 3456\r\nTEL;TYPE=CELL:+91 99887 76655\r\n'
+            'ADR;TYPE=HOME:;;Flat 4\\, Shanti Apts;Pune;;411001;\r\n'
+            'NOTE:Prefers UPI\r\n  on weekends\r\nEND:VCARD\r\n'
+            'BEGIN:VCARD\r\nVERSION:2.1\r\nN:Patel;Kiran\r\nTEL;CELL:9876543210\r\nEND:VCARD\r\n'
+            'BEGIN:VCARD\r\nVERSION:3.0\r\nFN:No Number\r\nEMAIL:none@example.com\r\nEND:VCARD\r\n'
+        ).encode())
+        
+        self.assertEqual((job['total_rows'], job['created'], job['duplicates'], job['error_count']), (3, 1, 1, 1))
+        self.assertEqual(job['errors'][0]['row'], 16)
+        anil = Customer.objects.get(name="Anil Sharma")
+        self.assertEqual(anil.phone, '9988776655')
+        self.assertEqual(anil.address, 'Flat 4, Shanti Apts, Pune, 411001')
+        self.assertEqual(anil.notes, 'Prefers UPI on weekends')
+
+    def test_queries_grow_per_chunk_not_per_row(self):
+        """Customers and their opening-balance bills are written a chunk at a time"""
+        rows = [
+            (n + 2, {'name': f'Contact {n}', 'phone': f'90000{n:05d}', 'opening_balance': '100' if n % 2 else ''})
+            for n in range(120)
+        ]
+        # Preload; per chunk a savepoint, customer and sale INSERTs, the rollup update and a
+        # release, plus a savepoint, INSERT and release when the first chunk creates today's rollup
+        with mock.patch.object(imports, 'CHUNK_SIZE', 50):
+            with self.assertNumQueries(19):
+                result = imports.import_customers(self.user, rows, {'name', 'phone', 'opening_balance'})
+        self.assertEqual(result.created, 120)
+        self.assertEqual(Sale.objects.filter(user=self.user).count(), 60)
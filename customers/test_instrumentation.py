@@ -0,0 +1,62 @@
+from django.test import TestCase, Client, override_settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from customers.models import UserProfile
+import json
+import re
+
+User = get_user_model()
+
+class InstrumentationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='timing_user',
+            email='timing@example.com',
+            password='password123',
+            is_verified=True
+        )
+        UserProfile.objects.create(user=self.user, shop_name="Timing Shop")
+        self.client = Client()
+        self.client.login(email='timing@example.com', password='password123')
+
+    def timings(self, response):
+        return {
+            name: (float(dur) if dur else None, desc)
+            for name, dur, desc in re.findall(r'(\w+)(?:;dur=([\d.]+))?(?:;desc="([^"]*)")?', response['Server-Timing'])
+        }
+
+    def test_server_timing_header(self):
+        response = self.client.get('/reports/')
+        timings = self.timings(response)
+        
+        self.assertRegex(timings['db'][1], r'^[1-9]\d* queries$')
+        self.assertGreater(timings['tpl'][0], 0)
+        self.assertEqual(timings['cache'][1], '0 hits, 1 misses')
+        self.assertGreaterEqual(timings['total'][0], timings['db'][0])
+        
+        # Second view of the same report is served from the cache
+        self.assertEqual(self.timings(self.client.get('/reports/'))['cache'][1], '1 hits, 0 misses')
+
+    @override_settings(SLOW_REQUEST_SAMPLE_RATE=1, SLOW_REQUEST_MS=0, SLOW_REQUEST_TOP_QUERIES=3)
+    def test_sampled_slow_request_is_logged_with_call_sites(self):
+        client = Client()
+        client.login(email='timing@example.com', password='password123')
+        
+        with self.assertLogs('customers.slow_requests', 'WARNING') as logs:
+            client.get('/reports/')
+        
+        entry = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((entry['view'], entry['status'], entry['user_id']), ('customers:reports', 200, self.user.pk))
+        self.assertEqual(len(entry['slowest']), 3)
+        self.assertEqual(entry['slowest'], sorted(entry['slowest'], key=lambda s: s['ms'], reverse=True))
+        self.assertTrue(any(s['site'].startswith('customers/') for s in entry['slowest']))
+
+    @override_settings(SLOW_REQUEST_SAMPLE_RATE=0, SLOW_REQUEST_MS=0)
+    def test_unsampled_requests_are_not_logged(self):
+        client = Client()
+        client.login(email='timing@example.com', password='password123')
+        
+        with self.assertNoLogs('customers.slow_requests'):
+            response = client.get('/dashboard/')
+        self.assertIn('total;dur=', response['Server-Timing'])
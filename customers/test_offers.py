@@ -0,0 +1,158 @@
+from django.test import TestCase, Client
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils import timezone
+from customers.models import Product, Sale, SaleOffer, Offer
+from customers.checkout import create_sale
+from customers import offers
+from decimal import Decimal
+import json
+
+User = get_user_model()
+
+class OfferEngineTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='offers_user',
+            email='offers@example.com',
+            password='password123',
+            is_verified=True
+        )
+        self.client = Client()
+        self.client.login(email='offers@example.com', password='password123')
+
+        self.soap = Product.objects.create(
+            user=self.user, name="Soap", price=Decimal("40.00"), stock_quantity=Decimal("50.00")
+        )
+        self.rice = Product.objects.create(
+            user=self.user, name="Rice", price=Decimal("60.00"), stock_quantity=Decimal("50.00")
+        )
+
+    def offer(self, name, offer_type, value=0, products=(), **fields):
+        # Cache versions move when the write commits; TestCase never commits on its own
+        with self.captureOnCommitCallbacks(execute=True):
+            offer = Offer.objects.create(
+                user=self.user, name=name, offer_type=offer_type, discount_value=Decimal(value),
+                end_date=timezone.now() + timezone.timedelta(days=7), **fields
+            )
+            offer.applicable_products.set(products)
+        return offer
+
+    def test_discounts_per_offer_type(self):
+        """Flat, percentage and BOGO offers are worked out on the lines they cover"""
+        flat = self.offer("Flat 50", 'flat', 50)
+        soap_pct = self.offer("Soap 10%", 'percentage', 10, products=[self.soap])
+        soap_bogo = self.offer("Soap 2+1", 'bogo', buy_quantity=2, get_quantity=1, products=[self.soap])
+        rice_pct = self.offer("Rice 5%", 'percentage', 5, products=[self.rice], min_purchase_amount=Decimal("1000"))
+
+        evaluation = offers.evaluate(offers.engine_for(self.user), [
+            (self.soap.id, Decimal("7"), Decimal("40.00")),
+            (self.rice.id, Decimal("1"), Decimal("60.00")),
+            (None, Decimal("1"), Decimal("15.00")),
+        ])
+
+        self.assertEqual(evaluation.subtotal, Decimal("355.00"))
+        self.assertEqual(evaluation.discounts, {
+            flat.id: Decimal("50.00"),
+            soap_pct.id: Decimal("28.00"),
+            soap_bogo.id: Decimal("80.00"),
+        })
+        self.assertNotIn(rice_pct.id, evaluation.discounts)
+        self.assertEqual(evaluation.best, (soap_bogo.id, Decimal("80.00")))
+
+    def test_flat_discount_never_exceeds_covered_lines(self):
+        """A flat offer on one product is capped at what that product costs on the bill"""
+        soap_flat = self.offer("Soap 100 off", 'flat', 100, products=[self.soap])
+        evaluation = offers.evaluate(offers.engine_for(self.user), [
+            (self.soap.id, Decimal("1"), Decimal("40.00")),
+            (self.rice.id, Decimal("2"), Decimal("60.00")),
+        ])
+        self.assertEqual(evaluation.discounts, {soap_flat.id: Decimal("40.00")})
+
+    def test_engine_is_cached_until_offers_change(self):
+        """A warm engine evaluates without queries; editing an offer recompiles it"""
+        offer = self.offer("Ten", 'flat', 10)
+        offers.engine_for(self.user)
+
+        with self.assertNumQueries(0):
+            engine = offers.engine_for(self.user)
+            offers.evaluate(engine, [(self.soap.id, Decimal("1"), Decimal("40.00"))])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            offer.discount_value = Decimal("15.00")
+            offer.save()
+        evaluation = offers.evaluate(offers.engine_for(self.user), [(self.soap.id, Decimal("1"), Decimal("40.00"))])
+        self.assertEqual(evaluation.discounts, {offer.id: Decimal("15.00")})
+
+    def test_checkout_computes_the_discount(self):
+        """The bill's discount comes from the engine, whatever the page sends"""
+        offer = self.offer("Soap 10%", 'percentage', 10, products=[self.soap])
+        response = self.client.post('/billing/', json.dumps({
+            'offer_id': offer.id,
+            'discount_amount': 500,
+            'items': [
+                {'product_id': self.soap.id, 'quantity': 2, 'price': 40},
+                {'product_id': self.rice.id, 'quantity': 1, 'price': 60},
+            ],
+        }), content_type='application/json')
+        self.assertTrue(response.json()['success'])
+
+        sale = Sale.objects.get(pk=response.json()['sale_id'])
+        self.assertEqual(sale.discount_amount, Decimal("8.00"))
+        self.assertEqual(sale.total_amount, Decimal("132.00"))
+        self.assertEqual(SaleOffer.objects.get(sale=sale).discount_amount, Decimal("8.00"))
+
+    def test_checkout_falls_back_when_the_offer_does_not_apply(self):
+        """A bill the chosen offer does not qualify for is saved with the best offer that does"""
+        big = self.offer("Big bills", 'flat', 50, min_purchase_amount=Decimal("500"))
+        sale = create_sale(self.user, [{'product_id': self.soap.id, 'quantity': 1, 'price': 40}], offer_id=big.id)
+        self.assertEqual((sale.applied_offer_id, sale.discount_amount, sale.total_amount), (None, 0, Decimal("40.00")))
+        self.assertFalse(SaleOffer.objects.exists())
+        self.soap.refresh_from_db()
+        self.assertEqual(self.soap.stock_quantity, Decimal("49.00"))
+
+        small = self.offer("Five off", 'flat', 5)
+        sale = create_sale(self.user, [{'product_id': self.soap.id, 'quantity': 1, 'price': 40}], offer_id=big.id)
+        self.assertEqual((sale.applied_offer_id, sale.discount_amount), (small.id, Decimal("5.00")))
+        self.assertEqual(SaleOffer.objects.get(sale=sale).offer, small)
+
+    def test_offer_ending_between_preview_and_save(self):
+        """The page previewed an offer that has ended by the time the bill is saved"""
+        bill = {'items': [{'product_id': self.soap.id, 'quantity': 2, 'price': 40}]}
+        offer = self.offer("Soap 10%", 'percentage', 10, products=[self.soap])
+        preview = self.client.post('/api/billing/offers/preview/', json.dumps(bill), content_type='application/json')
+        self.assertEqual(preview.json()['discounts'], {str(offer.id): '8.00'})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            offer.end_date = timezone.now() - timezone.timedelta(minutes=1)
+            offer.save()
+
+        response = self.client.post('/billing/', json.dumps({**bill, 'offer_id': offer.id}), content_type='application/json')
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertIsNone(data['offer_id'])
+        self.assertEqual(Decimal(data['discount_amount']), 0)
+        self.assertEqual(Decimal(data['total_amount']), Decimal("80.00"))
+        self.assertFalse(SaleOffer.objects.exists())
+
+    def test_preview_api_matches_checkout(self):
+        """The billing screen previews every qualifying offer and the best one"""
+        flat = self.offer("Flat 5", 'flat', 5)
+        bogo = self.offer("Soap 1+1", 'bogo', buy_quantity=1, get_quantity=1, products=[self.soap])
+        self.offer("Rice only", 'percentage', 10, products=[self.rice])
+
+        response = self.client.post('/api/billing/offers/preview/', json.dumps({
+            'items': [
+                {'product_id': self.soap.id, 'quantity': 3, 'price': 40},
+                {'product_id': None, 'custom_name': 'Gift wrap', 'custom_price': 10, 'quantity': 1},
+            ],
+        }), content_type='application/json')
+
+        data = response.json()
+        self.assertEqual(data['subtotal'], '130.00')
+        self.assertEqual(data['discounts'], {str(flat.id): '5.00', str(bogo.id): '40.00'})
+        self.assertEqual(data['best'], {'offer_id': bogo.id, 'discount': '40.00'})
+
+        bad = self.client.post('/api/billing/offers/preview/', 'nope', content_type='application/json')
+        self.assertEqual(bad.status_code, 400)
@@ -0,0 +1,97 @@
+from django.test import TestCase, override_settings
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.utils import timezone
+from customers.models import EmailLog, QueuedEmail
+from customers.views import EmailService
+from customers import outbox
+from io import StringIO
+
+
+class CountingBackend(EmailBackend):
+    opened = 0
+
+    def open(self):
+        CountingBackend.opened += 1
+        return super().open()
+
+
+class FailingBackend(EmailBackend):
+    def send_messages(self, messages):
+        raise ConnectionError('SMTP unavailable')
+
+
+class EmailOutboxTest(TestCase):
+    def test_otp_is_queued_then_sent_by_worker(self):
+        """The request only queues; the worker sends and marks the log as sent"""
+        success, _ = EmailService.send_otp_email('shop@example.com', '123456', purpose='signup')
+        self.assertTrue(success)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertFalse(EmailLog.objects.get().is_sent)
+        
+        call_command('send_queued_emails', stdout=StringIO())
+        
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('123456', mail.outbox[0].body)
+        self.assertTrue(EmailLog.objects.get().is_sent)
+        queued = QueuedEmail.objects.get()
+        self.assertEqual(queued.status, 'sent')
+        self.assertEqual(queued.html_body, '')
+
+    @override_settings(EMAIL_BACKEND='customers.test_outbox.CountingBackend')
+    def test_batch_shares_one_connection(self):
+        CountingBackend.opened = 0
+        for i in range(3):
+            EmailService.send_otp_email(f'user{i}@example.com', '111111', purpose='login')
+        
+        call_command('send_queued_emails', stdout=StringIO())
+        
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(CountingBackend.opened, 1)
+
+    @override_settings(EMAIL_BACKEND='customers.test_outbox.FailingBackend')
+    def test_failures_are_retried_with_backoff(self):
+        EmailService.send_otp_email('shop@example.com', '123456', purpose='reset')
+        
+        call_command('send_queued_emails', stdout=StringIO())
+        
+        queued = QueuedEmail.objects.get()
+        self.assertEqual((queued.status, queued.attempts), ('pending', 1))
+        self.assertGreater(queued.next_attempt_at, timezone.now())
+        self.assertIn('SMTP unavailable', EmailLog.objects.get().error_message)
+        
+        # Not due yet, so a second run leaves it alone
+        call_command('send_queued_emails', stdout=StringIO())
+        queued.refresh_from_db()
+        self.assertEqual(queued.attempts, 1)
+
+    @override_settings(EMAIL_BACKEND='customers.test_outbox.FailingBackend')
+    def test_given_up_emails_drop_their_body(self):
+        EmailService.send_otp_email('shop@example.com', '123456', purpose='reset')
+        QueuedEmail.objects.update(attempts=outbox.MAX_ATTEMPTS - 1)
+        
+        call_command('send_queued_emails', stdout=StringIO())
+        
+        queued = QueuedEmail.objects.get()
+        self.assertEqual(queued.status, 'failed')
+        self.assertNotIn('123456', queued.html_body)
+
+    def test_finished_emails_are_pruned_after_retention(self):
+        """The worker deletes old sent and failed rows; pending ones and the logs stay"""
+        for to in ('old@example.com', 'new@example.com', 'pending@example.com'):
+            EmailService.send_otp_email(to, '123456', purpose='login')
+        QueuedEmail.objects.exclude(to='pending@example.com').update(status='sent')
+        QueuedEmail.objects.filter(to__in=['old@example.com', 'pending@example.com']).update(
+            created_at=timezone.now() - outbox.RETENTION - timezone.timedelta(hours=1)
+        )
+        QueuedEmail.objects.filter(to='pending@example.com').update(next_attempt_at=timezone.now() + timezone.timedelta(hours=1))
+        
+        out = StringIO()
+        call_command('send_queued_emails', stdout=out)
+        
+        self.assertIn('Pruned 1 finished emails', out.getvalue())
+        self.assertEqual(
+            sorted(QueuedEmail.objects.values_list('to', flat=True)), ['new@example.com', 'pending@example.com']
+        )
+        self.assertEqual(EmailLog.objects.count(), 3)
@@ -0,0 +1,110 @@
+from django.test import TestCase, override_settings
+from django.contrib.auth import authenticate, get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.utils import timezone
+from customers.models import (
+    Customer, Product, Sale, SaleItem, Offer, CreditPayment, CreditPaymentAllocation,
+    ShopPhoto, UserActivity, UserProfile, ImportJob, PurgeCheckpoint,
+)
+from customers import ledger, purge, seeding
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock
+import itertools
+import shutil
+import tempfile
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class AccountPurgeTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def shop(self, index, requested_days_ago=None):
+        user = seeding.shop_user(index)
+        seeding.seed_shop(user, products=30, customers=20, sales=150, offers=3, days=30,
+                          seed=index, end_date=date(2025, 11, 30), chunk_size=50)
+
+        debtor = Customer.objects.filter(user=user, credit_amount__gt=0).first()
+        ledger.record_payment(user, debtor.pk, debtor.credit_amount)
+        ShopPhoto.objects.create(user=user, image=SimpleUploadedFile(f'shop{index}.jpg', b'photo'))
+        UserActivity.objects.create(user=user, date=date(2025, 11, 30), total_active_seconds=60)
+        ImportJob.objects.create(user=user, kind='products', file=SimpleUploadedFile(f'items{index}.csv', b'name\n'))
+
+        if requested_days_ago is not None:
+            user.is_pending_deletion = True
+            user.deletion_requested_at = timezone.now() - timedelta(days=requested_days_ago)
+            user.save()
+        return user
+
+    def owned_rows(self, user):
+        return sum(purge.count(user).values())
+
+    def test_purge_empties_every_table_of_the_account(self):
+        """Expired accounts go table by table; recent requests and other shops are untouched"""
+        expired = self.shop(1, requested_days_ago=31)
+        recent = self.shop(2, requested_days_ago=5)
+        photo = ShopPhoto.objects.get(user=expired).image
+        storage, photo_name = photo.storage, photo.name
+        kept_rows = self.owned_rows(recent)
+
+        out = StringIO()
+        call_command('delete_expired_accounts', '--batch-size', '40', stdout=out)
+
+        self.assertIn('Deleted 1 of 1 expired accounts', out.getvalue())
+        self.assertIn('rows/s', out.getvalue())
+        self.assertFalse(User.objects.filter(pk=expired.pk).exists())
+        for model in (Customer, Product, Sale, Offer, CreditPayment, ShopPhoto, UserActivity, UserProfile, ImportJob):
+            self.assertFalse(model.objects.filter(user_id=expired.pk).exists(), model.__name__)
+        self.assertFalse(SaleItem.objects.filter(sale__user_id=expired.pk).exists())
+        self.assertFalse(storage.exists(photo_name))
+        self.assertFalse(PurgeCheckpoint.objects.exists())
+
+        self.assertEqual(self.owned_rows(recent), kept_rows)
+        self.assertTrue(CreditPaymentAllocation.objects.filter(payment__user=recent).exists())
+
+    def test_time_budget_stops_and_the_next_run_resumes(self):
+        """A run that runs out of time leaves a checkpoint and a locked account; the next run finishes"""
+        user = self.shop(1, requested_days_ago=40)
+        total = self.owned_rows(user)
+        self.assertIsNotNone(authenticate(email=user.email, password='seed-password'))
+
+        # Every clock reading advances one second: the budget allows a handful of batches
+        with mock.patch.object(purge.time, 'monotonic', side_effect=itertools.count()):
+            progress = purge.purge(user, batch_size=25, deadline=12)
+
+        self.assertFalse(progress.done)
+        self.assertTrue(0 < progress.rows < total)
+        checkpoint = PurgeCheckpoint.objects.get(user=user)
+        self.assertEqual((checkpoint.step, checkpoint.rows_deleted), (progress.step, progress.rows))
+        self.assertEqual(self.owned_rows(user), total - progress.rows)
+        first_run = progress.rows
+
+        # The owner can no longer log in, which would cancel the deletion half way
+        self.assertIsNone(authenticate(email=user.email, password='seed-password'))
+
+        progress = purge.purge(user, batch_size=25)
+        self.assertTrue(progress.done)
+        self.assertEqual(progress.rows, total - first_run + 1)
+        self.assertFalse(User.objects.filter(pk=user.pk).exists())
+
+    def test_dry_run_only_counts(self):
+        """--dry-run reports rows per table and deletes nothing"""
+        user = self.shop(1, requested_days_ago=31)
+        total = self.owned_rows(user)
+
+        out = StringIO()
+        call_command('delete_expired_accounts', '--dry-run', stdout=out)
+
+        self.assertIn(user.email, out.getvalue())
+        self.assertIn(f'{total} rows', out.getvalue())
+        self.assertIn('customers.sale: 150', out.getvalue())
+        self.assertEqual(self.owned_rows(user), total)
+        self.assertTrue(User.objects.get(pk=user.pk).is_active)
@@ -0,0 +1,84 @@
+from django.test import TestCase, Client
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.utils import timezone
+from customers.models import Customer, Product, Sale, Offer, DailySalesRollup, CreditPayment
+from decimal import Decimal
+from io import StringIO
+import json
+
+User = get_user_model()
+
+class DailySalesRollupTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='rollup_user',
+            email='rollup@example.com',
+            password='password123',
+            is_verified=True
+        )
+        self.client = Client()
+        self.client.login(email='rollup@example.com', password='password123')
+        
+        self.customer = Customer.objects.create(user=self.user, name="Regular", phone="9000000000")
+        self.product = Product.objects.create(
+            user=self.user,
+            name="Atta",
+            category="grocery",
+            price=Decimal("50.00"),
+            stock_quantity=Decimal("100.00")
+        )
+
+    def bill(self, quantity, is_paid=True, offer=None):
+        response = self.client.post('/billing/', json.dumps({
+            'customer_id': self.customer.id,
+            'is_paid': is_paid,
+            'offer_id': offer and offer.id,
+            'items': [{'product_id': self.product.id, 'quantity': quantity, 'price': 50}],
+        }), content_type='application/json')
+        self.assertTrue(response.json()['success'])
+        return response.json()['sale_id']
+
+    def test_billing_payment_and_delete_update_rollup(self):
+        """Billing, credit payments and sale deletes keep today's rollup row current"""
+        offer = Offer.objects.create(
+            user=self.user, name="Twenty off", offer_type='flat', discount_value=Decimal("20.00"),
+            end_date=timezone.now() + timezone.timedelta(days=1)
+        )
+        self.bill(2)
+        credit_sale_id = self.bill(4, is_paid=False, offer=offer)
+        self.client.post(f'/customers/{self.customer.id}/pay-credit/', {'amount': '80'})
+        
+        rollup = DailySalesRollup.objects.get(user=self.user, date=timezone.localdate())
+        self.assertEqual(rollup.revenue, Decimal("280.00"))
+        self.assertEqual(rollup.bill_count, 2)
+        self.assertEqual(rollup.credit_issued, Decimal("180.00"))
+        self.assertEqual(rollup.credit_collected, Decimal("80.00"))
+        self.assertEqual(rollup.discount, Decimal("20.00"))
+        
+        self.client.post(f'/sales/{credit_sale_id}/delete/')
+        rollup.refresh_from_db()
+        self.assertEqual(rollup.revenue, Decimal("100.00"))
+        self.assertEqual(rollup.bill_count, 1)
+        self.assertEqual(rollup.credit_issued, Decimal("0.00"))
+        # The payment only settled the deleted bill, so it is refunded with it
+        self.assertEqual(rollup.credit_collected, Decimal("0.00"))
+        self.assertFalse(CreditPayment.objects.filter(customer=self.customer).exists())
+
+    def test_rebuild_command_matches_incremental_totals(self):
+        """Rebuilding from sales reproduces the incrementally maintained rows"""
+        self.bill(1)
+        self.bill(3, is_paid=False)
+        self.client.post(f'/customers/{self.customer.id}/pay-credit/', {'amount': '25'})
+        expected = list(DailySalesRollup.objects.values('date', 'revenue', 'bill_count', 'credit_issued', 'credit_collected'))
+        
+        DailySalesRollup.objects.filter(user=self.user).update(revenue=0, bill_count=0, credit_collected=0)
+        call_command('rebuild_sales_rollups', user='rollup@example.com', stdout=StringIO())
+        
+        self.assertEqual(
+            list(DailySalesRollup.objects.values('date', 'revenue', 'bill_count', 'credit_issued', 'credit_collected')),
+            expected
+        )
+        self.assertEqual(Sale.objects.count(), 2)
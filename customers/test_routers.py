@@ -0,0 +1,65 @@
+from django.test import TestCase, Client, RequestFactory
+from django.http import HttpResponse
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from customers.models import Product, UserProfile
+from customers.middleware import ReadReplicaMiddleware
+from customers.routers import ReadReplicaRouter, read_replica, replica_available, using_replica
+from unittest import mock
+
+User = get_user_model()
+
+class ReadReplicaRoutingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='replica_user',
+            email='replica@example.com',
+            password='password123',
+            is_verified=True
+        )
+        UserProfile.objects.create(user=self.user, shop_name="Replica Shop")
+        self.client = Client()
+        self.client.login(email='replica@example.com', password='password123')
+        self.router = ReadReplicaRouter()
+
+    def test_reads_inside_read_replica_use_the_replica(self):
+        with mock.patch('customers.routers.replica_available', return_value=True):
+            self.assertEqual(self.router.db_for_read(Product), 'default')
+            with read_replica():
+                self.assertEqual(self.router.db_for_read(Product), 'replica')
+                self.assertEqual(self.router.db_for_write(Product), 'default')
+            self.assertEqual(self.router.db_for_read(Product), 'default')
+
+    def test_streamed_content_is_read_from_the_replica(self):
+        def rows():
+            for _ in range(3):
+                yield self.router.db_for_read(Product)
+        
+        with mock.patch('customers.routers.replica_available', return_value=True):
+            self.assertEqual(list(using_replica(rows())), ['replica'] * 3)
+            self.assertEqual(self.router.db_for_read(Product), 'default')
+
+    def test_test_mirror_falls_back_to_default(self):
+        """The replica mirrors the test database, so routed views still see test data"""
+        self.assertFalse(replica_available())
+        Product.objects.create(user=self.user, name='Tea', category='grocery', price=10)
+        
+        response = self.client.get('/products/export/')
+        
+        self.assertIn(b'Tea', b''.join(response.streaming_content))
+
+    def test_middleware_leaves_calling_the_view_to_django(self):
+        """Listed views run the rest of the request under the replica; others and 404s do not"""
+        seen = []
+        
+        def get_response(request):
+            seen.append(self.router.db_for_read(Product))
+            return HttpResponse()
+        
+        middleware = ReadReplicaMiddleware(get_response)
+        self.assertFalse(hasattr(middleware, 'process_view'))
+        with mock.patch('customers.routers.replica_available', return_value=True):
+            for path in ('/reports/', '/products/', '/no-such-page/'):
+                middleware(RequestFactory().get(path))
+        self.assertEqual(seen, ['replica', 'default', 'default'])
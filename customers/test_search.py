@@ -0,0 +1,67 @@
+from django.test import TestCase, Client
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from customers.models import Customer, Product, UserProfile
+from customers import search
+from decimal import Decimal
+
+User = get_user_model()
+
+class SearchEngineTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        search.clear()
+        self.user = User.objects.create_user(
+            username='search_user',
+            email='search@example.com',
+            password='password123',
+            is_verified=True
+        )
+        UserProfile.objects.create(user=self.user, shop_name="Search Shop")
+        self.client = Client()
+        self.client.login(email='search@example.com', password='password123')
+
+    def test_normalize_folds_hindi_and_spelling_variants(self):
+        self.assertEqual(search.normalize("राम शर्मा"), search.normalize("Raam Sharma"))
+        self.assertEqual(search.normalize("Café  Latte"), "cafe late")
+
+    def test_customers_ranked_phone_prefix_substring(self):
+        """Exact phone match first, then name prefix, then substring"""
+        Customer.objects.create(user=self.user, name="Shri Ram Traders", phone="9000000001")
+        Customer.objects.create(user=self.user, name="Ramesh", phone="9000000002")
+        Customer.objects.create(user=self.user, name="Suresh", phone="98765 43210")
+        
+        names = [c['name'] for c in self.client.get('/api/customers/search/', {'q': 'ram'}).json()['customers']]
+        self.assertEqual(names, ["Ramesh", "Shri Ram Traders"])
+        
+        names = [c['name'] for c in self.client.get('/api/customers/search/', {'q': '9876543210'}).json()['customers']]
+        self.assertEqual(names, ["Suresh"])
+        
+        names = [c['name'] for c in self.client.get('/api/customers/search/', {'q': 'राम'}).json()['customers']]
+        self.assertEqual(names, ["Ramesh", "Shri Ram Traders"])
+
+    def test_index_follows_edits_and_soft_deletes(self):
+        """Renamed and deactivated products are reflected without a rebuild"""
+        product = Product.objects.create(user=self.user, name="Basmati Rice", category="grocery", price=Decimal("90.00"))
+        self.assertEqual([p.pk for p in search.search_products(self.user, 'basmati')], [product.pk])
+        
+        product.name = "Sona Masoori Rice"
+        product.save()
+        self.assertEqual(search.search_products(self.user, 'basmati'), [])
+        self.assertEqual([p.pk for p in search.search_products(self.user, 'masoori')], [product.pk])
+        
+        product.is_active = False
+        product.save()
+        self.assertEqual(search.search_products(self.user, 'masoori'), [])
+
+    def test_short_queries_use_prefix(self):
+        Product.objects.create(user=self.user, name="Dal", category="grocery", price=Decimal("100.00"))
+        Product.objects.create(user=self.user, name="Moong Dal", category="grocery", price=Decimal("110.00"))
+        self.assertEqual([p.name for p in search.search_products(self.user, 'da')], ["Dal"])
+
+    def test_short_digit_queries_match_phone_prefix(self):
+        """One or two digits look up the start of phone numbers, as before the search key"""
+        Customer.objects.create(user=self.user, name="Anil", phone="9812345678")
+        Customer.objects.create(user=self.user, name="Babu", phone="7012345678")
+        self.assertEqual([c.name for c in search.search_customers(self.user, '98')], ["Anil"])
+        self.assertEqual([c.name for c in search.search_customers(self.user, '7')], ["Babu"])
@@ -23,6 +23,7 @@ urlpatterns = [
     # User
     path('logout/', views.LogoutView.as_view(), name='logout'),
     path('dashboard/', views.DashboardView.as_view(), name='dashboard'),
+    path('dashboard/widgets/<slug:name>/', views.DashboardWidgetView.as_view(), name='dashboard-widget'),
     path('profile/', views.ProfileView.as_view(), name='profile'),
     path('profile/edit/', views.ProfileEditView.as_view(), name='profile-edit'),
     path('change-password/', views.ChangePasswordView.as_view(), name='change-password'),
@@ -35,6 +36,7 @@ urlpatterns = [
     # Customers
     path('customers/', views.CustomerListView.as_view(), name='customer-list'),
     path('customers/create/', views.CustomerCreateView.as_view(), name='customer-create'),
+    path('customers/import/', views.CustomerImportView.as_view(), name='customer-import'),
     path('customers/<int:pk>/', views.CustomerDetailView.as_view(), name='customer-detail'),
     path('customers/<int:pk>/edit/', views.CustomerEditView.as_view(), name='customer-edit'),
     path('customers/<int:pk>/delete/', views.CustomerDeleteView.as_view(), name='customer-delete'),
@@ -48,6 +50,7 @@ urlpatterns = [
     path('products/<int:pk>/edit/', views.ProductEditView.as_view(), name='product-edit'),
     path('products/<int:pk>/delete/', views.ProductDeleteView.as_view(), name='product-delete'),
     path('products/import/', views.ProductImportView.as_view(), name='product-import'),
+    path('imports/<int:pk>/', views.ImportStatusView.as_view(), name='import-status'),
     path('products/export/', views.ProductExportView.as_view(), name='product-export'),
     path('products/template/', views.ProductTemplateView.as_view(), name='product-template'),
     # Offers
@@ -62,6 +65,7 @@ urlpatterns = [
     path('sales/download/', views.SalesHistoryView.as_view(), name='sales-download'),
     path('sales/<int:pk>/details/', views.SaleDetailView.as_view(), name='sale-detail'),
     path('sales/<int:pk>/delete/', views.SaleDeleteView.as_view(), name='sale-delete'),
+    path('sales/void-day/', views.SaleVoidDayView.as_view(), name='sale-void-day'),
     path('sales/<int:pk>/print/', views.SalePrintView.as_view(), name='sale-print'),
     
     # Reports
@@ -70,6 +74,8 @@ urlpatterns = [
     # API Endpoints
     path('api/products/search/', views.ProductSearchAPI.as_view(), name='api-product-search'),
     path('api/customers/search/', views.CustomerSearchAPI.as_view(), name='api-customer-search'),
+    path('api/billing/catalog/', views.BillingCatalogAPI.as_view(), name='api-billing-catalog'),
+    path('api/billing/offers/preview/', views.BillingOfferPreviewAPI.as_view(), name='api-billing-offer-preview'),
     
     # Legal Pages
     path('terms/', views.TermsOfServiceView.as_view(), name='terms_of_service'),
@@ -1,7 +1,6 @@
 from django.shortcuts import render, redirect
 from django.views import View
 from django.contrib.auth import authenticate, login, logout, get_user_model
-from django.core.mail import EmailMessage
 from django.contrib import messages
 from django.utils import timezone
 from django.conf import settings
@@ -13,7 +12,8 @@ from .forms import (
     SignupForm, LoginForm, OTPVerificationForm,
     PasswordResetForm, SetNewPasswordForm, CreatePasswordForm, OfferForm
 )
-from .models import OTPVerification, EmailLog, CustomUser
+from .models import OTPVerification, CustomUser
+from . import outbox
 
 User = get_user_model()
 
@@ -24,7 +24,7 @@ class EmailService:
     @staticmethod
     def send_otp_email(email, otp_code, purpose='signup'):
         """
-        Send OTP via email
+        Queue an OTP email (sent asynchronously by the outbox worker)
         Args:
             email: recipient email
             otp_code: 6-digit OTP
@@ -79,33 +79,11 @@ class EmailService:
         </html>
         """
         
+        # Queue the email; the send_queued_emails worker delivers it and updates EmailLog
         try:
-            email_msg = EmailMessage(
-                subject=subject,
-                body=html_message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                to=[email]
-            )
-            email_msg.content_subtype = 'html'
-            email_msg.send(fail_silently=False)
-            
-            # Log the email
-            EmailLog.objects.create(
-                email=email,
-                subject=subject,
-                purpose=purpose,
-                is_sent=True
-            )
+            outbox.enqueue(email, subject, html_message, purpose)
             return True, 'OTP sent successfully'
         except Exception as e:
-            # Log the error
-            EmailLog.objects.create(
-                email=email,
-                subject=subject,
-                purpose=purpose,
-                is_sent=False,
-                error_message=str(e)
-            )
             return False, f'Error sending email: {str(e)}'
 
 
@@ -691,17 +669,17 @@ class LogoutView(View):
 
 # Import business logic views
 from .app_views import (
-    DashboardView, ProfileView, ChangePasswordView, SettingsView,
+    DashboardView, DashboardWidgetView, ProfileView, ChangePasswordView, SettingsView,
     UpdateNotificationsView, DeleteAccountConfirmView, RequestAccountDeletionView, CancelAccountDeletionView,
     BrandingView,
     CustomerListView, CustomerCreateView, CustomerDetailView, CustomerEditView, CustomerDeleteView,
-    CreditPaymentView,
+    CustomerImportView, CreditPaymentView,
     ProductListView, ProductCreateView, ProductDetailView, ProductDataView, ProductEditView, ProductDeleteView,
-    ProductImportView, ProductExportView, ProductTemplateView,
-    BillingView, SalesHistoryView, SaleDetailView, SaleDeleteView, SalePrintView,
+    ProductImportView, ImportStatusView, ProductExportView, ProductTemplateView,
+    BillingView, SalesHistoryView, SaleDetailView, SaleDeleteView, SaleVoidDayView, SalePrintView,
     ReportsView,
     ProfileEditView,
-    ProductSearchAPI, CustomerSearchAPI,
+    ProductSearchAPI, CustomerSearchAPI, BillingCatalogAPI, BillingOfferPreviewAPI,
     OfferListView, OfferCreateView, OfferEditView, OfferDeleteView,
     TermsOfServiceView, PrivacyPolicyView
 )
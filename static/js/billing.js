@@ -7,16 +7,67 @@ let offers = [];
 let selectedCustomer = null;
 let currentDiscount = 0;
 let selectedOfferId = null;
+let offerDiscounts = {};  // offer id -> discount on the current bill, worked out by the server
+let offerPreviewTimer = null;
+let offerPreviewSeq = 0;
 
 // Initialize data from global config
 function initializeBillingData() {
     if (window.billingConfig) {
-        products = JSON.parse(window.billingConfig.productsJson);
-        customers = JSON.parse(window.billingConfig.customersJson);
         offers = JSON.parse(window.billingConfig.offersJson);
     }
 }
 
+// Keep a local copy of products and customers and fetch only what changed since it
+async function syncCatalog() {
+    if (!window.billingConfig || !window.billingConfig.catalogUrl) return;
+
+    const storageKey = window.billingConfig.catalogStorageKey;
+    let local = null;
+    try {
+        local = JSON.parse(localStorage.getItem(storageKey));
+    } catch (error) {
+        local = null;
+    }
+
+    if (local && local.products && local.customers) {
+        products = local.products;
+        customers = local.customers;
+    }
+
+    try {
+        let url = window.billingConfig.catalogUrl;
+        if (local && local.version) {
+            url += '?since=' + encodeURIComponent(local.version);
+        }
+        const response = await fetch(url, { credentials: 'same-origin' });
+        if (!response.ok) return;
+        const data = await response.json();
+
+        if (data.full) {
+            products = data.products;
+            customers = data.customers;
+        } else {
+            const merge = (rows, changed, deletedIds) => {
+                const byId = new Map(rows.map(row => [row.id, row]));
+                changed.forEach(row => byId.set(row.id, row));
+                deletedIds.forEach(id => byId.delete(id));
+                return Array.from(byId.values());
+            };
+            products = merge(products, data.products, data.deleted_products);
+            customers = merge(customers, data.customers, data.deleted_customers);
+        }
+
+        try {
+            localStorage.setItem(storageKey, JSON.stringify({ version: data.version, products, customers }));
+        } catch (error) {
+            // Storage full or disabled; the in-memory copy is still current
+        }
+    } catch (error) {
+        // Offline: keep working from the stored copy
+    }
+}
+
 // Customer search and selection
 function searchCustomers() {
     const searchTerm = document.getElementById('customerSearchInput').value.toLowerCase();
@@ -232,6 +283,10 @@ function updateBillDisplay() {
         document.getElementById('itemCount').textContent = '0';
         document.getElementById('totalQty').textContent = '0';
         document.getElementById('printBillBtn').disabled = true;
+        clearTimeout(offerPreviewTimer);
+        offerPreviewSeq++;
+        offerDiscounts = {};
+        renderOfferTotals(0);
         return;
     }
 
@@ -349,17 +404,46 @@ function updateBillDisplay() {
     const total = billItems.reduce((sum, item) => sum + (item.price * item.quantity), 0);
     const totalQty = billItems.reduce((sum, item) => sum + item.quantity, 0);
 
-    // Calculate Discount
-    updateOfferDropdown(total);
-    currentDiscount = calculateDiscount(total);
+    // Discounts shown are the last server preview until the new one arrives
+    renderOfferTotals(total);
+    scheduleOfferPreview();
+
+    document.getElementById('itemCount').textContent = billItems.length;
+    document.getElementById('totalQty').textContent = totalQty.toFixed(2);
+    document.getElementById('printBillBtn').disabled = false;
+}
+
+function renderOfferTotals(total) {
+    updateOfferDropdown();
+    currentDiscount = calculateDiscount();
     const finalTotal = Math.max(0, total - currentDiscount);
 
     document.getElementById('subtotal').textContent = '₹' + total.toFixed(2);
     document.getElementById('discountAmount').textContent = '-₹' + currentDiscount.toFixed(2);
     document.getElementById('totalAmount').textContent = '₹' + finalTotal.toFixed(2);
-    document.getElementById('itemCount').textContent = billItems.length;
-    document.getElementById('totalQty').textContent = totalQty.toFixed(2);
-    document.getElementById('printBillBtn').disabled = false;
+}
+
+// Bill lines in the shape the billing and offer preview endpoints expect
+function billPayloadItems() {
+    return billItems.map(item => {
+        if (item.type === 'custom') {
+            // For custom items, we'll create a temporary product on the backend
+            return {
+                product_id: null,
+                custom_name: item.name,
+                custom_description: item.description || '',
+                custom_price: item.price,
+                quantity: item.quantity
+            };
+        } else {
+            // For regular products/services
+            return {
+                product_id: item.id,
+                quantity: item.quantity,
+                price: item.price
+            };
+        }
+    });
 }
 
 // Update quantity with service support
@@ -471,26 +555,7 @@ async function saveSale() {
         is_paid: isPaid,
         notes: notes,
         offer_id: selectedOfferId,
-        discount_amount: currentDiscount,
-        items: billItems.map(item => {
-            if (item.type === 'custom') {
-                // For custom items, we'll create a temporary product on the backend
-                return {
-                    product_id: null,
-                    custom_name: item.name,
-                    custom_description: item.description || '',
-                    custom_price: item.price,
-                    quantity: item.quantity
-                };
-            } else {
-                // For regular products/services
-                return {
-                    product_id: item.id,
-                    quantity: item.quantity,
-                    price: item.price
-                };
-            }
-        })
+        items: billPayloadItems()
     };
 
     try {
@@ -512,6 +577,7 @@ async function saveSale() {
             lastSaleId = data.sale_id;
             const totalAmount = parseFloat(data.total_amount).toFixed(2);
             showSuccessActions(data.sale_id, totalAmount);
+            showAppliedDiscount(data, totalAmount);
 
             // Update product stock in local data for products only
             billItems.forEach(item => {
@@ -522,6 +588,7 @@ async function saveSale() {
                     }
                 }
             });
+            syncCatalog();
         } else {
             showNotification(data.message || 'Error saving sale!', 'error');
         }
@@ -533,6 +600,22 @@ async function saveSale() {
     }
 }
 
+// The server prices the offer at save time; it may have ended since the last preview
+function showAppliedDiscount(data, totalAmount) {
+    const discount = parseFloat(data.discount_amount);
+    document.getElementById('discountAmount').textContent = '-₹' + discount.toFixed(2);
+    document.getElementById('totalAmount').textContent = '₹' + totalAmount;
+
+    if (String(data.offer_id || '') !== String(selectedOfferId || '')) {
+        selectedOfferId = data.offer_id;
+        document.getElementById('offerSelect').value = data.offer_id || '';
+        const message = data.offer_id
+            ? `The chosen offer no longer applied; saved with the best available offer (₹${discount.toFixed(2)} off).`
+            : 'The chosen offer no longer applied; saved without a discount.';
+        showNotification(message, 'warning');
+    }
+}
+
 // Show success actions in summary card
 function showSuccessActions(saleId, amount) {
     document.getElementById('saleIdDisplay').innerHTML = `Total Amount: <strong>₹${amount}</strong>`;
@@ -975,74 +1058,73 @@ function handleOfferChange() {
     updateBillDisplay();
 }
 
-function updateOfferDropdown(total) {
+// Ask the server (the same engine checkout uses) what each offer is worth on this bill;
+// quick edits are debounced and answers to superseded requests are dropped
+function scheduleOfferPreview() {
+    clearTimeout(offerPreviewTimer);
+    offerPreviewTimer = setTimeout(previewOffers, 250);
+}
+
+async function previewOffers() {
+    if (!window.billingConfig || !window.billingConfig.offerPreviewUrl || offers.length === 0) return;
+    const seq = ++offerPreviewSeq;
+
+    try {
+        const response = await fetch(window.billingConfig.offerPreviewUrl, {
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': window.billingConfig.csrfToken
+            },
+            body: JSON.stringify({ items: billPayloadItems() })
+        });
+        if (!response.ok || seq !== offerPreviewSeq) return;
+
+        const data = await response.json();
+        if (seq !== offerPreviewSeq) return;
+        offerDiscounts = data.discounts;
+        renderOfferTotals(billItems.reduce((sum, item) => sum + (item.price * item.quantity), 0));
+    } catch (error) {
+        console.error('Offer preview failed:', error);
+    }
+}
+
+function updateOfferDropdown() {
     const offerSelect = document.getElementById('offerSelect');
     const currentVal = offerSelect.value;
 
     offerSelect.innerHTML = '<option value="">None</option>';
 
+    // Only offers the bill qualifies for are listed
     offers.forEach(offer => {
-        if (total >= parseFloat(offer.min_purchase_amount)) {
-            const option = document.createElement('option');
-            option.value = offer.id;
-
-            // Format label based on offer type
-            let label = offer.name;
-            const value = parseFloat(offer.discount_value);
-
-            if (offer.type === 'percentage') {
-                label += ` (${value}% off)`;
-            } else if (offer.type === 'flat') {
-                label += ` (₹${value} off)`;
-            } else if (offer.type === 'bogo') {
-                label += ` (Buy ${offer.buy_quantity} Get ${offer.get_quantity})`;
-            }
-
-            option.textContent = label;
-            if (offer.id == currentVal) option.selected = true;
-            offerSelect.appendChild(option);
-        }
+        const discount = offerDiscounts[offer.id];
+        if (discount === undefined) return;
+
+        const option = document.createElement('option');
+        option.value = offer.id;
+        option.textContent = `${offer.label} - saves ₹${parseFloat(discount).toFixed(2)}`;
+        if (offer.id == currentVal) option.selected = true;
+        offerSelect.appendChild(option);
     });
 }
 
-function calculateDiscount(total) {
+function calculateDiscount() {
     if (!selectedOfferId) return 0;
 
-    const offer = offers.find(o => o.id == selectedOfferId);
-    if (!offer) return 0;
-
-    if (total < parseFloat(offer.min_purchase_amount)) {
+    const discount = offerDiscounts[selectedOfferId];
+    if (discount === undefined) {
         selectedOfferId = null;
         document.getElementById('offerSelect').value = '';
         return 0;
     }
-
-    let discount = 0;
-    const value = parseFloat(offer.discount_value);
-
-    if (offer.type === 'percentage') {
-        discount = total * (value / 100);
-        // Check for max discount amount if it exists (though not currently passed in JSON, safe to omit or check if added later)
-        if (offer.max_discount_amount && discount > parseFloat(offer.max_discount_amount)) {
-            discount = parseFloat(offer.max_discount_amount);
-        }
-    } else if (offer.type === 'flat') {
-        discount = value;
-    } else if (offer.type === 'bogo') {
-        // For BOGO, we might need more complex logic. 
-        // For now, if it's just a label, we might not apply a monetary discount on the total
-        // OR we assume the user manually adjusts items?
-        // Let's assume 0 monetary discount for now strictly from this function unless BOGO has a specific value.
-        // If discount_value > 0 even for BOGO, we use it.
-        discount = value > 0 ? value : 0;
-    }
-
-    return discount;
+    return parseFloat(discount);
 }
 
 // Initialize when DOM is ready
 document.addEventListener('DOMContentLoaded', function () {
     initializeBillingData();
+    syncCatalog();
     updatePaymentStatus();
     updateBillDisplay();
 });
\ No newline at end of file
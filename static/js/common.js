@@ -156,4 +156,70 @@ function togglePasswordVisibility(inputId, toggleElement) {
     
     passwordInput.type = isPassword ? 'text' : 'password';
     toggleElement.textContent = isPassword ? '👁️' : '🙈';
-}
\ No newline at end of file
+}
+
+// Bulk import modal (products and customers): the upload is queued and followed to completion
+function showImportModal() {
+    document.getElementById('importModal').style.display = 'flex';
+}
+
+function closeImportModal() {
+    document.getElementById('importModal').style.display = 'none';
+}
+
+// Upload the file, then follow the queued import until the worker has finished it
+async function startImport(event) {
+    event.preventDefault();
+    const form = event.target;
+    const submitBtn = document.getElementById('importSubmitBtn');
+    submitBtn.disabled = true;
+
+    try {
+        const response = await fetch(form.action, { method: 'POST', body: new FormData(form), credentials: 'same-origin' });
+        const data = await response.json();
+        if (!data.success) {
+            showImportStatus(data.message, []);
+            submitBtn.disabled = false;
+            return;
+        }
+        document.getElementById('importProgress').style.display = 'block';
+        pollImport(data.status_url);
+    } catch (error) {
+        showImportStatus('Upload failed, please try again.', []);
+        submitBtn.disabled = false;
+    }
+}
+
+async function pollImport(statusUrl) {
+    const response = await fetch(statusUrl, { credentials: 'same-origin' });
+    const job = await response.json();
+    const bar = document.getElementById('importProgressBar');
+
+    if (job.status === 'pending' || job.status === 'running') {
+        bar.max = job.total_rows || 100;
+        bar.value = job.processed_rows;
+        showImportStatus(job.total_rows ? `Processed ${job.processed_rows} of ${job.total_rows} rows...` : 'Waiting to start...', []);
+        setTimeout(() => pollImport(statusUrl), 1000);
+        return;
+    }
+
+    bar.max = 100;
+    bar.value = 100;
+    document.getElementById('importSubmitBtn').disabled = false;
+    showImportStatus(job.message, job.errors);
+    if (job.status === 'done' && !job.dry_run && (job.created || job.updated)) {
+        document.getElementById('importCancelBtn').onclick = () => window.location.reload();
+    }
+}
+
+function showImportStatus(message, errors) {
+    document.getElementById('importProgress').style.display = 'block';
+    document.getElementById('importProgressText').textContent = message;
+    const list = document.getElementById('importErrors');
+    list.innerHTML = '';
+    errors.forEach(error => {
+        const item = document.createElement('li');
+        item.textContent = `Row ${error.row}: ${error.message}`;
+        list.appendChild(item);
+    });
+}
@@ -46,6 +46,51 @@ function handlePaymentSubmit(e) {
     e.target.submit();
 }
 
+// Infinite scroll: purchase and credit history fetch their next page when the pager
+// at the bottom of the (scrollable) list comes into view
+async function loadMoreHistory(pager) {
+    const cursor = pager.dataset.nextCursor;
+    if (!cursor || pager.dataset.loading) {
+        return false;
+    }
+    pager.dataset.loading = '1';
+
+    const url = new URL(window.location);
+    url.searchParams.set('partial', pager.dataset.partial);
+    url.searchParams.set('cursor', cursor);
+
+    try {
+        const response = await fetch(url.toString(), { credentials: 'same-origin' });
+        const data = await response.json();
+        pager.insertAdjacentHTML('beforebegin', data.rows);
+        pager.dataset.nextCursor = data.next_cursor || '';
+        return true;
+    } catch (error) {
+        console.error('Error loading history:', error);
+        return false;
+    } finally {
+        delete pager.dataset.loading;
+    }
+}
+
+function watchHistoryPagers() {
+    if (!('IntersectionObserver' in window)) {
+        return;
+    }
+    document.querySelectorAll('.history-pager').forEach(pager => {
+        const observer = new IntersectionObserver(async entries => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                // Re-observe so a page that still leaves the pager in view loads the next one
+                if (await loadMoreHistory(pager) && pager.dataset.nextCursor) {
+                    observer.unobserve(pager);
+                    observer.observe(pager);
+                }
+            }
+        }, { root: pager.parentElement, rootMargin: '100px' });
+        observer.observe(pager);
+    });
+}
+
 // WhatsApp Message Functions
 function showWhatsAppModal() {
     console.log(' WhatsApp button clicked');
@@ -217,6 +262,8 @@ document.addEventListener('DOMContentLoaded', function () {
         console.warn('⚠️ WhatsApp modal not found on page load');
     }
 
+    watchHistoryPagers();
+
     // Close modals on Escape key
     document.addEventListener('keydown', function (e) {
         if (e.key === 'Escape') {
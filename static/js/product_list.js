@@ -95,14 +95,6 @@ function closeDeleteModal() {
     document.getElementById('deleteModal').style.display = 'none';
 }
 
-function showImportModal() {
-    document.getElementById('importModal').style.display = 'flex';
-}
-
-function closeImportModal() {
-    document.getElementById('importModal').style.display = 'none';
-}
-
 function exportProducts() {
     window.location.href = window.productUrls.export;
 }
@@ -183,16 +183,108 @@ function showNotification(message, type) {
     }, 3000);
 }
 
-// Change page
-function changePage(page) {
-    if (!page || page === 'undefined') {
+// Change page (cursor from the server; pages are keyed on sale date, not numbers)
+function changePage(cursor) {
+    if (!cursor || cursor === 'undefined') {
         return;
     }
     const url = new URL(window.location);
-    url.searchParams.set('page', page);
+    url.searchParams.set('cursor', cursor);
     window.location.href = url.toString();
 }
 
+// Infinite scroll: append the next page of rows when the bottom of the list comes into view
+let loadingMoreSales = false;
+
+async function loadMoreSales() {
+    const pagination = document.getElementById('salesPagination');
+    const cursor = pagination ? pagination.dataset.nextCursor : '';
+    if (!cursor || loadingMoreSales) {
+        return;
+    }
+    loadingMoreSales = true;
+
+    const url = new URL(window.location);
+    url.searchParams.set('cursor', cursor);
+    url.searchParams.set('partial', '1');
+
+    try {
+        const response = await fetch(url.toString(), { credentials: 'same-origin' });
+        const data = await response.json();
+
+        const tbody = document.querySelector('#tableView tbody');
+        if (tbody) {
+            tbody.insertAdjacentHTML('beforeend', data.rows);
+        }
+        document.getElementById('cardsView').insertAdjacentHTML('beforeend', data.cards);
+
+        pagination.dataset.nextCursor = data.next_cursor || '';
+        if (!data.next_cursor) {
+            const loadMoreBtn = document.getElementById('loadMoreBtn');
+            if (loadMoreBtn) loadMoreBtn.remove();
+            // Scrolled to the end of a list that starts at the newest sale: every sale is
+            // on the page, so the total needs no query. Opened further down, newer sales
+            // are missing and the total stays unknown until counted.
+            if (!pagination.dataset.hasPrev) {
+                setSalesTotal(document.querySelectorAll('#tableView .sale-row').length);
+            }
+        }
+        updateLoadedCount();
+    } catch (error) {
+        showNotification('Error loading more sales', 'error');
+    } finally {
+        loadingMoreSales = false;
+    }
+}
+
+function updateLoadedCount() {
+    const loaded = document.querySelectorAll('#tableView .sale-row').length;
+    const countEl = document.getElementById('salesCount');
+    if (!countEl) return;
+    const total = countEl.dataset.total;
+    countEl.textContent = total ? `${loaded} of ${total}` : loaded;
+}
+
+function setSalesTotal(total) {
+    const countEl = document.getElementById('salesCount');
+    if (countEl) countEl.dataset.total = total;
+    const countBtn = document.getElementById('salesCountBtn');
+    if (countBtn) countBtn.remove();
+}
+
+// Counting every matching sale is a full scan, so it only runs when asked for
+function loadSalesCount() {
+    const countBtn = document.getElementById('salesCountBtn');
+    if (countBtn) countBtn.disabled = true;
+
+    const url = new URL(window.location);
+    url.searchParams.delete('cursor');
+    url.searchParams.set('count', '1');
+    fetch(url.toString(), { credentials: 'same-origin' })
+        .then(response => response.json())
+        .then(data => {
+            setSalesTotal(data.count);
+            updateLoadedCount();
+        })
+        .catch(() => {
+            if (countBtn) countBtn.disabled = false;
+            showNotification('Error counting sales', 'error');
+        });
+}
+
+document.addEventListener('DOMContentLoaded', function () {
+
+    const pagination = document.getElementById('salesPagination');
+    if (pagination && 'IntersectionObserver' in window) {
+        const observer = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                loadMoreSales();
+            }
+        }, { rootMargin: '200px' });
+        observer.observe(pagination);
+    }
+});
+
 // Close modals on outside click
 window.onclick = function (event) {
     const saleModal = document.getElementById('saleDetailsModal');
@@ -57,6 +57,7 @@ except ImportError:
     pass
 
 MIDDLEWARE += [
+    'customers.middleware.InstrumentationMiddleware',  # Server-Timing header and sampled slow-request log
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -64,13 +65,14 @@ MIDDLEWARE += [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'customers.middleware.ActivityTrackingMiddleware',  # Track user activity
+    'customers.middleware.ReadReplicaMiddleware',  # Reports, exports and dashboard read from the replica
 ]
 
 ROOT_URLCONF = 'subhlabh.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'customers.instrumentation.TimedDjangoTemplates',  # DjangoTemplates plus render timing
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -89,11 +91,131 @@ WSGI_APPLICATION = 'subhlabh.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# SQLite by default; set DB_ENGINE=postgresql (with psycopg installed) and the DB_*
+# variables in production. Read-heavy views (READ_REPLICA_VIEWS) read through the
+# 'replica' alias via customers.routers; writes always go to 'default'.
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite3')
+
+# Seconds a connection is kept open between requests
+CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'subhlabh'),
+            'USER': os.environ.get('DB_USER', ''),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', ''),
+            'PORT': os.environ.get('DB_PORT', ''),
+            'CONN_MAX_AGE': CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+        }
     }
+    if os.environ.get('DB_REPLICA_HOST'):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'HOST': os.environ['DB_REPLICA_HOST'],
+            'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+            'TEST': {'MIRROR': 'default'},
+        }
+else:
+    SQLITE_PATH = os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3')
+    
+    # WAL lets readers run alongside the single writer; NORMAL sync is safe under WAL
+    SQLITE_PRAGMAS = (
+        'PRAGMA synchronous=NORMAL;'
+        'PRAGMA cache_size=-20000;'       # 20 MB page cache per connection
+        'PRAGMA mmap_size=268435456;'     # 256 MB memory-mapped reads
+        'PRAGMA temp_store=MEMORY;'
+    )
+    
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': SQLITE_PATH,
+            'CONN_MAX_AGE': CONN_MAX_AGE,
+            'OPTIONS': {
+                # Take the write lock at BEGIN so writers queue on the busy timeout
+                # instead of failing with "database is locked" when upgrading a read
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,
+                'init_command': 'PRAGMA journal_mode=WAL;' + SQLITE_PRAGMAS,
+            },
+        },
+        'replica': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            # A URI, so characters such as '?', '#' or '%' in the path must be percent-encoded
+            'NAME': Path(SQLITE_PATH).resolve().as_uri() + '?mode=ro',
+            'CONN_MAX_AGE': CONN_MAX_AGE,
+            'OPTIONS': {
+                'timeout': 20,
+                'init_command': SQLITE_PRAGMAS + 'PRAGMA query_only=ON;',
+            },
+            'TEST': {'MIRROR': 'default'},
+        },
+    }
+
+DATABASE_ROUTERS = ['customers.routers.ReadReplicaRouter']
+
+# URL names whose requests read from the replica (streamed responses included)
+READ_REPLICA_VIEWS = [
+    'customers:dashboard-widget',
+    'customers:reports',
+    'customers:product-export',
+    'customers:sales-download',
+]
+
+
+# Cache
+# Shop caches are versioned (customers/caching.py) and bumped by the web workers and by
+# the Procfile workers (emails, images, reconcile, imports), so every process must share
+# one cache: Redis when REDIS_URL is set (required in production), otherwise the database
+# cache table (`manage.py createcachetable`). The per-process memory cache is only used
+# with DEBUG, where runserver is the single process.
+REDIS_URL = os.environ.get('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+elif DEBUG:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'subhlabh',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'subhlabh_cache',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+
+# Request instrumentation (customers.middleware.InstrumentationMiddleware)
+SERVER_TIMING_HEADER = os.environ.get('SERVER_TIMING_HEADER', 'True') == 'True'
+# Share of requests that record SQL call sites and may be logged as slow
+SLOW_REQUEST_SAMPLE_RATE = float(os.environ.get('SLOW_REQUEST_SAMPLE_RATE', 0.1))
+SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 500))
+SLOW_REQUEST_TOP_QUERIES = 5
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'customers.slow_requests': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
 }
 
 
@@ -167,7 +289,9 @@ DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL')
 
 # Session settings
 SESSION_COOKIE_AGE = 86400 * 30  # 30 days
-SESSION_SAVE_EVERY_REQUEST = True
+# Sessions are saved when modified; activity tracking touches them about once a minute
+# while a user is active, which keeps active sessions from expiring
+SESSION_SAVE_EVERY_REQUEST = False
 
 # OTP Settings
 OTP_EXPIRY_TIME = 300  # 5 minutes in seconds
@@ -2,8 +2,10 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from customers.admin import cache_stats_view
 
 urlpatterns = [
+    path('admin/cache-stats/', admin.site.admin_view(cache_stats_view), name='cache-stats'),
     path('admin/', admin.site.urls),
     path('', include('customers.urls')),
 ]